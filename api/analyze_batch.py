@@ -0,0 +1,174 @@
+from http.server import BaseHTTPRequestHandler
+import json
+import os
+import traceback
+from api.utils.supabase_clientes import cliente_servico
+from api.utils.autenticacao import verificar_token
+from urllib.parse import parse_qs
+from api.utils.analise_lote import (
+    resolver_documentos, criar_lote, obter_lote, progresso_lote, processar_lote,
+    CONCORRENCIA_PADRAO, CONCORRENCIA_MAXIMA, MAX_DOCUMENTOS_LOTE, STATUS_LOTE_CONCLUIDO
+)
+from api.utils.chaves_gemini import obter_pool_chaves
+from api.utils.configuracao import buscar_prompt
+from api.utils.sse import iniciar_sse, enviar_evento
+from api.utils.estatisticas import estatisticas_processo
+
+class handler(BaseHTTPRequestHandler):
+    def autenticar(self):
+        """Valida o token JWT; em caso de erro já envia a resposta 401 e retorna None"""
+        auth_header = self.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            self.send_response(401)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Token de autenticação não fornecido"}).encode())
+            return None
+
+        token = auth_header.split(' ')[1]
+
+        try:
+            user = verificar_token(token)
+            return user
+        except Exception as auth_error:
+            self.send_response(401)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": f"Autenticação inválida: {str(auth_error)}"}).encode())
+            return None
+
+    def responder(self, status, dados):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(dados).encode())
+
+    def do_GET(self):
+        """Progresso de um lote: /api/analyze_batch?lote_id=<uuid> (ou ?stats=1)"""
+        try:
+            if not self.autenticar():
+                return
+
+            query_components = parse_qs(self.path.split('?')[1]) if '?' in self.path else {}
+            
+            # /api/analyze_batch?stats=1 retorna os contadores de cache, chaves e configuração desta instância
+            if query_components.get('stats', [''])[0] == '1':
+                self.responder(200, estatisticas_processo())
+                return
+            
+            lote_id = query_components.get('lote_id', [''])[0]
+            if not lote_id:
+                self.responder(400, {"error": "ID do lote não fornecido"})
+                return
+
+            service_supabase = cliente_servico()
+            lote = obter_lote(service_supabase, lote_id)
+            if not lote:
+                self.responder(404, {"error": "Lote não encontrado"})
+                return
+
+            self.responder(200, progresso_lote(lote))
+
+        except Exception as e:
+            print(f"Erro interno do servidor: {str(e)}")
+            self.responder(500, {"error": f"Erro interno do servidor: {str(e)}"})
+
+    def do_POST(self):
+        """
+        Analisa vários documentos com o mesmo prompt. Corpo da requisição:
+        prompt_id e document_ids (lista) ou projeto_id/categoria_id, ou lote_id
+        para retomar um lote parcial. Opcionais: concorrencia, ignorar_cache e
+        stream (eventos de progresso em server-sent events).
+        """
+        sse_iniciado = False
+        try:
+            content_length = int(self.headers['Content-Length'])
+            data = json.loads(self.rfile.read(content_length))
+
+            lote_id = data.get('lote_id')
+            prompt_id = data.get('prompt_id')
+            document_ids = data.get('document_ids') or []
+            projeto_id = data.get('projeto_id')
+            categoria_id = data.get('categoria_id')
+            ignorar_cache = bool(data.get('ignorar_cache'))
+            stream = bool(data.get('stream'))
+
+            try:
+                concorrencia = int(data.get('concorrencia') or CONCORRENCIA_PADRAO)
+            except (TypeError, ValueError):
+                concorrencia = CONCORRENCIA_PADRAO
+            concorrencia = max(1, min(concorrencia, CONCORRENCIA_MAXIMA))
+
+            if not lote_id and (not prompt_id or not (document_ids or projeto_id or categoria_id)):
+                self.responder(400, {"error": "Campos obrigatórios não fornecidos (prompt_id e document_ids, projeto_id ou categoria_id, ou lote_id)"})
+                return
+
+            user = self.autenticar()
+            if not user:
+                return
+
+            service_supabase = cliente_servico()
+
+            if lote_id:
+                # Retomar um lote existente a partir dos documentos pendentes
+                lote = obter_lote(service_supabase, lote_id)
+                if not lote:
+                    self.responder(404, {"error": "Lote não encontrado"})
+                    return
+                if lote['status'] == STATUS_LOTE_CONCLUIDO:
+                    self.responder(200, {"success": True, **progresso_lote(lote)})
+                    return
+                prompt_id = lote['prompt_id']
+            else:
+                try:
+                    ids = resolver_documentos(service_supabase, document_ids, projeto_id, categoria_id)
+                except ValueError:
+                    self.responder(400, {"error": "IDs de documento inválidos. Devem ser números."})
+                    return
+                if not ids:
+                    self.responder(404, {"error": "Nenhum documento encontrado para o lote"})
+                    return
+                if len(ids) > MAX_DOCUMENTOS_LOTE:
+                    self.responder(400, {"error": f"O lote pode ter no máximo {MAX_DOCUMENTOS_LOTE} documentos"})
+                    return
+
+            # Chaves da API e prompt buscados uma única vez para o lote inteiro
+            chaves = obter_pool_chaves(service_supabase)
+            if not chaves.tem_chaves():
+                self.responder(500, {"error": "Chave API da Gemini não configurada. Entre em contato com o administrador."})
+                return
+
+            prompt_data = buscar_prompt(service_supabase, 'prompts', prompt_id)
+            if not prompt_data:
+                self.responder(404, {"error": "Prompt não encontrado"})
+                return
+            texto_prompt = prompt_data.get('texto_prompt', '')
+
+            if not lote_id:
+                lote = criar_lote(service_supabase, prompt_id, ids, usuario_id=user.id)
+
+            ao_progredir = None
+            if stream:
+                iniciar_sse(self)
+                sse_iniciado = True
+                enviar_evento(self, progresso_lote(lote), evento='progresso')
+                ao_progredir = lambda progresso: enviar_evento(self, progresso, evento='progresso')
+
+            resumo = processar_lote(
+                service_supabase, lote, chaves, texto_prompt,
+                concorrencia=concorrencia, ignorar_cache=ignorar_cache, ao_progredir=ao_progredir
+            )
+            print(f"Lote {lote['id']}: {resumo['concluidos']}/{resumo['total']} concluídos em {resumo['duracao']}s")
+
+            if sse_iniciado:
+                enviar_evento(self, {"success": True, **resumo}, evento='fim')
+            else:
+                self.responder(200, {"success": True, **resumo})
+
+        except Exception as e:
+            print(f"Erro interno do servidor: {str(e)}")
+            print(traceback.format_exc())
+            if sse_iniciado:
+                enviar_evento(self, {"error": f"Erro interno do servidor: {str(e)}"}, evento='erro')
+                return
+            self.responder(500, {"error": f"Erro interno do servidor: {str(e)}"})
@@ -1,16 +1,23 @@
 from http.server import BaseHTTPRequestHandler
 import json
-import os
 from datetime import datetime
-from supabase import create_client, Client
-import google.generativeai as genai
-
-# Configuração do cliente Supabase
-supabase_url = os.environ.get("NEXT_PUBLIC_SUPABASE_URL")
-supabase_key = os.environ.get("NEXT_PUBLIC_SUPABASE_ANON_KEY")
-supabase_service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+from api.utils.supabase_clientes import cliente_servico
+from api.utils.autenticacao import verificar_token
+from api.utils.chaves_gemini import obter_pool_chaves
+from api.utils.configuracao import buscar_prompt
+from api.utils.gemini import gerar_resposta, gerar_resposta_stream, contador_tokens
+from api.utils.resiliencia import GeminiIndisponivelError
+from api.utils.etapas import MedidorEtapas, ConsultasParalelas
+from api.utils.estatisticas import responder_estatisticas
+from api.utils.sse import iniciar_sse, enviar_evento, transmitir_trechos
+from api.utils.tokens import preparar_entrada
+from api.utils.prompts_utilizados import colunas_prompt
 
 class handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        # /api/analyze_multiple_indicators?stats=1 retorna os contadores de cache, chaves e configuração desta instância
+        responder_estatisticas(self)
+
     def do_POST(self):
         try:
             # Obtém o tamanho do conteúdo
@@ -24,6 +31,9 @@ class handler(BaseHTTPRequestHandler):
             prompt_id = data.get('prompt_id')  # UUID como string
             text_to_analyze = data.get('text_to_analyze')  # Texto combinado dos indicadores
             indicadores_info = data.get('indicadores_info', [])  # Lista com ID e nome dos indicadores
+            ignorar_cache = bool(data.get('ignorar_cache'))  # Força nova chamada à Gemini
+            stream = bool(data.get('stream'))  # Envia o texto em server-sent events à medida que é gerado
+            truncar = data.get('truncar', True) is not False  # Corta o texto que passar do limite de tokens
             
             # Valida os campos necessários
             if not prompt_id or not text_to_analyze or not indicadores_info:
@@ -44,15 +54,10 @@ class handler(BaseHTTPRequestHandler):
 
             token = auth_header.split(' ')[1]
             
-            # Criar cliente Supabase
-            supabase = create_client(supabase_url, supabase_key)
-            
-            # Validar token e obter usuário
+            # Validar token antes de qualquer consulta com a chave de serviço
+            medidor = MedidorEtapas()
             try:
-                user_response = supabase.auth.get_user(token)
-                user = user_response.user
-                if not user:
-                    raise Exception("Usuário não autenticado")
+                user = medidor.medir('usuario', verificar_token, token)
                 user_id = user.id
             except Exception as auth_error:
                 self.send_response(401)
@@ -61,21 +66,27 @@ class handler(BaseHTTPRequestHandler):
                 self.wfile.write(json.dumps({"error": f"Autenticação inválida: {str(auth_error)}"}).encode())
                 return
             
-            # Criar um cliente com a chave de serviço
-            service_supabase = create_client(supabase_url, supabase_service_key)
+            # Cliente Supabase do processo com a chave de serviço
+            service_supabase = cliente_servico()
+            
+            # Chaves e prompt não dependem uns dos outros: as consultas saem juntas
+            # e cada resultado é conferido na ordem original
+            consultas = ConsultasParalelas(medidor)
+            consultas.iniciar('chaves', obter_pool_chaves, service_supabase)
+            # As duas tabelas de prompt são consultadas juntas; prompts_indicadores tem prioridade
+            consultas.iniciar('prompts_indicadores', buscar_prompt, service_supabase, 'prompts_indicadores', prompt_id)
+            consultas.iniciar('prompts', buscar_prompt, service_supabase, 'prompts', prompt_id)
             
-            # Buscar a chave API vigente no Supabase
+            # Pool com todas as chaves API vigentes (mantido entre requisições)
             try:
-                chave_response = service_supabase.table('configuracoes_gemini').select('chave').eq('vigente', True).execute()
+                chaves = consultas.obter('chaves')
                 
-                if not chave_response.data or len(chave_response.data) == 0:
+                if not chaves.tem_chaves():
                     self.send_response(500)
                     self.send_header('Content-Type', 'application/json')
                     self.end_headers()
                     self.wfile.write(json.dumps({"error": "Chave API da Gemini não configurada. Entre em contato com o administrador."}).encode())
                     return
-                
-                api_key = chave_response.data[0].get('chave')
             except Exception as chave_error:
                 print(f"Erro ao buscar chave API: {str(chave_error)}")
                 self.send_response(500)
@@ -85,15 +96,14 @@ class handler(BaseHTTPRequestHandler):
                 return
             
             # Buscar o prompt no Supabase - PRIMEIRO TENTAR prompts_indicadores
-            prompt_response = None
             texto_prompt = None
             
             # Tentar primeiro na tabela prompts_indicadores
             try:
-                prompt_response = service_supabase.table('prompts_indicadores').select('*').eq('id', prompt_id).execute()
+                prompt_data = consultas.obter('prompts_indicadores')
                 
-                if prompt_response.data and len(prompt_response.data) > 0:
-                    texto_prompt = prompt_response.data[0].get('texto_prompt', '')
+                if prompt_data:
+                    texto_prompt = prompt_data.get('texto_prompt', '')
                     print(f"Prompt encontrado na tabela prompts_indicadores: {prompt_id}")
                 else:
                     print(f"Prompt não encontrado na tabela prompts_indicadores: {prompt_id}")
@@ -103,16 +113,18 @@ class handler(BaseHTTPRequestHandler):
             # Se não encontrou na tabela prompts_indicadores, tentar na tabela prompts
             if not texto_prompt:
                 try:
-                    prompt_response = service_supabase.table('prompts').select('*').eq('id', prompt_id).execute()
+                    prompt_data = consultas.obter('prompts')
                     
-                    if prompt_response.data and len(prompt_response.data) > 0:
-                        texto_prompt = prompt_response.data[0].get('texto_prompt', '')
+                    if prompt_data:
+                        texto_prompt = prompt_data.get('texto_prompt', '')
                         print(f"Prompt encontrado na tabela prompts: {prompt_id}")
                     else:
                         print(f"Prompt não encontrado na tabela prompts: {prompt_id}")
                 except Exception as e:
                     print(f"Erro ao buscar na tabela prompts: {str(e)}")
             
+            print(f"Consultas antes da Gemini: {medidor.resumo()}")
+            
             # Se ainda não encontrou o prompt
             if not texto_prompt:
                 self.send_response(404)
@@ -127,8 +139,23 @@ class handler(BaseHTTPRequestHandler):
                 }).encode())
                 return
             
-            # Inicializar o cliente Gemini com a chave API
-            genai.configure(api_key=api_key)
+            # Verificar o tamanho da entrada antes de chamar a Gemini: compacta e,
+            # se permitido, trunca proporcionalmente por indicador quando passa do orçamento
+            preparo = preparar_entrada(
+                texto_prompt, text_to_analyze,
+                contador_exato=contador_tokens(chaves),
+                truncar=truncar
+            )
+            if preparo["excede"]:
+                self.send_response(413)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({
+                    "error": "Texto excede o limite de tokens da análise. Reduza o número de indicadores ou permita o truncamento.",
+                    "tokens": preparo["tokens"]
+                }).encode())
+                return
+            text_to_analyze = preparo["texto"]
             
             # Preparar o prompt completo
             prompt_completo = f"{texto_prompt}\n\n{text_to_analyze}"
@@ -137,14 +164,22 @@ class handler(BaseHTTPRequestHandler):
             
             # Chamar a API do Gemini
             try:
-                # Criar um modelo generativo
-                model = genai.GenerativeModel('gemini-2.0-flash')
-                
-                # Gerar resposta
-                response = model.generate_content(prompt_completo)
-                
-                # Extrair o texto da resposta
-                resultado = response.text
+                sse_iniciado = False
+                if stream:
+                    # Repassar o texto ao cliente à medida que o modelo o gera
+                    trechos, do_cache = gerar_resposta_stream(
+                        chaves, prompt_completo, 'analyze_multiple_indicators', service_supabase,
+                        ignorar_cache=ignorar_cache
+                    )
+                    iniciar_sse(self)
+                    sse_iniciado = True
+                    resultado = transmitir_trechos(self, trechos)
+                else:
+                    # Gerar resposta (reaproveitada do cache quando o mesmo prompt já foi analisado)
+                    resultado, do_cache = gerar_resposta(
+                        chaves, prompt_completo, 'analyze_multiple_indicators', service_supabase,
+                        ignorar_cache=ignorar_cache
+                    )
                 
                 print(f"Resposta do Gemini recebida - Tamanho: {len(resultado)} caracteres")
                 
@@ -165,7 +200,7 @@ class handler(BaseHTTPRequestHandler):
                         'indicadores_ids': indicadores_ids,
                         'nomes_indicadores': nomes_indicadores,
                         'resultado_analise': resultado,
-                        'prompt_utilizado': prompt_completo,
+                        **colunas_prompt(service_supabase, prompt_completo),  # Prompt gravado uma vez, linha guarda o hash
                         'prompt_id': prompt_id,
                         'usuario_id': user_id,
                         'data_analise': agora,
@@ -188,21 +223,37 @@ class handler(BaseHTTPRequestHandler):
                     analise_id = None
                 
                 # Responder com sucesso
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({
+                resposta = {
                     "success": True,
                     "resultado": resultado,
+                    "do_cache": do_cache,
+                    "tokens": preparo["tokens"],
                     "analise_salva": analise_salva,
                     "analise_id": analise_id,
                     "indicadores_analisados": len(indicadores_ids),
                     "timestamp": agora
-                }).encode())
+                }
+                if sse_iniciado:
+                    # Evento final com o mesmo conteúdo da resposta do modo normal
+                    enviar_evento(self, resposta, evento='fim')
+                else:
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.end_headers()
+                    self.wfile.write(json.dumps(resposta).encode())
                 
             except Exception as api_error:
                 print(f"Erro na API Gemini: {str(api_error)}")
-                self.send_response(500)
+                if sse_iniciado:
+                    # Cabeçalhos já enviados: o erro segue como evento do stream
+                    enviar_evento(self, {"error": f"Erro na API Gemini: {str(api_error)}"}, evento='erro')
+                    return
+                if isinstance(api_error, GeminiIndisponivelError):
+                    # Cota esgotada ou circuito aberto: o cliente deve esperar antes de repetir
+                    self.send_response(503)
+                    self.send_header('Retry-After', str(int(api_error.retry_after or 0) + 1))
+                else:
+                    self.send_response(500)
                 self.send_header('Content-Type', 'application/json')
                 self.end_headers()
                 self.wfile.write(json.dumps({
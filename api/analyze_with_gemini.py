@@ -1,15 +1,21 @@
 from http.server import BaseHTTPRequestHandler
 import json
-import os
-from supabase import create_client, Client
-import google.generativeai as genai
-
-# Configuração do cliente Supabase
-supabase_url = os.environ.get("NEXT_PUBLIC_SUPABASE_URL")
-supabase_key = os.environ.get("NEXT_PUBLIC_SUPABASE_ANON_KEY")
-supabase_service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+from api.utils.supabase_clientes import cliente_servico
+from api.utils.autenticacao import verificar_token
+from api.utils.chaves_gemini import obter_pool_chaves
+from api.utils.configuracao import buscar_prompt
+from api.utils.gemini import gerar_resposta, gerar_resposta_stream
+from api.utils.resiliencia import GeminiIndisponivelError
+from api.utils.sse import iniciar_sse, enviar_evento, transmitir_trechos
+from api.utils.analise_partes import analisar_em_partes
+from api.utils.etapas import MedidorEtapas, ConsultasParalelas
+from api.utils.estatisticas import responder_estatisticas
 
 class handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        # /api/analyze_with_gemini?stats=1 retorna os contadores de cache, chaves e configuração desta instância
+        responder_estatisticas(self)
+
     def do_POST(self):
         try:
             # Obtém o tamanho do conteúdo
@@ -22,6 +28,9 @@ class handler(BaseHTTPRequestHandler):
             # Extrai os dados necessários
             document_id = data.get('document_id')
             prompt_id = data.get('prompt_id')
+            ignorar_cache = bool(data.get('ignorar_cache'))  # Força nova chamada à Gemini
+            stream = bool(data.get('stream'))  # Envia o texto em server-sent events à medida que é gerado
+            em_partes = bool(data.get('em_partes'))  # Modo map-reduce para documentos longos
             
             # Valida os campos necessários
             if not document_id or not prompt_id:
@@ -46,15 +55,10 @@ class handler(BaseHTTPRequestHandler):
 
             token = auth_header.split(' ')[1]
             
-            # Criar cliente Supabase
-            supabase = create_client(supabase_url, supabase_key)
-            
-            # Validar token
+            # Validar token antes de qualquer consulta com a chave de serviço
+            medidor = MedidorEtapas()
             try:
-                user_response = supabase.auth.get_user(token)
-                user = user_response.user
-                if not user:
-                    raise Exception("Usuário não autenticado")
+                user = medidor.medir('usuario', verificar_token, token)
             except Exception as auth_error:
                 self.send_response(401)
                 self.send_header('Content-Type', 'application/json')
@@ -62,23 +66,28 @@ class handler(BaseHTTPRequestHandler):
                 self.wfile.write(json.dumps({"error": f"Autenticação inválida: {str(auth_error)}"}).encode())
                 return
             
-            # Criar um cliente com a chave de serviço
-            service_supabase = create_client(supabase_url, supabase_service_key)
+            # Cliente Supabase do processo com a chave de serviço
+            service_supabase = cliente_servico()
+            
+            # Chaves, documento e prompt não dependem uns dos outros: as consultas
+            # saem juntas e cada resultado é conferido na ordem original
+            consultas = ConsultasParalelas(medidor)
+            consultas.iniciar('chaves', obter_pool_chaves, service_supabase)
+            consultas.iniciar('documento', lambda: service_supabase.table('base_dados_conteudo').select('*').eq('id', document_id).execute())
+            consultas.iniciar('prompt', buscar_prompt, service_supabase, 'prompts', prompt_id)
             
-            # Buscar a chave API vigente no Supabase
-            chave_response = service_supabase.table('configuracoes_gemini').select('chave').eq('vigente', True).execute()
+            # Pool com todas as chaves API vigentes (mantido entre requisições)
+            chaves = consultas.obter('chaves')
             
-            if not chave_response.data or len(chave_response.data) == 0:
+            if not chaves.tem_chaves():
                 self.send_response(500)
                 self.send_header('Content-Type', 'application/json')
                 self.end_headers()
                 self.wfile.write(json.dumps({"error": "Chave API da Gemini não configurada. Entre em contato com o administrador."}).encode())
                 return
             
-            api_key = chave_response.data[0].get('chave')
-            
             # Buscar o documento no Supabase
-            doc_response = service_supabase.table('base_dados_conteudo').select('*').eq('id', document_id).execute()
+            doc_response = consultas.obter('documento')
             
             if not doc_response.data:
                 self.send_response(404)
@@ -97,35 +106,49 @@ class handler(BaseHTTPRequestHandler):
                 self.wfile.write(json.dumps({"error": "Documento não possui texto extraído para análise"}).encode())
                 return
             
-            # Buscar o prompt no Supabase
-            prompt_response = service_supabase.table('prompts').select('*').eq('id', prompt_id).execute()
+            # Buscar o prompt (em memória quando já consultado por esta instância)
+            prompt_data = consultas.obter('prompt')
             
-            if not prompt_response.data:
+            if not prompt_data:
                 self.send_response(404)
                 self.send_header('Content-Type', 'application/json')
                 self.end_headers()
                 self.wfile.write(json.dumps({"error": "Prompt não encontrado"}).encode())
                 return
             
-            prompt_data = prompt_response.data[0]
             texto_prompt = prompt_data.get('texto_prompt', '')
-            
-            # Inicializar o cliente Gemini com a chave API
-            genai.configure(api_key=api_key)
+            print(f"Consultas antes da Gemini: {medidor.resumo()}")
             
             # Preparar o prompt completo
             prompt_completo = f"{texto_prompt}\n\n{content}"
             
             # Chamar a API do Gemini
             try:
-                # Criar um modelo generativo
-                model = genai.GenerativeModel('gemini-2.0-flash')
-                
-                # Gerar resposta
-                response = model.generate_content(prompt_completo)
-                
-                # Extrair o texto da resposta
-                resultado = response.text
+                info_partes = None
+                sse_iniciado = False
+                if em_partes:
+                    # Analisar o documento em partes paralelas e combinar as respostas
+                    info_partes = analisar_em_partes(
+                        chaves, texto_prompt, content, 'analyze_with_gemini', service_supabase,
+                        document_id=document_id, prompt_id=prompt_id, ignorar_cache=ignorar_cache
+                    )
+                    resultado = info_partes["resultado"]
+                    do_cache = info_partes["partes_recalculadas"] == 0
+                elif stream:
+                    # Repassar o texto ao cliente à medida que o modelo o gera
+                    trechos, do_cache = gerar_resposta_stream(
+                        chaves, prompt_completo, 'analyze_with_gemini', service_supabase,
+                        ignorar_cache=ignorar_cache
+                    )
+                    iniciar_sse(self)
+                    sse_iniciado = True
+                    resultado = transmitir_trechos(self, trechos)
+                else:
+                    # Gerar resposta (reaproveitada do cache quando o mesmo prompt já foi analisado)
+                    resultado, do_cache = gerar_resposta(
+                        chaves, prompt_completo, 'analyze_with_gemini', service_supabase,
+                        ignorar_cache=ignorar_cache
+                    )
                 
                 # Salvar o resultado no Supabase
                 update_response = service_supabase.table('base_dados_conteudo').update({
@@ -133,16 +156,33 @@ class handler(BaseHTTPRequestHandler):
                 }).eq('id', document_id).execute()
                 
                 # Responder com sucesso
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({
+                resposta = {
                     "success": True,
-                    "resultado": resultado
-                }).encode())
+                    "resultado": resultado,
+                    "do_cache": do_cache,
+                    "partes": info_partes["partes"] if info_partes else None,
+                    "partes_recalculadas": info_partes["partes_recalculadas"] if info_partes else None
+                }
+                if sse_iniciado:
+                    # Evento final com o mesmo conteúdo da resposta do modo normal
+                    enviar_evento(self, resposta, evento='fim')
+                else:
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.end_headers()
+                    self.wfile.write(json.dumps(resposta).encode())
                 
             except Exception as api_error:
-                self.send_response(500)
+                if sse_iniciado:
+                    # Cabeçalhos já enviados: o erro segue como evento do stream
+                    enviar_evento(self, {"error": f"Erro na API Gemini: {str(api_error)}"}, evento='erro')
+                    return
+                if isinstance(api_error, GeminiIndisponivelError):
+                    # Cota esgotada ou circuito aberto: o cliente deve esperar antes de repetir
+                    self.send_response(503)
+                    self.send_header('Retry-After', str(int(api_error.retry_after or 0) + 1))
+                else:
+                    self.send_response(500)
                 self.send_header('Content-Type', 'application/json')
                 self.end_headers()
                 self.wfile.write(json.dumps({
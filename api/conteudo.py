@@ -1,21 +1,124 @@
 from http.server import BaseHTTPRequestHandler
 import json
-import os
-from supabase import create_client, Client
+import re
+from urllib.parse import urlparse, parse_qs
+from api.utils.supabase_clientes import cliente_usuario
+from api.utils.etag import calcular_etag, etag_corresponde, responder_nao_modificado, enviar_cabecalhos_cache
+
+# Colunas devolvidas pela listagem quando o parâmetro campos não é informado.
+# conteudo e retorno_ia (até ~100 KB cada) só vêm se pedidos explicitamente.
+CAMPOS_LISTAGEM = (
+    'id', 'nome_arquivo', 'tipo_arquivo', 'tamanho_arquivo', 'url_arquivo',
+    'categoria_id', 'projeto_id', 'descricao', 'data_upload',
+    'backblaze_filename', 'hash_conteudo', 'dedup_origem_id'
+)
+FILTROS_LISTAGEM = ('projeto_id', 'categoria_id')
+
+# Paginação por cursor (id): ?limite=&apos=<último id da página anterior>
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 500
+# Linhas lidas do Supabase por vez enquanto a página é escrita na resposta
+LINHAS_POR_BLOCO = 100
+
+NOME_COLUNA = re.compile(r'^[a-z_][a-z0-9_]*$')
+
+# Versão de cada linha para os ETags: updated_at é atualizado por trigger em
+# todo UPDATE de base_dados_conteudo (inclusive os feitos pelo frontend), ver
+# supabase/migrations/20261018000025_updated_at_conteudo.sql. Sem a coluna,
+# ou com ela nula, não há ETag: a resposta seria a mesma após uma alteração.
+COLUNA_VERSAO = 'updated_at'
+
+
+class ParametroInvalidoError(Exception):
+    pass
+
+
+def _inteiro(query, nome, padrao=None, minimo=None):
+    valor = query.get(nome, [''])[0]
+    if valor == '':
+        return padrao
+    try:
+        numero = int(valor)
+    except ValueError:
+        raise ParametroInvalidoError(f"{nome} deve ser um número inteiro")
+    if minimo is not None and numero < minimo:
+        raise ParametroInvalidoError(f"{nome} deve ser maior ou igual a {minimo}")
+    return numero
+
+
+def parametros_listagem(query):
+    """Campos, filtros, limite e cursor da listagem a partir da query string"""
+    campos = [c.strip() for c in query.get('campos', [''])[0].split(',') if c.strip()]
+    invalidos = [c for c in campos if not NOME_COLUNA.match(c)]
+    if invalidos:
+        raise ParametroInvalidoError(f"Campos inválidos: {', '.join(invalidos)}")
+    campos = list(campos or CAMPOS_LISTAGEM)
+    # O cursor depende do id em cada linha
+    if 'id' not in campos:
+        campos.insert(0, 'id')
+
+    filtros = {}
+    for nome in FILTROS_LISTAGEM:
+        valor = _inteiro(query, nome)
+        if valor is not None:
+            filtros[nome] = valor
+
+    return {
+        "campos": ','.join(campos),
+        "filtros": filtros,
+        "limite": min(_inteiro(query, 'limite', LIMITE_PADRAO, minimo=1), LIMITE_MAXIMO),
+        "apos": _inteiro(query, 'apos')
+    }
+
+
+def consultar_pagina(supabase, parametros, campos, apos, quantidade):
+    """Linhas da listagem (filtros de parametros) com id > apos, em ordem de id"""
+    consulta = supabase.table('base_dados_conteudo').select(campos)
+    for coluna, valor in parametros["filtros"].items():
+        consulta = consulta.eq(coluna, valor)
+    if apos is not None:
+        consulta = consulta.gt('id', apos)
+    return consulta.order('id').limit(quantidade).execute().data
+
+
+def etag_pagina(supabase, parametros):
+    """
+    ETag da página a partir só de id e updated_at das suas linhas (mais a
+    linha que indica a próxima página), sem ler as colunas da resposta.
+    Retorna None se a versão não puder ser consultada ou faltar em alguma linha.
+    """
+    try:
+        versoes = consultar_pagina(
+            supabase, parametros, f'id,{COLUNA_VERSAO}',
+            parametros["apos"], parametros["limite"] + 1
+        )
+    except Exception as e:
+        print(f"Erro ao consultar a versão da listagem: {str(e)}")
+        return None
+    if any(linha.get(COLUNA_VERSAO) is None for linha in versoes):
+        return None
+    return calcular_etag(
+        'lista', parametros["campos"], parametros["filtros"], parametros["limite"], parametros["apos"],
+        [[linha['id'], linha.get(COLUNA_VERSAO)] for linha in versoes]
+    )
+
+
+def etag_conteudo(linha):
+    """ETag de um conteúdo a partir do id e do updated_at da linha; None sem updated_at"""
+    if linha.get(COLUNA_VERSAO) is None:
+        return None
+    return calcular_etag('conteudo', linha['id'], linha.get(COLUNA_VERSAO))
 
-# Configuração do cliente Supabase
-supabase_url = os.environ.get("NEXT_PUBLIC_SUPABASE_URL")
-supabase_key = os.environ.get("NEXT_PUBLIC_SUPABASE_ANON_KEY")
-supabase: Client = create_client(supabase_url, supabase_key)
 
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
-        # Rota para obter todos os conteúdos
-        if self.path == "/api/conteudo":
-            return self.get_conteudos()
+        url = urlparse(self.path)
+        # Rota para listar os conteúdos
+        if url.path.rstrip('/') == "/api/conteudo":
+            return self.get_conteudos(parse_qs(url.query))
         # Rota para obter conteúdo por ID
-        elif self.path.startswith("/api/conteudo/"):
-            id_str = self.path.split("/")[-1]
+        elif url.path.startswith("/api/conteudo/"):
+            id_str = url.path.split("/")[-1]
             # Converter ID para int se possível
             try:
                 id = int(id_str)
@@ -33,7 +136,15 @@ class handler(BaseHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(json.dumps({"error": "Rota não encontrada"}).encode())
 
-    def get_conteudos(self):
+    def get_conteudos(self, query):
+        """
+        Página da listagem em ordem de id: {"dados": [...], "proximo_cursor": id ou null}.
+        Parâmetros: limite, apos (cursor), projeto_id, categoria_id e campos
+        (lista separada por vírgulas; padrão sem conteudo/retorno_ia). As linhas
+        são lidas em blocos e escritas na resposta à medida que chegam. Com
+        If-None-Match igual ao ETag atual responde 304 sem ler as linhas.
+        """
+        resposta_iniciada = False
         try:
             # Verifica se o usuário está autenticado através do token JWT
             auth_header = self.headers.get('Authorization')
@@ -45,19 +156,66 @@ class handler(BaseHTTPRequestHandler):
                 return
 
             token = auth_header.split(' ')[1]
+
+            try:
+                parametros = parametros_listagem(query)
+            except ParametroInvalidoError as e:
+                self.send_response(400)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": str(e)}).encode())
+                return
             
-            # Configura o token no cliente Supabase
-            supabase.auth.set_auth(token)
-            
-            # Busca todos os conteúdos na tabela base_dados_conteudo
-            response = supabase.table('base_dados_conteudo').select('*').execute()
-            
+            # Cliente com o token do usuário (RLS), sem alterar o cliente compartilhado
+            supabase = cliente_usuario(token)
+
+            etag = etag_pagina(supabase, parametros)
+            if etag_corresponde(self.headers.get('If-None-Match'), etag):
+                responder_nao_modificado(self, etag)
+                return
+
+            def buscar_bloco(apos, quantidade):
+                return consultar_pagina(supabase, parametros, parametros["campos"], apos, quantidade)
+
+            # O primeiro bloco é lido antes dos cabeçalhos: erros do Supabase
+            # (coluna inexistente, RLS) ainda podem virar uma resposta de erro
+            restante = parametros["limite"]
+            cursor = parametros["apos"]
+            # Uma linha a mais no último bloco indica se há próxima página
+            bloco = buscar_bloco(cursor, min(LINHAS_POR_BLOCO, restante + 1))
+
             self.send_response(200)
             self.send_header('Content-Type', 'application/json')
+            enviar_cabecalhos_cache(self, etag)
             self.end_headers()
-            self.wfile.write(json.dumps(response.data).encode())
+            resposta_iniciada = True
+            self.wfile.write(b'{"dados": [')
+
+            primeira = True
+            proximo_cursor = None
+            while bloco:
+                pedidas = min(LINHAS_POR_BLOCO, restante + 1)
+                linhas = bloco[:restante]
+                for linha in linhas:
+                    self.wfile.write((b'' if primeira else b', ') + json.dumps(linha).encode())
+                    primeira = False
+                restante -= len(linhas)
+                cursor = linhas[-1]['id'] if linhas else cursor
+
+                if len(bloco) < pedidas:
+                    break  # fim da tabela
+                if restante == 0:
+                    proximo_cursor = cursor  # página cheia e ainda há linhas
+                    break
+                bloco = buscar_bloco(cursor, min(LINHAS_POR_BLOCO, restante + 1))
+
+            self.wfile.write(f'], "proximo_cursor": {json.dumps(proximo_cursor)}}}'.encode())
             
         except Exception as e:
+            print(f"Erro ao listar conteúdos: {str(e)}")
+            if resposta_iniciada:
+                # Cabeçalhos já enviados: o JSON incompleto sinaliza a falha ao cliente
+                return
             self.send_response(500)
             self.send_header('Content-Type', 'application/json')
             self.end_headers()
@@ -76,8 +234,20 @@ class handler(BaseHTTPRequestHandler):
 
             token = auth_header.split(' ')[1]
             
-            # Configura o token no cliente Supabase
-            supabase.auth.set_auth(token)
+            # Cliente com o token do usuário (RLS), sem alterar o cliente compartilhado
+            supabase = cliente_usuario(token)
+            
+            # Revalidação: só a versão da linha é lida para decidir pelo 304
+            if_none_match = self.headers.get('If-None-Match')
+            if if_none_match:
+                try:
+                    versao = supabase.table('base_dados_conteudo').select(f'id,{COLUNA_VERSAO}').eq('id', id).execute()
+                    etag = etag_conteudo(versao.data[0]) if versao.data else None
+                    if etag_corresponde(if_none_match, etag):
+                        responder_nao_modificado(self, etag)
+                        return
+                except Exception as e:
+                    print(f"Erro ao consultar a versão do conteúdo: {str(e)}")
             
             # Busca o conteúdo pelo ID (que agora é um int)
             response = supabase.table('base_dados_conteudo').select('*').eq('id', id).execute()
@@ -89,10 +259,12 @@ class handler(BaseHTTPRequestHandler):
                 self.wfile.write(json.dumps({"error": "Conteúdo não encontrado"}).encode())
                 return
             
+            conteudo = response.data[0]
             self.send_response(200)
             self.send_header('Content-Type', 'application/json')
+            enviar_cabecalhos_cache(self, etag_conteudo(conteudo))
             self.end_headers()
-            self.wfile.write(json.dumps(response.data[0]).encode())
+            self.wfile.write(json.dumps(conteudo).encode())
             
         except Exception as e:
             self.send_response(500)
@@ -0,0 +1,43 @@
+from http.server import BaseHTTPRequestHandler
+import json
+from api.utils.supabase_clientes import cliente_servico
+from api.utils.autenticacao import verificar_token
+from api.utils.dedup import estatisticas_dedup
+
+class handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        try:
+            # Verificar se o usuário está autenticado através do token JWT
+            auth_header = self.headers.get('Authorization')
+            if not auth_header or not auth_header.startswith('Bearer '):
+                self.send_response(401)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": "Token de autenticação não fornecido"}).encode())
+                return
+
+            token = auth_header.split(' ')[1]
+
+            try:
+                user = verificar_token(token)
+            except Exception as auth_error:
+                self.send_response(401)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": f"Autenticação inválida: {str(auth_error)}"}).encode())
+                return
+
+            service_supabase = cliente_servico()
+            estatisticas = estatisticas_dedup(service_supabase)
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps(estatisticas).encode())
+
+        except Exception as e:
+            print(f"Erro interno do servidor: {str(e)}")
+            self.send_response(500)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": f"Erro interno do servidor: {str(e)}"}).encode())
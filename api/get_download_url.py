@@ -1,48 +1,141 @@
 from http.server import BaseHTTPRequestHandler
 import json
 import os
-from supabase import create_client, Client
-from b2sdk.v2 import InMemoryAccountInfo, B2Api
+import re
+from api.utils.supabase_clientes import cliente_servico
+from api.utils.autenticacao import verificar_token
 from urllib.parse import parse_qs
-
-# Configuração do cliente Supabase
-supabase_url = os.environ.get("NEXT_PUBLIC_SUPABASE_URL")
-supabase_key = os.environ.get("NEXT_PUBLIC_SUPABASE_ANON_KEY")
-supabase_service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
-supabase: Client = create_client(supabase_url, supabase_key)
+from api.utils.b2 import executar_com_bucket
+from api.utils.cache import CacheLRU
+from api.utils.etapas import executor_consultas
 
 # Configuração do Backblaze B2
 b2_application_key_id = os.environ.get("B2_APPLICATION_KEY_ID")
 b2_application_key = os.environ.get("B2_APPLICATION_KEY")
 b2_bucket_name = os.environ.get("B2_BUCKET_NAME")
 
-def get_temporary_url(backblaze_filename, valid_duration=600):
+# Validade das URLs assinadas e margem antes do vencimento em que deixam de ser reaproveitadas
+URL_VALIDADE = 600
+URL_MARGEM_EXPIRACAO = 120
+
+# URLs assinadas por backblaze_filename, reaproveitadas enquanto ainda têm validade suficiente
+cache_urls = CacheLRU(max_itens=2048, ttl=URL_VALIDADE - URL_MARGEM_EXPIRACAO)
+
+# id do documento -> (backblaze_filename, nome_arquivo)
+cache_documentos = CacheLRU(max_itens=4096, ttl=3600)
+
+def get_temporary_url(backblaze_filename, valid_duration=URL_VALIDADE):
     """Função para gerar URL de download temporária"""
+    url_em_cache = cache_urls.get(backblaze_filename)
+    if url_em_cache:
+        return url_em_cache
+    
     try:
-        # Inicializar o cliente Backblaze B2
-        info = InMemoryAccountInfo()
-        b2_api = B2Api(info)
-        b2_api.authorize_account("production", b2_application_key_id, b2_application_key)
+        # Usar a sessão B2 compartilhada (conta autorizada e bucket em cache)
+        def gerar_url(bucket):
+            # Gerar autorização de download
+            download_auth = bucket.get_download_authorization(
+                backblaze_filename, 
+                valid_duration
+            )
+            
+            # Gerar URL base
+            base_url = bucket.get_download_url(backblaze_filename)
+            
+            # Retornar URL autorizada
+            return f"{base_url}?Authorization={download_auth}"
         
-        # Obter bucket
-        bucket = b2_api.get_bucket_by_name(b2_bucket_name)
+        url = executar_com_bucket(gerar_url)
+        cache_urls.set(backblaze_filename, url, ttl=max(0, valid_duration - URL_MARGEM_EXPIRACAO))
+        return url
+    except Exception as e:
+        print(f"Erro ao gerar URL de download temporária: {e}")
         
-        # Gerar autorização de download
-        download_auth = bucket.get_download_authorization(
-            backblaze_filename, 
-            valid_duration
-        )
+        # Fallback para URL direta (caso a autorização falhe)
+        return f"https://f002.backblazeb2.com/file/{b2_bucket_name}/{backblaze_filename}"
+
+# Máximo de documentos por requisição em lote
+MAX_IDS_LOTE = 200
+
+# Prefixo que o upload.py dá a cada arquivo ({temp_id}_{timestamp}_). Só arquivos enviados
+# no mesmo segundo o compartilham, então uma autorização para ele não abre o resto do bucket.
+PREFIXO_UPLOAD = re.compile(r'^\d{9,}_\d{9,}_')
+
+def agrupar_por_prefixo(backblaze_filenames):
+    """
+    Separa os nomes em grupos que podem dividir uma autorização (prefixo de upload
+    em comum) e nomes que precisam de autorização própria. Retorna (grupos, avulsos),
+    com grupos no formato prefixo -> [nomes].
+    """
+    por_prefixo = {}
+    avulsos = []
+    for nome in backblaze_filenames:
+        encontrado = PREFIXO_UPLOAD.match(nome)
+        if encontrado:
+            por_prefixo.setdefault(encontrado.group(0), []).append(nome)
+        else:
+            avulsos.append(nome)
+    
+    grupos = {}
+    for prefixo, nomes in por_prefixo.items():
+        if len(nomes) > 1:
+            grupos[prefixo] = nomes
+        else:
+            avulsos.extend(nomes)
+    return grupos, avulsos
+
+def get_temporary_urls(backblaze_filenames, valid_duration=URL_VALIDADE):
+    """
+    Gera URLs temporárias para vários arquivos em uma única sessão do B2. Arquivos
+    com o mesmo prefixo de upload dividem uma autorização; os demais recebem uma
+    autorização por arquivo, pedidas em paralelo (até CONSULTAS_CONCORRENTES). Retorna um dict backblaze_filename -> URL (URLs ainda
+    válidas vêm do cache).
+    """
+    urls = {}
+    pendentes = []
+    for nome in dict.fromkeys(backblaze_filenames):
+        url_em_cache = cache_urls.get(nome)
+        if url_em_cache:
+            urls[nome] = url_em_cache
+        else:
+            pendentes.append(nome)
+    
+    if not pendentes:
+        return urls
+    
+    if len(pendentes) == 1:
+        urls[pendentes[0]] = get_temporary_url(pendentes[0], valid_duration)
+        return urls
+    
+    try:
+        grupos, avulsos = agrupar_por_prefixo(pendentes)
+        
+        # Um alvo de autorização por grupo e por arquivo avulso
+        alvos = list(grupos.items()) + [(nome, [nome]) for nome in avulsos]
         
-        # Gerar URL base
-        base_url = bucket.get_download_url(backblaze_filename)
+        def gerar_urls(bucket):
+            # Cada autorização é uma chamada ao B2: saem juntas pelo pool de consultas
+            autorizacoes = executor_consultas.map(
+                lambda alvo: bucket.get_download_authorization(alvo[0], valid_duration), alvos
+            )
+            geradas = {}
+            for (_, nomes), download_auth in zip(alvos, autorizacoes):
+                for nome in nomes:
+                    geradas[nome] = f"{bucket.get_download_url(nome)}?Authorization={download_auth}"
+            return geradas
         
-        # Retornar URL autorizada
-        return f"{base_url}?Authorization={download_auth}"
+        novas_urls = executar_com_bucket(gerar_urls)
+        for nome, url in novas_urls.items():
+            cache_urls.set(nome, url, ttl=max(0, valid_duration - URL_MARGEM_EXPIRACAO))
+        urls.update(novas_urls)
     except Exception as e:
-        print(f"Erro ao gerar URL de download temporária: {e}")
+        print(f"Erro ao gerar URLs de download em lote: {e}")
         
         # Fallback para URL direta (caso a autorização falhe)
-        return f"https://f002.backblazeb2.com/file/{b2_bucket_name}/{backblaze_filename}"
+        for nome in pendentes:
+            urls[nome] = f"https://f002.backblazeb2.com/file/{b2_bucket_name}/{nome}"
+    
+    return urls
 
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
@@ -60,10 +153,7 @@ class handler(BaseHTTPRequestHandler):
             
             # Validar o token do usuário (igual ao upload.py)
             try:
-                user_response = supabase.auth.get_user(token)
-                user = user_response.user
-                if not user:
-                    raise Exception("Usuário não autenticado")
+                user = verificar_token(token)
             except Exception as auth_error:
                 print(f"Erro de autenticação: {str(auth_error)}")
                 self.send_response(401)
@@ -77,6 +167,21 @@ class handler(BaseHTTPRequestHandler):
             query_components = parse_qs(self.path.split('?')[1]) if '?' in self.path else {}
             document_id_str = query_components.get('id', [''])[0]
             
+            # Modo em lote: /api/get_download_url?ids=1,2,3
+            if query_components.get('ids'):
+                return self.get_download_urls_lote(query_components['ids'][0])
+            
+            # /api/get_download_url?stats=1 retorna os contadores dos caches
+            if query_components.get('stats', [''])[0] == '1':
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({
+                    "cache_urls": cache_urls.estatisticas(),
+                    "cache_documentos": cache_documentos.estatisticas()
+                }).encode())
+                return
+            
             if not document_id_str:
                 self.send_response(400)
                 self.send_header('Content-Type', 'application/json')
@@ -94,21 +199,30 @@ class handler(BaseHTTPRequestHandler):
                 self.wfile.write(json.dumps({"error": "ID do documento inválido. Deve ser um número."}).encode())
                 return
             
-            # Criar um cliente com a chave de serviço (como em upload.py)
-            service_supabase = create_client(supabase_url, supabase_service_key)
+            # Buscar o backblaze_filename (primeiro no cache, depois no Supabase)
+            documento_em_cache = cache_documentos.get(document_id)
             
-            # Buscar o backblaze_filename no Supabase usando o cliente de serviço
-            response = service_supabase.table('base_dados_conteudo').select('backblaze_filename, nome_arquivo').eq('id', document_id).execute()
-            
-            if not response.data:
-                self.send_response(404)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": "Documento não encontrado"}).encode())
-                return
-            
-            backblaze_filename = response.data[0].get('backblaze_filename')
-            nome_arquivo = response.data[0].get('nome_arquivo')
+            if documento_em_cache:
+                backblaze_filename, nome_arquivo = documento_em_cache
+            else:
+                # Cliente com a chave de serviço (compartilhado, como em upload.py)
+                service_supabase = cliente_servico()
+                
+                # Buscar o backblaze_filename no Supabase usando o cliente de serviço
+                response = service_supabase.table('base_dados_conteudo').select('backblaze_filename, nome_arquivo').eq('id', document_id).execute()
+                
+                if not response.data:
+                    self.send_response(404)
+                    self.send_header('Content-Type', 'application/json')
+                    self.end_headers()
+                    self.wfile.write(json.dumps({"error": "Documento não encontrado"}).encode())
+                    return
+                
+                backblaze_filename = response.data[0].get('backblaze_filename')
+                nome_arquivo = response.data[0].get('nome_arquivo')
+                
+                if backblaze_filename:
+                    cache_documentos.set(document_id, (backblaze_filename, nome_arquivo))
             
             if not backblaze_filename:
                 self.send_response(404)
@@ -117,7 +231,8 @@ class handler(BaseHTTPRequestHandler):
                 self.wfile.write(json.dumps({"error": "Nome do arquivo no Backblaze não encontrado"}).encode())
                 return
             
-            # Gerar URL temporária
+            # Gerar URL temporária (reaproveitada do cache enquanto ainda for válida)
+            url_em_cache = backblaze_filename in cache_urls
             temp_url = get_temporary_url(backblaze_filename)
             
             if not temp_url:
@@ -130,6 +245,7 @@ class handler(BaseHTTPRequestHandler):
             # Retornar a URL temporária
             self.send_response(200)
             self.send_header('Content-Type', 'application/json')
+            self.send_header('X-Cache', 'HIT' if documento_em_cache and url_em_cache else 'MISS')
             self.end_headers()
             self.wfile.write(json.dumps({
                 "url": temp_url,
@@ -141,4 +257,61 @@ class handler(BaseHTTPRequestHandler):
             self.send_response(500)
             self.send_header('Content-Type', 'application/json')
             self.end_headers()
-            self.wfile.write(json.dumps({"error": f"Erro interno do servidor: {str(e)}"}).encode())
\ No newline at end of file
+            self.wfile.write(json.dumps({"error": f"Erro interno do servidor: {str(e)}"}).encode())
+
+    def get_download_urls_lote(self, ids_str):
+        """Resolve vários documentos com uma consulta e uma sessão do B2 para assinar as URLs"""
+        try:
+            document_ids = list(dict.fromkeys(int(i) for i in ids_str.split(',') if i.strip()))
+        except ValueError:
+            self.send_response(400)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "IDs de documento inválidos. Devem ser números separados por vírgula."}).encode())
+            return
+        
+        if not document_ids or len(document_ids) > MAX_IDS_LOTE:
+            self.send_response(400)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": f"Informe entre 1 e {MAX_IDS_LOTE} IDs de documento"}).encode())
+            return
+        
+        # Documentos já conhecidos vêm do cache; os demais em uma única consulta
+        documentos = {}
+        faltantes = []
+        for document_id in document_ids:
+            documento_em_cache = cache_documentos.get(document_id)
+            if documento_em_cache:
+                documentos[document_id] = documento_em_cache
+            else:
+                faltantes.append(document_id)
+        
+        if faltantes:
+            service_supabase = cliente_servico()
+            response = service_supabase.table('base_dados_conteudo').select('id, backblaze_filename, nome_arquivo').in_('id', faltantes).execute()
+            
+            for row in response.data or []:
+                if row.get('backblaze_filename'):
+                    documento = (row['backblaze_filename'], row.get('nome_arquivo'))
+                    documentos[row['id']] = documento
+                    cache_documentos.set(row['id'], documento)
+        
+        urls = get_temporary_urls([documento[0] for documento in documentos.values()])
+        
+        resultado = {}
+        for document_id in document_ids:
+            if document_id in documentos:
+                backblaze_filename, nome_arquivo = documentos[document_id]
+                resultado[str(document_id)] = {
+                    "url": urls.get(backblaze_filename),
+                    "filename": nome_arquivo
+                }
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps({
+            "urls": resultado,
+            "nao_encontrados": [document_id for document_id in document_ids if document_id not in documentos]
+        }).encode())
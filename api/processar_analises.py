@@ -0,0 +1,88 @@
+from http.server import BaseHTTPRequestHandler
+import json
+import os
+import time
+import traceback
+from api.utils.supabase_clientes import cliente_servico
+from api.utils.autenticacao import verificar_token
+from api.utils.fila import obter_fila
+from api.utils.analise_ia import executar_job_analise
+
+# Segredo enviado pelo Vercel Cron no header Authorization
+cron_secret = os.environ.get("CRON_SECRET")
+
+# Limites de cada execução do worker (deve terminar antes do timeout da função)
+MAX_JOBS_POR_EXECUCAO = 20
+TEMPO_MAX_EXECUCAO = 50
+
+def processar_fila(fila, service_supabase, max_jobs=MAX_JOBS_POR_EXECUCAO, tempo_max=TEMPO_MAX_EXECUCAO):
+    """Consome jobs da fila até esvaziá-la ou atingir os limites da execução"""
+    inicio = time.time()
+    processados = 0
+    concluidos = 0
+    falhas = 0
+
+    while processados < max_jobs and time.time() - inicio < tempo_max:
+        job = fila.reservar()
+        if job is None:
+            break
+
+        processados += 1
+        situacao, _ = executar_job_analise(fila, job, service_supabase)
+        if situacao == 'concluido':
+            concluidos += 1
+        elif situacao == 'falha':
+            falhas += 1
+
+    return {
+        "processados": processados,
+        "concluidos": concluidos,
+        "falhas": falhas,
+        "duracao": round(time.time() - inicio, 3)
+    }
+
+class handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        try:
+            # Aceita o segredo do Vercel Cron ou o token de um usuário autenticado
+            auth_header = self.headers.get('Authorization')
+            if not auth_header or not auth_header.startswith('Bearer '):
+                self.send_response(401)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": "Token de autenticação não fornecido"}).encode())
+                return
+
+            token = auth_header.split(' ')[1]
+
+            if not cron_secret or token != cron_secret:
+                try:
+                    user = verificar_token(token)
+                except Exception as auth_error:
+                    self.send_response(401)
+                    self.send_header('Content-Type', 'application/json')
+                    self.end_headers()
+                    self.wfile.write(json.dumps({"error": f"Autenticação inválida: {str(auth_error)}"}).encode())
+                    return
+
+            service_supabase = cliente_servico()
+            fila = obter_fila(service_supabase)
+
+            resumo = processar_fila(fila, service_supabase)
+            print(f"Execução do worker de análises: {resumo}")
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps({
+                "success": True,
+                **resumo
+            }).encode())
+
+        except Exception as e:
+            print(f"Erro interno do servidor: {str(e)}")
+            print(traceback.format_exc())
+            self.send_response(500)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": f"Erro interno do servidor: {str(e)}"}).encode())
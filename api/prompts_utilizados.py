@@ -0,0 +1,113 @@
+from http.server import BaseHTTPRequestHandler
+import json
+import os
+import traceback
+from api.utils.supabase_clientes import cliente_servico
+from api.utils.autenticacao import verificar_token
+from urllib.parse import parse_qs
+from api.utils.prompts_utilizados import carregar_prompts, migrar_prompts, TABELAS_COM_PROMPT
+
+# Segredo aceito para disparar a migração fora do navegador
+cron_secret = os.environ.get("CRON_SECRET")
+
+# Máximo de hashes por consulta
+MAX_HASHES = 100
+
+class handler(BaseHTTPRequestHandler):
+    def token(self):
+        """Token Bearer do header; em caso de erro já envia a resposta 401 e retorna None"""
+        auth_header = self.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            self.responder(401, {"error": "Token de autenticação não fornecido"})
+            return None
+        return auth_header.split(' ')[1]
+
+    def autenticar(self, token, estrito=False):
+        """Valida o token JWT; em caso de erro já envia a resposta 401 e retorna None"""
+        try:
+            user = verificar_token(token, estrito=estrito)
+            return user
+        except Exception as auth_error:
+            self.responder(401, {"error": f"Autenticação inválida: {str(auth_error)}"})
+            return None
+
+    def responder(self, status, dados):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(dados).encode())
+
+    def do_GET(self):
+        """Textos dos prompts utilizados: /api/prompts_utilizados?hash=<sha256>[,<sha256>...]"""
+        try:
+            token = self.token()
+            if not token or not self.autenticar(token):
+                return
+
+            query_components = parse_qs(self.path.split('?')[1]) if '?' in self.path else {}
+            hashes = [h for h in query_components.get('hash', [''])[0].split(',') if h]
+            if not hashes:
+                self.responder(400, {"error": "Hash do prompt não fornecido"})
+                return
+            if len(hashes) > MAX_HASHES:
+                self.responder(400, {"error": f"Máximo de {MAX_HASHES} hashes por consulta"})
+                return
+
+            service_supabase = cliente_servico()
+            prompts = carregar_prompts(service_supabase, hashes)
+            if not prompts:
+                self.responder(404, {"error": "Prompt não encontrado"})
+                return
+
+            self.responder(200, {"prompts": prompts})
+
+        except Exception as e:
+            print(f"Erro interno do servidor: {str(e)}")
+            self.responder(500, {"error": f"Erro interno do servidor: {str(e)}"})
+
+    def do_POST(self):
+        """
+        Migração única dos prompt_utilizado existentes para a tabela de prompts.
+        Restrita a administradores (ou ao CRON_SECRET). Corpo opcional: tabelas
+        (lista). Repetir a chamada até linhas_restantes ser 0 em todas as tabelas.
+        """
+        try:
+            token = self.token()
+            if not token:
+                return
+
+            service_supabase = cliente_servico()
+
+            if not cron_secret or token != cron_secret:
+                # Rota administrativa: token conferido também no GoTrue (sessão revogada é recusada)
+                user = self.autenticar(token, estrito=True)
+                if not user:
+                    return
+                usuario = service_supabase.table('usuarios').select('admin').eq('id', user.id).execute()
+                if not usuario.data or not usuario.data[0].get('admin'):
+                    self.responder(403, {"error": "Apenas administradores podem executar a migração"})
+                    return
+
+            content_length = int(self.headers.get('Content-Length') or 0)
+            data = json.loads(self.rfile.read(content_length)) if content_length else {}
+            tabelas = data.get('tabelas') or list(TABELAS_COM_PROMPT)
+            invalidas = [t for t in tabelas if t not in TABELAS_COM_PROMPT]
+            if invalidas:
+                self.responder(400, {"error": f"Tabelas inválidas: {', '.join(invalidas)}"})
+                return
+
+            # Divide o tempo da execução entre as tabelas
+            tempo_por_tabela = 45 / len(tabelas)
+            resultados = [migrar_prompts(service_supabase, tabela, tempo_max=tempo_por_tabela) for tabela in tabelas]
+            print(f"Migração de prompts utilizados: {resultados}")
+
+            self.responder(200, {
+                "success": True,
+                "concluida": all(r['linhas_restantes'] == 0 for r in resultados),
+                "tabelas": resultados
+            })
+
+        except Exception as e:
+            print(f"Erro interno do servidor: {str(e)}")
+            print(traceback.format_exc())
+            self.responder(500, {"error": f"Erro interno do servidor: {str(e)}"})
@@ -0,0 +1,70 @@
+from http.server import BaseHTTPRequestHandler
+import json
+from api.utils.supabase_clientes import cliente_servico
+from api.utils.autenticacao import verificar_token
+from urllib.parse import parse_qs
+from api.utils.fila import obter_fila
+
+class handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        try:
+            # Verificar se o usuário está autenticado através do token JWT
+            auth_header = self.headers.get('Authorization')
+            if not auth_header or not auth_header.startswith('Bearer '):
+                self.send_response(401)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": "Token de autenticação não fornecido"}).encode())
+                return
+
+            token = auth_header.split(' ')[1]
+
+            try:
+                user = verificar_token(token)
+            except Exception as auth_error:
+                self.send_response(401)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": f"Autenticação inválida: {str(auth_error)}"}).encode())
+                return
+
+            # A URL deve ser algo como /api/status_analise?job_id=<uuid>
+            query_components = parse_qs(self.path.split('?')[1]) if '?' in self.path else {}
+            job_id = query_components.get('job_id', [''])[0]
+
+            if not job_id:
+                self.send_response(400)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": "ID do job não fornecido"}).encode())
+                return
+
+            service_supabase = cliente_servico()
+            job = obter_fila(service_supabase).status(job_id)
+
+            if not job:
+                self.send_response(404)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": "Job não encontrado"}).encode())
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps({
+                "job_id": job['id'],
+                "status": job['status'],
+                "documento_id": job['payload'].get('documento_id'),
+                "tentativas": job['tentativas'],
+                "max_tentativas": job['max_tentativas'],
+                "erro": job.get('erro'),
+                "atualizado_em": job.get('atualizado_em')
+            }, default=str).encode())
+
+        except Exception as e:
+            print(f"Erro interno do servidor: {str(e)}")
+            self.send_response(500)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": f"Erro interno do servidor: {str(e)}"}).encode())
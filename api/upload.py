@@ -3,61 +3,42 @@ import json
 import os
 import time
 from datetime import datetime
-import cgi
+from concurrent.futures import ThreadPoolExecutor
 import sys
 import traceback
-from supabase import create_client, Client
-from b2sdk.v2 import InMemoryAccountInfo, B2Api, UploadSourceBytes
-from PyPDF2 import PdfReader
-import tempfile
-import re  # ← Adicionado para limpeza de texto
-
-# Configuração do cliente Supabase
-supabase_url = os.environ.get("NEXT_PUBLIC_SUPABASE_URL")
-supabase_key = os.environ.get("NEXT_PUBLIC_SUPABASE_ANON_KEY")
-supabase_service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
-supabase: Client = create_client(supabase_url, supabase_key)
+from api.utils.supabase_clientes import cliente_servico
+from api.utils.autenticacao import verificar_token
+from api.utils.multipart import parse_multipart, MultipartError, ArquivoMuitoGrandeError
+from api.utils.pdf_texto import extrair_texto_paginas
+from api.utils.texto import limpar_texto_para_postgres
+from api.utils.analise_ia import analisar_com_ia, enfileirar_analise_documento, executar_job_analise, resolver_prompt_documento
+from api.utils.dedup import buscar_documento_por_hash, retorno_ia_reutilizavel, conflito_documento_original
+from api.utils.fila import obter_fila, STATUS_PENDENTE, STATUS_CONCLUIDO
+from api.utils.b2 import obter_bucket, executar_com_bucket, enviar_arquivo_b2, excluir_arquivo_b2
+from b2sdk.v2.exception import InvalidAuthToken, Unauthorized
+from api.utils.etapas import MedidorEtapas
 
 # Configuração do Backblaze B2
 b2_application_key_id = os.environ.get("B2_APPLICATION_KEY_ID")
 b2_application_key = os.environ.get("B2_APPLICATION_KEY")
 b2_bucket_name = os.environ.get("B2_BUCKET_NAME")
 
-def limpar_texto_para_postgres(texto):
-    """
-    ✅ NOVA FUNÇÃO: Limpa texto para ser compatível com PostgreSQL
-    Remove null bytes e outros caracteres problemáticos
-    """
-    if not texto:
-        return ""
-    
-    # Remover null bytes (\u0000) e outros caracteres de controle problemáticos
-    texto_limpo = texto.replace('\u0000', '')  # Remove null bytes
-    
-    # Remover outros caracteres de controle Unicode problemáticos
-    # Manter apenas quebras de linha, tabs e caracteres imprimíveis
-    texto_limpo = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]', '', texto_limpo)
-    
-    # Normalizar quebras de linha
-    texto_limpo = re.sub(r'\r\n|\r', '\n', texto_limpo)
-    
-    # Remover múltiplas quebras de linha consecutivas
-    texto_limpo = re.sub(r'\n{3,}', '\n\n', texto_limpo)
-    
-    # Remover espaços em excesso
-    texto_limpo = re.sub(r' {2,}', ' ', texto_limpo)
-    
-    return texto_limpo.strip()
+# Limites do upload (arquivo e campos de texto do formulário).
+# Com o upload em partes para o B2 o limite do arquivo pode ser aumentado via UPLOAD_MAX_MB
+MAX_TAMANHO_ARQUIVO_MB = int(os.environ.get("UPLOAD_MAX_MB", "10"))
+MAX_TAMANHO_ARQUIVO = MAX_TAMANHO_ARQUIVO_MB * 1024 * 1024
+MAX_TAMANHO_CAMPOS = 1024 * 1024
 
 def extrair_texto_pdf(pdf_file):
     """✅ FUNÇÃO MODIFICADA: Extrai texto de um arquivo PDF usando PyPDF2 com limpeza"""
     try:
         pdf_file.seek(0)
-        reader = PdfReader(pdf_file)
-        texto = ""
-        for page in reader.pages:
-            page_text = page.extract_text() or ""
-            texto += page_text
+        # Arquivos em disco são lidos pelo caminho em cada processo; os em memória vão como bytes
+        nome = getattr(pdf_file, 'name', None)
+        fonte = nome if isinstance(nome, str) and os.path.exists(nome) else pdf_file.read()
+        
+        # Páginas divididas entre processos e unidas com um único join
+        texto = extrair_texto_paginas(fonte)
         
         # ✅ ADICIONADO: Limpar o texto antes de retornar
         texto_limpo = limpar_texto_para_postgres(texto)
@@ -69,113 +50,29 @@ def extrair_texto_pdf(pdf_file):
         print(f"Erro ao extrair texto do PDF: {str(e)}")
         return ""
 
-def analisar_com_ia(file_id, texto_extraido, categoria_id, service_supabase):
-    """Função para analisar o texto com a API Gemini"""
-    try:
-        # Verificar se o texto extraído existe e não está vazio
-        if not texto_extraido or texto_extraido.strip() == '':
-            print("Texto extraído vazio, pulando análise de IA")
-            return None
-        
-        # Primeiro, verificar se existe um prompt vinculado à categoria do documento
-        prompt_id = None
-        texto_prompt = None
-        
-        if categoria_id:
-            # Buscar categoria para verificar se tem prompt_id
-            categoria_response = service_supabase.table('categorias').select('prompt_id').eq('id', categoria_id).execute()
-            
-            if categoria_response.data and len(categoria_response.data) > 0 and categoria_response.data[0].get('prompt_id'):
-                prompt_id = categoria_response.data[0].get('prompt_id')
-                
-                # Buscar o texto do prompt vinculado à categoria
-                prompt_categoria_response = service_supabase.table('prompts').select('texto_prompt').eq('id', prompt_id).execute()
-                
-                if prompt_categoria_response.data and len(prompt_categoria_response.data) > 0:
-                    texto_prompt = prompt_categoria_response.data[0].get('texto_prompt')
-                    print(f"Usando prompt vinculado à categoria (ID: {prompt_id})")
-        
-        # Se não encontrou prompt vinculado à categoria, buscar o prompt padrão
-        if not texto_prompt:
-            prompt_response = service_supabase.table('prompts').select('*').eq('padrao', True).execute()
-            
-            if not prompt_response.data or len(prompt_response.data) == 0:
-                print("Nenhum prompt padrão configurado, usando prompt genérico")
-                # Usar prompt genérico se não houver prompt padrão
-                prompt_id = None
-                texto_prompt = "Faça uma análise do texto abaixo:"
-            else:
-                # Usar o prompt padrão configurado
-                prompt_data = prompt_response.data[0]
-                prompt_id = prompt_data.get('id')
-                texto_prompt = prompt_data.get('texto_prompt', "Faça uma análise do texto abaixo:")
-                print(f"Usando prompt padrão (ID: {prompt_id})")
-        
-        # Buscar a chave API vigente do Gemini
-        chave_response = service_supabase.table('configuracoes_gemini').select('chave').eq('vigente', True).execute()
-        
-        if not chave_response.data or len(chave_response.data) == 0:
-            print("Chave API Gemini não configurada, pulando análise")
-            return None
-            
-        api_key = chave_response.data[0].get('chave')
-        
-        # Importar Google Generative AI
-        import google.generativeai as genai
-        
-        # Configurar API
-        genai.configure(api_key=api_key)
-        
-        # Preparar o prompt completo
-        prompt_completo = f"{texto_prompt}\n\n{texto_extraido}"
-        
-        print(f"Enviando texto para análise com IA (Prompt: {texto_prompt[:50]}...)")
-        
-        # Chamar a API Gemini
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        response = model.generate_content(prompt_completo)
-        
-        # Extrair o texto da resposta
-        resultado = response.text
-        
-        # ✅ ADICIONADO: Limpar o resultado da IA também
-        resultado_limpo = limpar_texto_para_postgres(resultado)
-        
-        print(f"Resposta da IA recebida. Tamanho: {len(resultado)} caracteres, após limpeza: {len(resultado_limpo)} caracteres")
-        
-        # Atualizar o documento com o resultado da análise
-        update_response = service_supabase.table('base_dados_conteudo').update({
-            'retorno_ia': resultado_limpo
-        }).eq('id', file_id).execute()
-        
-        print(f"Análise de IA concluída e salva para o documento {file_id}")
-        return resultado_limpo
-        
-    except Exception as e:
-        print(f"Erro ao analisar com IA: {str(e)}")
-        traceback.print_exc()  # Imprime stack trace completo
-        return None
-
 def get_download_url(bucket, filename, valid_duration=600):
-    """Função para gerar URL de download segura"""
+    """
+    Função para gerar URL de download segura. Erros de autorização da conta
+    (401) são repassados para que executar_com_bucket renove a sessão.
+    """
+    # Método 1: Tentar autorização de download
     try:
-        # Método 1: Tentar autorização de download
-        try:
-            download_auth = bucket.get_download_authorization(filename, valid_duration)
-            base_url = bucket.get_download_url(filename)
-            return f"{base_url}?Authorization={download_auth}"
-        except Exception as auth_err:
-            print(f"Erro na autorização de download: {auth_err}")
-        
-        # Método 2: URL base do Backblaze
-        base_url = f"https://f002.backblazeb2.com/file/{bucket.name}/{filename}"
-        return base_url
-    except Exception as e:
-        print(f"Erro ao gerar URL de download: {e}")
-        return None
+        download_auth = bucket.get_download_authorization(filename, valid_duration)
+        base_url = bucket.get_download_url(filename)
+        return f"{base_url}?Authorization={download_auth}"
+    except (InvalidAuthToken, Unauthorized):
+        raise
+    except Exception as auth_err:
+        print(f"Erro na autorização de download: {auth_err}")
+    
+    # Método 2: URL base do Backblaze
+    return f"https://f002.backblazeb2.com/file/{bucket.name}/{filename}"
 
 class handler(BaseHTTPRequestHandler):
     def do_POST(self):
+        form = None
+        # Tempos de cada etapa do upload (retornados na resposta)
+        medidor = MedidorEtapas()
         try:
             # Verificar se as variáveis de ambiente estão configuradas
             if not b2_application_key_id or not b2_application_key or not b2_bucket_name:
@@ -206,10 +103,7 @@ class handler(BaseHTTPRequestHandler):
             # Verificar a autenticação do usuário
             try:
                 # Validar o token via Supabase
-                user_response = supabase.auth.get_user(token)
-                user = user_response.user
-                if not user:
-                    raise Exception("Usuário não autenticado")
+                user = medidor.medir('autenticacao', verificar_token, token)
             except Exception as auth_error:
                 print(f"Erro de autenticação: {str(auth_error)}")
                 self.send_response(401)
@@ -218,7 +112,9 @@ class handler(BaseHTTPRequestHandler):
                 self.wfile.write(json.dumps({"error": f"Autenticação inválida: {str(auth_error)}"}).encode())
                 return
             
-            # Processar o upload do arquivo usando cgi FieldStorage
+            # Processar o upload com o parser multipart incremental:
+            # o arquivo é gravado em blocos (memória/disco) enquanto chega,
+            # e corpos acima do limite são rejeitados antes de serem lidos
             content_type = self.headers.get('Content-Type')
             if not content_type or not content_type.startswith('multipart/form-data'):
                 self.send_response(400)
@@ -227,24 +123,31 @@ class handler(BaseHTTPRequestHandler):
                 self.wfile.write(json.dumps({"error": "Formato de conteúdo inválido. Esperado multipart/form-data"}).encode())
                 return
             
-            # Configurar ambiente para o cgi.FieldStorage
-            environ = {'REQUEST_METHOD': 'POST'}
-            headers = {}
-            for name, value in self.headers.items():
-                headers[name] = value
-                
-            environ['CONTENT_TYPE'] = headers.get('Content-Type', '')
-            environ['CONTENT_LENGTH'] = headers.get('Content-Length', '0')
-            
-            # Processar os campos do formulário
-            form = cgi.FieldStorage(
-                fp=self.rfile,
-                headers=headers,
-                environ=environ
-            )
+            try:
+                form = medidor.medir(
+                    'leitura_formulario',
+                    parse_multipart,
+                    self.rfile,
+                    self.headers,
+                    max_arquivo=MAX_TAMANHO_ARQUIVO,
+                    max_corpo=MAX_TAMANHO_ARQUIVO + MAX_TAMANHO_CAMPOS
+                )
+            except ArquivoMuitoGrandeError as size_error:
+                print(f"Upload rejeitado: {str(size_error)}")
+                self.send_response(400)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": f"O arquivo não pode ter mais de {MAX_TAMANHO_ARQUIVO_MB}MB"}).encode())
+                return
+            except MultipartError as form_error:
+                self.send_response(400)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": f"Erro ao processar formulário: {str(form_error)}"}).encode())
+                return
             
             # Verificar se o arquivo está presente
-            if 'file' not in form:
+            if 'file' not in form.arquivos:
                 self.send_response(400)
                 self.send_header('Content-Type', 'application/json')
                 self.end_headers()
@@ -289,94 +192,113 @@ class handler(BaseHTTPRequestHandler):
                 self.wfile.write(json.dumps({"error": "Campos obrigatórios não fornecidos"}).encode())
                 return
             
-            # Ler o conteúdo do arquivo
-            file_data = fileitem.file.read()
+            # O arquivo já foi gravado e validado (tamanho e hash) durante o parse
             filename = fileitem.filename
             filetype = 'application/pdf'  # Estamos apenas aceitando PDFs
-            filesize = len(file_data)
+            filesize = fileitem.tamanho
             
-            # Verificar tamanho do arquivo (limite de 10MB)
-            if filesize > 10 * 1024 * 1024:
-                self.send_response(400)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": "O arquivo não pode ter mais de 10MB"}).encode())
-                return
+            # Cliente Supabase com a chave de serviço (consulta de deduplicação e inserção)
+            print("Conectando ao Supabase com chave de serviço")
+            service_supabase = cliente_servico()
             
-            # Inicializar o cliente Backblaze B2 com tratamento de erro detalhado
+            # Deduplicação por conteúdo: se o mesmo PDF já foi enviado, reaproveitar
+            # o arquivo no Backblaze e o texto extraído em vez de processar de novo
+            documento_existente = None
+            # Versão enviada ao B2 por esta requisição (removida se outro upload do mesmo PDF vencer)
+            arquivo_enviado = {}
             try:
-                print("Inicializando cliente B2 com credenciais")
-                
-                info = InMemoryAccountInfo()
-                b2_api = B2Api(info)
-                b2_api.authorize_account("production", b2_application_key_id, b2_application_key)
-                
-                # Verificar se o bucket existe
+                documento_existente = medidor.medir(
+                    'deduplicacao', buscar_documento_por_hash, service_supabase, fileitem.sha256
+                )
+            except Exception as dedup_error:
+                print(f"Erro ao consultar deduplicação (seguindo com upload normal): {str(dedup_error)}")
+            
+            if documento_existente:
+                unique_filename = documento_existente['backblaze_filename']
+                download_url = documento_existente.get('url_arquivo')
+                texto_extraido = documento_existente.get('conteudo') or ""
+                print(f"Deduplicação: conteúdo já enviado no documento {documento_existente['id']} "
+                      f"({filesize} bytes economizados)")
+            else:
+                # Inicializar o cliente Backblaze B2 com tratamento de erro detalhado
                 try:
-                    bucket = b2_api.get_bucket_by_name(b2_bucket_name)
-                    print(f"Bucket encontrado: {bucket.name}")
-                except Exception as bucket_error:
-                    print(f"Erro ao obter bucket: {str(bucket_error)}")
+                    # Obter o bucket da sessão B2 compartilhada (autorização reaproveitada entre requisições)
+                    try:
+                        bucket = obter_bucket()
+                        print(f"Bucket encontrado: {bucket.name}")
+                    except Exception as bucket_error:
+                        print(f"Erro ao obter bucket: {str(bucket_error)}")
+                        self.send_response(500)
+                        self.send_header('Content-Type', 'application/json')
+                        self.end_headers()
+                        self.wfile.write(json.dumps({"error": f"Erro ao acessar bucket: {str(bucket_error)}"}).encode())
+                        return
+                    
+                    # Criar um nome de arquivo único para evitar colisões
+                    timestamp = int(time.time())
+                    # Use um timestamp como identificador temporário para o nome do arquivo
+                    temp_id = timestamp
+                    unique_filename = f"{temp_id}_{timestamp}_{filename}"
+                    
+                    # Fazer upload do arquivo para o Backblaze B2
+                    file_info = {
+                        'categoria_id': categoria_id,
+                        'projeto_id': projeto_id,
+                        'descricao': descricao
+                    }
+                    
+                    def extrair_texto():
+                        # Extrair o texto diretamente do arquivo recebido (sem cópia extra)
+                        with fileitem.open() as pdf_stream:
+                            return extrair_texto_pdf(pdf_stream)
+                    
+                    def enviar_e_gerar_url():
+                        # Enviar a partir do arquivo recebido (em partes paralelas se for grande)
+                        print(f"Fazendo upload do arquivo: {unique_filename}")
+                        uploaded_file = executar_com_bucket(
+                            lambda bucket: enviar_arquivo_b2(bucket, fileitem, unique_filename, filetype, file_info)
+                        )
+                        print(f"Upload concluído: {uploaded_file.id_}")
+                        arquivo_enviado['id'] = uploaded_file.id_
+                        
+                        # Gerar URL de download com o bucket atual da sessão (renovado se
+                        # o upload recebeu 401), não com o obtido antes do upload
+                        try:
+                            url = executar_com_bucket(lambda bucket: get_download_url(bucket, unique_filename))
+                        except Exception as url_error:
+                            print(f"Erro ao gerar URL de download: {url_error}")
+                            url = None
+                        
+                        if not url:
+                            print("Falha ao gerar URL de download")
+                            url = f"https://f002.backblazeb2.com/file/{b2_bucket_name}/{unique_filename}"
+                        
+                        print(f"URL final gerada: {url}")
+                        return url
+                    
+                    # Extração de texto (CPU) e upload para o B2 (rede) não dependem uma da
+                    # outra: rodam em paralelo e só se juntam antes da inserção no banco.
+                    # A extração fica na thread atual para manter o timeout por página (SIGALRM)
+                    with ThreadPoolExecutor(max_workers=1) as executor:
+                        futuro_upload = executor.submit(medidor.medir, 'upload_b2', enviar_e_gerar_url)
+                        texto_extraido = medidor.medir('extracao_texto', extrair_texto)
+                        download_url = futuro_upload.result()
+                    
+                except Exception as b2_error:
+                    print(f"Erro no Backblaze B2: {str(b2_error)}")
+                    print(traceback.format_exc())
                     self.send_response(500)
                     self.send_header('Content-Type', 'application/json')
                     self.end_headers()
-                    self.wfile.write(json.dumps({"error": f"Erro ao acessar bucket: {str(bucket_error)}"}).encode())
+                    self.wfile.write(json.dumps({"error": f"Erro no serviço de armazenamento: {str(b2_error)}"}).encode())
                     return
-                
-                # Criar um nome de arquivo único para evitar colisões
-                timestamp = int(time.time())
-                # Use um timestamp como identificador temporário para o nome do arquivo
-                temp_id = timestamp
-                unique_filename = f"{temp_id}_{timestamp}_{filename}"
-                
-                # Criar um objeto de arquivo temporário para extração de texto
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                    tmp_file.write(file_data)
-                    tmp_file.seek(0)
-                    texto_extraido = extrair_texto_pdf(tmp_file)
-                
-                # Fazer upload do arquivo para o Backblaze B2
-                file_info = {
-                    'categoria_id': categoria_id,
-                    'projeto_id': projeto_id,
-                    'descricao': descricao
-                }
-                
-                print(f"Fazendo upload do arquivo: {unique_filename}")
-                uploaded_file = bucket.upload_bytes(
-                    file_data,
-                    unique_filename,
-                    file_info=file_info,
-                    content_type=filetype
-                )
-                print(f"Upload concluído: {uploaded_file.id_}")
-                
-                # Gerar URL de download
-                download_url = get_download_url(bucket, unique_filename)
-                
-                if not download_url:
-                    print("Falha ao gerar URL de download")
-                    download_url = f"https://f002.backblazeb2.com/file/{b2_bucket_name}/{unique_filename}"
-                
-                print(f"URL final gerada: {download_url}")
-                
-            except Exception as b2_error:
-                print(f"Erro no Backblaze B2: {str(b2_error)}")
-                print(traceback.format_exc())
-                self.send_response(500)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": f"Erro no serviço de armazenamento: {str(b2_error)}"}).encode())
-                return
             
             # Salvar os metadados do arquivo no Supabase
             current_time = datetime.now().isoformat()
             
-            # Limitar o tamanho do texto extraído E limpar caracteres problemáticos
+            # Limitar o tamanho do texto extraído (já limpo em extrair_texto_pdf)
             MAX_TEXTO_LENGTH = 100000
             if texto_extraido:
-                # ✅ ADICIONADO: Dupla limpeza para garantir compatibilidade
-                texto_extraido = limpar_texto_para_postgres(texto_extraido)
                 texto_extraido = texto_extraido[:MAX_TEXTO_LENGTH]
             else:
                 texto_extraido = ""
@@ -392,21 +314,65 @@ class handler(BaseHTTPRequestHandler):
                 'descricao': descricao,
                 'data_upload': current_time,
                 'conteudo': texto_extraido,
-                'backblaze_filename': unique_filename
+                'backblaze_filename': unique_filename,
+                'hash_conteudo': fileitem.sha256
             }
             
+            # Reaproveitar a análise de IA do documento original se foi feita com o mesmo prompt
+            retorno_ia_reutilizado = None
+            if documento_existente:
+                file_data['dedup_origem_id'] = documento_existente['id']
+                try:
+                    _, texto_prompt = resolver_prompt_documento(categoria_id, service_supabase)
+                    retorno_ia_reutilizado = retorno_ia_reutilizavel(documento_existente, texto_prompt)
+                except Exception as prompt_error:
+                    print(f"Erro ao resolver prompt para deduplicação: {str(prompt_error)}")
+                
+                if retorno_ia_reutilizado:
+                    file_data['retorno_ia'] = retorno_ia_reutilizado
+                    file_data['hash_prompt_ia'] = documento_existente['hash_prompt_ia']
+                    file_data['hash_retorno_ia'] = documento_existente['hash_retorno_ia']
+                    print("Deduplicação: reaproveitando análise de IA do documento original")
+            
             # Adicionar id_controleconteudo se fornecido
             if id_controleconteudo is not None:
                 file_data['id_controleconteudo'] = id_controleconteudo
                 print(f"Vinculando documento ao controle de conteúdo ID: {id_controleconteudo}")
             
-            # Criar um cliente Supabase com a chave de serviço para poder inserir dados
             try:
-                print("Conectando ao Supabase com chave de serviço")
-                service_supabase = create_client(supabase_url, supabase_service_key)
+                def inserir_documento():
+                    nonlocal unique_filename, download_url
+                    try:
+                        return service_supabase.table('base_dados_conteudo').insert(file_data).execute()
+                    except Exception as insert_error:
+                        if 'dedup_origem_id' in file_data or not conflito_documento_original(insert_error):
+                            raise
+                        # Outro upload do mesmo PDF gravou o original primeiro: este registro
+                        # passa a apontar para ele e para o arquivo dele no B2
+                        original = buscar_documento_por_hash(service_supabase, fileitem.sha256)
+                        if not original:
+                            raise
+                        print(f"Deduplicação: upload simultâneo, vinculando ao documento {original['id']}")
+                        file_data['dedup_origem_id'] = original['id']
+                        file_data['backblaze_filename'] = original['backblaze_filename']
+                        file_data['url_arquivo'] = original.get('url_arquivo')
+                        response = service_supabase.table('base_dados_conteudo').insert(file_data).execute()
+                    
+                    # O arquivo enviado por esta requisição ficou redundante
+                    redundante = unique_filename
+                    unique_filename, download_url = file_data['backblaze_filename'], file_data['url_arquivo']
+                    if arquivo_enviado:
+                        try:
+                            executar_com_bucket(
+                                lambda bucket: excluir_arquivo_b2(bucket, redundante, arquivo_enviado['id'])
+                            )
+                            print(f"Arquivo redundante removido do B2: {redundante}")
+                        except Exception as delete_error:
+                            print(f"Erro ao remover arquivo redundante do B2 ({redundante}): {str(delete_error)}")
+                    return response
                 
                 # Inserir no Supabase usando o cliente com a chave de serviço
-                response = service_supabase.table('base_dados_conteudo').insert(file_data).execute()
+                response = medidor.medir('insercao_banco', inserir_documento)
                 
                 # Verificar se houve erro na inserção
                 if hasattr(response, 'error') and response.error:
@@ -427,8 +393,14 @@ class handler(BaseHTTPRequestHandler):
                 else:
                     print(f"ID gerado pelo banco: {file_id}")
                 
-                # ALTERAÇÃO: Criar vinculação na tabela de relacionamento se id_controleconteudogeral foi fornecido
-                if id_controleconteudogeral is not None and file_id is not None:
+                # Variáveis para indicar o estado da análise com IA
+                analise_realizada = False
+                resultado_analise = None
+                analise_job_id = None
+                analise_status = None
+                
+                def vincular_controle_geral():
+                    # ALTERAÇÃO: Criar vinculação na tabela de relacionamento se id_controleconteudogeral foi fornecido
                     try:
                         # Criar vinculação na tabela de relacionamento
                         rel_response = service_supabase.table('documento_controle_geral_rel').insert({
@@ -446,27 +418,8 @@ class handler(BaseHTTPRequestHandler):
                         print(f"Erro ao criar relação documento-controle: {str(rel_error)}")
                         # Não interromper o processo se ocorrer um erro na vinculação
                 
-                # Variável para indicar se análise com IA foi realizada
-                analise_realizada = False
-                resultado_analise = None
-                
-                # Verificar se tem texto extraído e realizar análise direta (não assíncrona)
-                if texto_extraido and texto_extraido.strip() != "" and file_id is not None:
-                    print("Texto extraído com sucesso, iniciando análise com IA")
-                    
-                    # Chamar análise diretamente (sem asyncio), passando também categoria_id
-                    resultado_analise = analisar_com_ia(file_id, texto_extraido, categoria_id, service_supabase)
-                    
-                    if resultado_analise:
-                        analise_realizada = True
-                        print("Análise de IA completada e salva")
-                    else:
-                        print("Falha ao realizar análise de IA")
-                else:
-                    print("Sem texto extraído ou ID não disponível, pulando análise de IA")
-                
-                # Se fornecido um ID de controle de conteúdo, atualizar o status na tabela controle_conteudo
-                if id_controleconteudo is not None:
+                def atualizar_controle_conteudo():
+                    # Se fornecido um ID de controle de conteúdo, atualizar o status na tabela controle_conteudo
                     try:
                         update_response = service_supabase.table('controle_conteudo').update({
                             'tem_documento': True
@@ -477,6 +430,62 @@ class handler(BaseHTTPRequestHandler):
                         print(f"Erro ao atualizar status do controle de conteúdo: {str(update_error)}")
                         # Não interromper o processo se ocorrer um erro na atualização
                 
+                def enfileirar_analise():
+                    try:
+                        fila = obter_fila(service_supabase)
+                        job_id = enfileirar_analise_documento(fila, file_id, categoria_id)
+                        print(f"Análise de IA enfileirada (job {job_id})")
+                    except Exception as fila_error:
+                        # Sem fila disponível, manter o comportamento antigo (análise direta)
+                        print(f"Erro ao enfileirar análise, executando análise direta: {str(fila_error)}")
+                        resultado = analisar_com_ia(file_id, texto_extraido, categoria_id, service_supabase)
+                        
+                        if resultado:
+                            print("Análise de IA completada e salva")
+                        else:
+                            print("Falha ao realizar análise de IA")
+                        return None, resultado, None
+
+                    # A análise roda já nesta requisição; a fila só guarda o job para
+                    # novas tentativas (falha ou timeout) feitas por /api/processar_analises
+                    try:
+                        job = fila.reservar_job(job_id)
+                        if job is None:
+                            return job_id, None, STATUS_PENDENTE
+                        situacao, resultado = executar_job_analise(fila, job, service_supabase)
+                    except Exception as job_error:
+                        print(f"Erro ao processar a análise do job {job_id}: {str(job_error)}")
+                        return job_id, None, STATUS_PENDENTE
+                    if situacao == 'concluido':
+                        return job_id, resultado, STATUS_CONCLUIDO
+                    return job_id, None, STATUS_PENDENTE
+                
+                # As etapas após a inserção só dependem do ID gerado e rodam em paralelo
+                with ThreadPoolExecutor(max_workers=3) as executor:
+                    futuros = []
+                    if id_controleconteudogeral is not None and file_id is not None:
+                        futuros.append(executor.submit(medidor.medir, 'vinculo_controle_geral', vincular_controle_geral))
+                    
+                    if id_controleconteudo is not None:
+                        futuros.append(executor.submit(medidor.medir, 'status_controle_conteudo', atualizar_controle_conteudo))
+                    
+                    # Verificar se tem texto extraído e analisar (via fila, para ter novas tentativas)
+                    futuro_analise = None
+                    if retorno_ia_reutilizado:
+                        analise_realizada = True
+                        resultado_analise = retorno_ia_reutilizado
+                    elif texto_extraido and texto_extraido.strip() != "" and file_id is not None:
+                        futuro_analise = executor.submit(medidor.medir, 'enfileirar_analise', enfileirar_analise)
+                    else:
+                        print("Sem texto extraído ou ID não disponível, pulando análise de IA")
+                    
+                    for futuro in futuros:
+                        futuro.result()
+                    
+                    if futuro_analise is not None:
+                        analise_job_id, resultado_analise, analise_status = futuro_analise.result()
+                        analise_realizada = bool(resultado_analise)
+                
             except Exception as db_error:
                 print(f"Erro ao inserir no banco de dados: {str(db_error)}")
                 print(traceback.format_exc())  # Adicionar stack trace
@@ -486,6 +495,9 @@ class handler(BaseHTTPRequestHandler):
                 self.wfile.write(json.dumps({"error": f"Erro ao salvar no banco de dados: {str(db_error)}"}).encode())
                 return
             
+            tempos_etapas = medidor.resumo()
+            print(f"Tempos das etapas do upload: {tempos_etapas}")
+            
             # Responder com sucesso
             self.send_response(200)
             self.send_header('Content-Type', 'application/json')
@@ -516,7 +528,16 @@ class handler(BaseHTTPRequestHandler):
                 "id_controleconteudo": id_controleconteudo,
                 "id_controleconteudogeral": id_controleconteudogeral,
                 "analise_ia_realizada": analise_realizada,
-                "message": "Arquivo enviado com sucesso" + (" e analisado com IA" if analise_realizada else "")
+                "analise_job_id": analise_job_id,
+                "analise_status": analise_status,
+                "deduplicado": 'dedup_origem_id' in file_data,
+                "dedup_origem_id": file_data.get('dedup_origem_id'),
+                "bytes_economizados": filesize if 'dedup_origem_id' in file_data else 0,
+                "tempos_etapas": tempos_etapas,
+                "message": "Arquivo enviado com sucesso" + (
+                    " e analisado com IA" if analise_realizada
+                    else " (análise com IA em processamento)" if analise_job_id else ""
+                )
             }).encode())
             
         except Exception as e:
@@ -525,4 +546,8 @@ class handler(BaseHTTPRequestHandler):
             self.send_response(500)
             self.send_header('Content-Type', 'application/json')
             self.end_headers()
-            self.wfile.write(json.dumps({"error": f"Erro interno do servidor: {str(e)}"}).encode())
\ No newline at end of file
+            self.wfile.write(json.dumps({"error": f"Erro interno do servidor: {str(e)}"}).encode())
+        finally:
+            # Remover arquivos temporários do upload
+            if form is not None:
+                form.close()
\ No newline at end of file
@@ -0,0 +1,143 @@
+import traceback
+from api.utils.texto import limpar_texto_para_postgres
+from api.utils.dedup import hash_texto
+from api.utils.gemini import gerar_resposta
+from api.utils.chaves_gemini import obter_pool_chaves
+from api.utils.configuracao import buscar_prompt, buscar_prompt_id_categoria, buscar_prompt_padrao
+
+def resolver_prompt_documento(categoria_id, service_supabase):
+    """Retorna (prompt_id, texto_prompt): o prompt vinculado à categoria ou, na falta dele, o prompt padrão"""
+    # Primeiro, verificar se existe um prompt vinculado à categoria do documento
+    prompt_id = None
+    texto_prompt = None
+    
+    if categoria_id:
+        # Buscar categoria para verificar se tem prompt_id (categoria e prompt vêm do cache de configuração)
+        prompt_id = buscar_prompt_id_categoria(service_supabase, categoria_id)
+        
+        if prompt_id:
+            # Buscar o texto do prompt vinculado à categoria
+            prompt_categoria = buscar_prompt(service_supabase, 'prompts', prompt_id)
+            
+            if prompt_categoria:
+                texto_prompt = prompt_categoria.get('texto_prompt')
+                print(f"Usando prompt vinculado à categoria (ID: {prompt_id})")
+    
+    # Se não encontrou prompt vinculado à categoria, buscar o prompt padrão
+    if not texto_prompt:
+        prompt_data = buscar_prompt_padrao(service_supabase)
+        
+        if not prompt_data:
+            print("Nenhum prompt padrão configurado, usando prompt genérico")
+            # Usar prompt genérico se não houver prompt padrão
+            prompt_id = None
+            texto_prompt = "Faça uma análise do texto abaixo:"
+        else:
+            # Usar o prompt padrão configurado
+            prompt_id = prompt_data.get('id')
+            texto_prompt = prompt_data.get('texto_prompt', "Faça uma análise do texto abaixo:")
+            print(f"Usando prompt padrão (ID: {prompt_id})")
+    
+    return prompt_id, texto_prompt
+
+def analisar_com_ia(file_id, texto_extraido, categoria_id, service_supabase):
+    """Função para analisar o texto com a API Gemini"""
+    try:
+        # Verificar se o texto extraído existe e não está vazio
+        if not texto_extraido or texto_extraido.strip() == '':
+            print("Texto extraído vazio, pulando análise de IA")
+            return None
+        
+        # Resolver o prompt (vinculado à categoria ou padrão)
+        prompt_id, texto_prompt = resolver_prompt_documento(categoria_id, service_supabase)
+        
+        # Pool com as chaves API vigentes do Gemini
+        chaves = obter_pool_chaves(service_supabase)
+        
+        if not chaves.tem_chaves():
+            print("Chave API Gemini não configurada, pulando análise")
+            return None
+        
+        # Preparar o prompt completo
+        prompt_completo = f"{texto_prompt}\n\n{texto_extraido}"
+        
+        print(f"Enviando texto para análise com IA (Prompt: {texto_prompt[:50]}...)")
+        
+        # Chamar a API Gemini (ou reaproveitar a resposta em cache para o mesmo prompt)
+        resultado, do_cache = gerar_resposta(chaves, prompt_completo, 'upload', service_supabase)
+        
+        # ✅ ADICIONADO: Limpar o resultado da IA também
+        resultado_limpo = limpar_texto_para_postgres(resultado)
+        
+        print(f"Resposta da IA recebida{' (cache)' if do_cache else ''}. Tamanho: {len(resultado)} caracteres, após limpeza: {len(resultado_limpo)} caracteres")
+        
+        # Atualizar o documento com o resultado da análise
+        # Gravar também os hashes do prompt e do resultado, usados na deduplicação de uploads
+        update_response = service_supabase.table('base_dados_conteudo').update({
+            'retorno_ia': resultado_limpo,
+            'hash_prompt_ia': hash_texto(texto_prompt),
+            'hash_retorno_ia': hash_texto(resultado_limpo)
+        }).eq('id', file_id).execute()
+        
+        print(f"Análise de IA concluída e salva para o documento {file_id}")
+        return resultado_limpo
+        
+    except Exception as e:
+        print(f"Erro ao analisar com IA: {str(e)}")
+        traceback.print_exc()  # Imprime stack trace completo
+        return None
+
+# Tipo dos jobs de análise de documento na fila (api/utils/fila.py)
+TIPO_ANALISE_DOCUMENTO = 'analise_documento'
+
+def enfileirar_analise_documento(fila, file_id, categoria_id):
+    """Enfileira a análise com IA de um documento e retorna o id do job"""
+    return fila.enfileirar(TIPO_ANALISE_DOCUMENTO, {
+        'documento_id': file_id,
+        'categoria_id': categoria_id
+    })
+
+def processar_job_analise(job, service_supabase):
+    """
+    Executa um job de análise: busca o texto do documento, chama a IA e grava
+    retorno_ia. Lança exceção em caso de falha para que o job seja reprocessado.
+    """
+    payload = job['payload']
+    documento_id = payload['documento_id']
+    
+    doc_response = service_supabase.table('base_dados_conteudo').select('conteudo').eq('id', documento_id).execute()
+    if not doc_response.data:
+        raise Exception(f"Documento {documento_id} não encontrado")
+    
+    texto = doc_response.data[0].get('conteudo') or ''
+    if texto.strip() == '':
+        print(f"Documento {documento_id} sem texto extraído, nada a analisar")
+        return None
+    
+    resultado = analisar_com_ia(documento_id, texto, payload.get('categoria_id'), service_supabase)
+    if not resultado:
+        raise Exception("Falha ao realizar análise de IA")
+    return resultado
+
+def executar_job_analise(fila, job, service_supabase):
+    """
+    Processa um job já reservado e registra o resultado na fila: concluir()
+    no sucesso, falhar() (nova tentativa com backoff) em caso de erro.
+    Retorna (situacao, resultado), com situacao 'concluido', 'falha' ou
+    'ignorado' (a reserva expirou e outro worker ficou com o job).
+    """
+    try:
+        if job['tipo'] != TIPO_ANALISE_DOCUMENTO:
+            raise Exception(f"Tipo de job desconhecido: {job['tipo']}")
+        resultado = processar_job_analise(job, service_supabase)
+    except Exception as job_error:
+        print(f"Erro ao processar job {job['id']}: {str(job_error)}")
+        traceback.print_exc()
+        fila.falhar(job['id'], str(job_error), job['tentativas'])
+        return 'falha', None
+
+    if fila.concluir(job['id'], job['tentativas']):
+        print(f"Job {job['id']} concluído (tentativa {job['tentativas']})")
+        return 'concluido', resultado
+    print(f"Job {job['id']} foi reservado por outro worker, conclusão ignorada")
+    return 'ignorado', resultado
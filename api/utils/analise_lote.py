@@ -0,0 +1,215 @@
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timezone
+from api.utils.gemini import gerar_resposta
+from api.utils.resiliencia import GeminiIndisponivelError
+
+# Análises simultâneas por padrão e limite máximo aceito na requisição
+CONCORRENCIA_PADRAO = max(1, int(os.environ.get('ANALISE_LOTE_CONCORRENCIA', '4')))
+CONCORRENCIA_MAXIMA = 16
+
+# Máximo de documentos em um lote
+MAX_DOCUMENTOS_LOTE = 1000
+
+# Quantos resultados são acumulados antes de gravar no banco (e atualizar o progresso)
+TAMANHO_GRAVACAO = 20
+
+# Tempo máximo de uma execução; o que sobrar fica pendente para ser retomado
+TEMPO_MAX_EXECUCAO = 50
+
+STATUS_LOTE_PROCESSANDO = 'processando'
+STATUS_LOTE_PARCIAL = 'parcial'
+STATUS_LOTE_CONCLUIDO = 'concluido'
+
+
+class DocumentoInvalidoError(Exception):
+    """Documento apagado ou sem texto: falha permanente, não volta a ser tentado ao retomar"""
+
+
+def _agora():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def resolver_documentos(service_supabase, document_ids=None, projeto_id=None, categoria_id=None):
+    """IDs dos documentos do lote: a lista informada ou os documentos do projeto/categoria"""
+    if document_ids:
+        return list(dict.fromkeys(int(i) for i in document_ids))
+
+    query = service_supabase.table('base_dados_conteudo').select('id')
+    if projeto_id:
+        query = query.eq('projeto_id', projeto_id)
+    if categoria_id:
+        query = query.eq('categoria_id', categoria_id)
+    response = query.order('id').limit(MAX_DOCUMENTOS_LOTE + 1).execute()
+    return [row['id'] for row in response.data or []]
+
+
+def criar_lote(service_supabase, prompt_id, document_ids, usuario_id=None):
+    """
+    Registra um lote na tabela analises_lote. Colunas esperadas:
+    id (uuid, pk), prompt_id, usuario_id, documento_ids (jsonb), pendentes (jsonb),
+    concluidos (int), falhas (jsonb), status (text), criado_em, atualizado_em
+    """
+    lote = {
+        'id': str(uuid.uuid4()),
+        'prompt_id': prompt_id,
+        'usuario_id': usuario_id,
+        'documento_ids': document_ids,
+        'pendentes': document_ids,
+        'concluidos': 0,
+        'falhas': {},
+        'status': STATUS_LOTE_PROCESSANDO,
+        'criado_em': _agora(),
+        'atualizado_em': _agora()
+    }
+    service_supabase.table('analises_lote').insert(lote).execute()
+    return lote
+
+
+def obter_lote(service_supabase, lote_id):
+    response = service_supabase.table('analises_lote').select('*').eq('id', lote_id).execute()
+    return response.data[0] if response.data else None
+
+
+def progresso_lote(lote):
+    """Resumo do andamento do lote, usado nas respostas e eventos de progresso"""
+    total = len(lote['documento_ids'])
+    return {
+        "lote_id": lote['id'],
+        "status": lote['status'],
+        "total": total,
+        "concluidos": lote['concluidos'],
+        "pendentes": len(lote['pendentes']),
+        "falhas": lote['falhas'],
+        "percentual": round(100 * lote['concluidos'] / total, 1) if total else 100.0
+    }
+
+
+def gravar_resultados(service_supabase, resultados):
+    """
+    Grava retorno_ia de vários documentos em um único UPDATE, pela função
+    gravar_retornos_ia (migração 20261018000014). Um upsert só com id e
+    retorno_ia não serve: o INSERT do upsert esbarra nas colunas NOT NULL de
+    base_dados_conteudo antes de chegar ao ON CONFLICT. Se a função não
+    existir, grava um a um.
+    """
+    if not resultados:
+        return
+    try:
+        service_supabase.rpc('gravar_retornos_ia', {
+            'resultados': [{'id': document_id, 'retorno_ia': resultado} for document_id, resultado in resultados]
+        }).execute()
+    except Exception as lote_error:
+        print(f"Gravação em lote de retorno_ia falhou ({str(lote_error)}), gravando um a um")
+        for document_id, resultado in resultados:
+            service_supabase.table('base_dados_conteudo').update({
+                'retorno_ia': resultado
+            }).eq('id', document_id).execute()
+
+
+def _salvar_progresso(service_supabase, lote):
+    lote['atualizado_em'] = _agora()
+    service_supabase.table('analises_lote').update({
+        'pendentes': lote['pendentes'],
+        'concluidos': lote['concluidos'],
+        'falhas': lote['falhas'],
+        'status': lote['status'],
+        'atualizado_em': lote['atualizado_em']
+    }).eq('id', lote['id']).execute()
+
+
+def processar_lote(service_supabase, lote, chaves, texto_prompt, concorrencia=CONCORRENCIA_PADRAO,
+                   tempo_max=TEMPO_MAX_EXECUCAO, ignorar_cache=False, ao_progredir=None):
+    """
+    Analisa os documentos pendentes do lote com até `concorrencia` chamadas
+    simultâneas à Gemini. Os resultados são gravados a cada TAMANHO_GRAVACAO
+    documentos, junto com o progresso do lote. Ao atingir tempo_max nenhum
+    documento novo é iniciado e o lote fica 'parcial', para ser retomado.
+    ao_progredir(progresso) é chamado depois de cada gravação; erros dele são
+    registrados e ignorados. Documentos apagados ou sem texto saem dos
+    pendentes e ficam registrados em falhas.
+    """
+    inicio = time.time()
+    pendentes = list(lote['pendentes'])
+
+    # Conteúdo de todos os pendentes em uma única consulta
+    conteudos = {}
+    if pendentes:
+        response = service_supabase.table('base_dados_conteudo').select('id, conteudo') \
+            .in_('id', pendentes).execute()
+        conteudos = {row['id']: row.get('conteudo') or '' for row in response.data or []}
+
+    falhas = dict(lote['falhas'] or {})
+    resolvidos = set()
+    resultados = []
+    do_cache = 0
+
+    def analisar(document_id):
+        conteudo = conteudos.get(document_id)
+        if conteudo is None:
+            raise DocumentoInvalidoError("Documento não encontrado")
+        if not conteudo.strip():
+            raise DocumentoInvalidoError("Documento não possui texto extraído para análise")
+        return gerar_resposta(
+            chaves, f"{texto_prompt}\n\n{conteudo}", 'analyze_batch', service_supabase,
+            ignorar_cache=ignorar_cache
+        )
+
+    def gravar():
+        gravar_resultados(service_supabase, resultados)
+        lote['concluidos'] += len(resultados)
+        lote['pendentes'] = [i for i in pendentes if i not in resolvidos]
+        lote['falhas'] = falhas
+        resultados.clear()
+        _salvar_progresso(service_supabase, lote)
+        if ao_progredir:
+            try:
+                ao_progredir(progresso_lote(lote))
+            except Exception as progresso_error:
+                # Falha ao avisar o cliente não interrompe o lote nem descarta análises prontas
+                print(f"Erro ao enviar progresso do lote {lote['id']}: {str(progresso_error)}")
+
+    fila = list(pendentes)
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        em_andamento = {}
+        while fila or em_andamento:
+            # Mantém no máximo `concorrencia` análises em andamento enquanto houver tempo
+            while fila and len(em_andamento) < concorrencia and time.time() - inicio < tempo_max:
+                document_id = fila.pop(0)
+                em_andamento[executor.submit(analisar, document_id)] = document_id
+            if not em_andamento:
+                break
+
+            prontos, _ = wait(em_andamento, return_when=FIRST_COMPLETED)
+            for future in prontos:
+                document_id = em_andamento.pop(future)
+                try:
+                    resultado, veio_do_cache = future.result()
+                    resultados.append((document_id, resultado))
+                    resolvidos.add(document_id)
+                    falhas.pop(str(document_id), None)
+                    do_cache += 1 if veio_do_cache else 0
+                except Exception as analise_error:
+                    print(f"Erro ao analisar documento {document_id} do lote {lote['id']}: {str(analise_error)}")
+                    falhas[str(document_id)] = str(analise_error)
+                    if isinstance(analise_error, DocumentoInvalidoError):
+                        # Sai dos pendentes: tentar de novo daria o mesmo erro
+                        resolvidos.add(document_id)
+                    if isinstance(analise_error, GeminiIndisponivelError):
+                        # API fora do ar ou cota esgotada: o restante fica pendente para retomar depois
+                        fila.clear()
+
+            if len(resultados) >= TAMANHO_GRAVACAO:
+                gravar()
+
+    # Documentos com falha transitória continuam pendentes e são tentados de novo ao retomar;
+    # os apagados ou sem texto ficam só em falhas
+    lote['status'] = STATUS_LOTE_CONCLUIDO if len(resolvidos) == len(pendentes) else STATUS_LOTE_PARCIAL
+    gravar()
+
+    progresso = progresso_lote(lote)
+    progresso["do_cache"] = do_cache
+    progresso["duracao"] = round(time.time() - inicio, 3)
+    return progresso
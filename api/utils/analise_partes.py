@@ -0,0 +1,196 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from api.utils.dedup import hash_texto
+from api.utils.gemini import gerar_resposta
+from api.utils.tokens import estimar_tokens, CARACTERES_POR_TOKEN
+
+# Orçamento de tokens de cada parte enviada ao modelo
+TOKENS_POR_PARTE = int(os.environ.get('GEMINI_TOKENS_POR_PARTE', '4000'))
+
+# Quantas partes são analisadas ao mesmo tempo
+PARTES_CONCORRENTES_IA = max(1, int(os.environ.get('GEMINI_PARTES_CONCORRENTES', '8')))
+
+# Limite de tokens das análises parciais juntadas em uma única chamada de redução
+TOKENS_REDUCAO = int(os.environ.get('GEMINI_TOKENS_REDUCAO', '24000'))
+
+INSTRUCAO_PARTE = (
+    "O texto abaixo é um trecho de um documento mais longo. Aplique as instruções "
+    "acima apenas a este trecho; as respostas parciais serão combinadas depois."
+)
+
+INSTRUCAO_REDUCAO = (
+    "As análises abaixo foram feitas, seguindo as instruções acima, sobre trechos "
+    "consecutivos de um mesmo documento. Combine-as em uma única resposta final no "
+    "formato pedido, sem repetir informações e sem mencionar a divisão em trechos."
+)
+
+_RE_PARAGRAFOS = re.compile(r'\n\s*\n')
+
+
+def _quebrar_bloco(bloco, max_caracteres):
+    """Divide um bloco maior que o limite por linhas e, em último caso, por tamanho"""
+    pedacos = []
+    atual = ""
+    for linha in bloco.split('\n'):
+        while len(linha) > max_caracteres:
+            if atual:
+                pedacos.append(atual)
+                atual = ""
+            corte = linha.rfind(' ', 0, max_caracteres)
+            corte = corte if corte > 0 else max_caracteres
+            pedacos.append(linha[:corte])
+            linha = linha[corte:].lstrip(' ')
+        if atual and len(atual) + 1 + len(linha) > max_caracteres:
+            pedacos.append(atual)
+            atual = linha
+        else:
+            atual = f"{atual}\n{linha}" if atual else linha
+    if atual:
+        pedacos.append(atual)
+    return pedacos
+
+
+def dividir_em_partes(texto, max_tokens=TOKENS_POR_PARTE):
+    """
+    Divide o texto em partes de até max_tokens (estimados), respeitando limites
+    de parágrafo sempre que possível. Parágrafos maiores que o limite são
+    quebrados por linha.
+    """
+    max_caracteres = max(1, max_tokens * CARACTERES_POR_TOKEN)
+    partes = []
+    atual = ""
+    for paragrafo in _RE_PARAGRAFOS.split(texto):
+        paragrafo = paragrafo.strip()
+        if not paragrafo:
+            continue
+        blocos = [paragrafo] if len(paragrafo) <= max_caracteres else _quebrar_bloco(paragrafo, max_caracteres)
+        for bloco in blocos:
+            if atual and len(atual) + 2 + len(bloco) > max_caracteres:
+                partes.append(atual)
+                atual = bloco
+            else:
+                atual = f"{atual}\n\n{bloco}" if atual else bloco
+    if atual:
+        partes.append(atual)
+    return partes
+
+
+def carregar_parciais(service_supabase, document_id, prompt_id):
+    """Resultados parciais já gravados para o documento e prompt: hash_parte -> resultado"""
+    try:
+        response = service_supabase.table('analise_partes_documento').select('hash_parte, resultado') \
+            .eq('documento_id', document_id).eq('prompt_id', prompt_id).execute()
+        return {row['hash_parte']: row['resultado'] for row in response.data or []}
+    except Exception as e:
+        print(f"Erro ao carregar resultados parciais: {str(e)}")
+        return {}
+
+
+def salvar_parciais(service_supabase, document_id, prompt_id, partes):
+    """
+    Grava os resultados parciais da análise atual (lista de (hash_parte, resultado))
+    e remove os de partes que não existem mais no documento
+    """
+    try:
+        service_supabase.table('analise_partes_documento').delete() \
+            .eq('documento_id', document_id).eq('prompt_id', prompt_id) \
+            .not_.in_('hash_parte', [hash_parte for hash_parte, _ in partes]).execute()
+        service_supabase.table('analise_partes_documento').upsert([
+            {
+                'documento_id': document_id,
+                'prompt_id': prompt_id,
+                'indice': indice,
+                'hash_parte': hash_parte,
+                'resultado': resultado
+            }
+            for indice, (hash_parte, resultado) in enumerate(partes)
+        ], on_conflict='documento_id,prompt_id,hash_parte').execute()
+    except Exception as e:
+        print(f"Erro ao salvar resultados parciais: {str(e)}")
+
+
+def _reduzir(chaves, texto_prompt, parciais, endpoint, service_supabase, ignorar_cache):
+    """
+    Combina as análises parciais. Se juntas passarem de TOKENS_REDUCAO, são
+    combinadas primeiro em grupos e os resultados dos grupos combinados de novo.
+    """
+    while True:
+        grupos = [[]]
+        tokens_grupo = 0
+        for parcial in parciais:
+            tokens = estimar_tokens(parcial)
+            if grupos[-1] and tokens_grupo + tokens > TOKENS_REDUCAO:
+                grupos.append([])
+                tokens_grupo = 0
+            grupos[-1].append(parcial)
+            tokens_grupo += tokens
+
+        def combinar(grupo):
+            trechos = "\n\n".join(f"### Trecho {i}\n{parcial}" for i, parcial in enumerate(grupo, 1))
+            resultado, _ = gerar_resposta(
+                chaves, f"{texto_prompt}\n\n{INSTRUCAO_REDUCAO}\n\n{trechos}", endpoint,
+                service_supabase, ignorar_cache=ignorar_cache
+            )
+            return resultado
+
+        if len(grupos) == 1:
+            return combinar(grupos[0])
+
+        # Um grupo por parcial não reduziria nada; junta de dois em dois
+        if len(grupos) == len(parciais):
+            grupos = [parciais[i:i + 2] for i in range(0, len(parciais), 2)]
+
+        with ThreadPoolExecutor(max_workers=PARTES_CONCORRENTES_IA) as executor:
+            parciais = list(executor.map(combinar, grupos))
+
+
+def analisar_em_partes(chaves, texto_prompt, conteudo, endpoint, service_supabase,
+                       document_id=None, prompt_id=None, ignorar_cache=False):
+    """
+    Análise map-reduce de documentos longos: divide o conteúdo em partes, aplica o
+    prompt a cada parte em paralelo (até PARTES_CONCORRENTES_IA por vez) e combina
+    as respostas parciais em uma chamada final.
+
+    Com document_id e prompt_id, os resultados parciais ficam gravados na tabela
+    analise_partes_documento e uma nova análise recalcula apenas as partes alteradas.
+    """
+    partes = dividir_em_partes(conteudo)
+
+    # Documento que coube em uma parte só usa o mesmo prompt do modo normal
+    instrucao = f"{INSTRUCAO_PARTE}\n\n" if len(partes) > 1 else ""
+    prompts_partes = [f"{texto_prompt}\n\n{instrucao}{parte}" for parte in partes]
+
+    # O hash cobre o prompt inteiro: editar o texto do prompt também invalida as parciais
+    hashes = [hash_texto(prompt_parte) for prompt_parte in prompts_partes]
+
+    salvos = {}
+    if document_id is not None and prompt_id is not None and not ignorar_cache:
+        salvos = carregar_parciais(service_supabase, document_id, prompt_id)
+
+    def analisar_parte(indice):
+        if hashes[indice] in salvos:
+            return salvos[hashes[indice]]
+        resultado, _ = gerar_resposta(
+            chaves, prompts_partes[indice], endpoint, service_supabase,
+            ignorar_cache=ignorar_cache
+        )
+        return resultado
+
+    with ThreadPoolExecutor(max_workers=PARTES_CONCORRENTES_IA) as executor:
+        parciais = list(executor.map(analisar_parte, range(len(partes))))
+
+    recalculadas = sum(1 for h in hashes if h not in salvos)
+    if document_id is not None and prompt_id is not None and recalculadas:
+        salvar_parciais(service_supabase, document_id, prompt_id, list(zip(hashes, parciais)))
+
+    if len(parciais) == 1:
+        resultado = parciais[0]
+    else:
+        resultado = _reduzir(chaves, texto_prompt, parciais, endpoint, service_supabase, ignorar_cache)
+
+    return {
+        "resultado": resultado,
+        "partes": len(partes),
+        "partes_recalculadas": recalculadas
+    }
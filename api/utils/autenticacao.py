@@ -0,0 +1,150 @@
+import hashlib
+import os
+import threading
+import time
+from api.utils.cache import CacheLRU
+from api.utils.supabase_clientes import cliente_anonimo, supabase_url
+
+# Verificação local dos tokens do Supabase: HS256 com o JWT secret do projeto
+# ou chaves assimétricas (RS256/ES256) publicadas no JWKS do GoTrue
+SUPABASE_JWT_SECRET = os.environ.get('SUPABASE_JWT_SECRET')
+SUPABASE_JWT_AUDIENCE = os.environ.get('SUPABASE_JWT_AUDIENCE', 'authenticated')
+JWKS_TTL = float(os.environ.get('SUPABASE_JWKS_TTL', '600'))
+
+# AUTH_MODO_ESTRITO=1 valida todo token também no GoTrue (detecta sessões revogadas)
+AUTH_MODO_ESTRITO = os.environ.get('AUTH_MODO_ESTRITO', '') in ('1', 'true')
+
+# Tokens já validados ficam em memória até expirarem (no máximo TOKEN_CACHE_MAX_SEGUNDOS)
+TOKEN_CACHE_MAX_SEGUNDOS = 300
+MARGEM_EXPIRACAO = 5
+
+tokens_validados = CacheLRU(max_itens=4096)
+
+_jwks = None
+_jwks_lock = threading.Lock()
+_aviso_emitido = False
+
+
+class TokenInvalidoError(Exception):
+    """Token ausente, malformado, com assinatura inválida, expirado ou de outra audiência"""
+
+
+class _VerificacaoLocalIndisponivel(Exception):
+    """Sem segredo/JWKS para o algoritmo do token: a validação fica com o GoTrue"""
+
+
+class UsuarioToken:
+    """Usuário a partir das claims do JWT, com os mesmos campos usados do user do GoTrue"""
+
+    def __init__(self, claims):
+        self.claims = claims
+        self.id = claims.get('sub')
+        self.email = claims.get('email')
+        self.role = claims.get('role')
+        self.aud = claims.get('aud')
+        self.app_metadata = claims.get('app_metadata') or {}
+        self.user_metadata = claims.get('user_metadata') or {}
+
+
+def _cliente_jwks():
+    """PyJWKClient do projeto, com as chaves em cache por JWKS_TTL segundos"""
+    global _jwks
+    with _jwks_lock:
+        if _jwks is None:
+            from jwt import PyJWKClient
+            _jwks = PyJWKClient(
+                f"{supabase_url}/auth/v1/.well-known/jwks.json",
+                cache_keys=True,
+                lifespan=JWKS_TTL
+            )
+        return _jwks
+
+
+def verificar_token_local(token):
+    """Confere assinatura, exp e audiência sem rede (exceto a busca periódica do JWKS)"""
+    import jwt
+
+    try:
+        cabecalho = jwt.get_unverified_header(token)
+        algoritmo = cabecalho.get('alg')
+        if algoritmo == 'HS256':
+            if not SUPABASE_JWT_SECRET:
+                raise _VerificacaoLocalIndisponivel("SUPABASE_JWT_SECRET não configurado")
+            chave = SUPABASE_JWT_SECRET
+        elif algoritmo in ('RS256', 'ES256'):
+            chave = _cliente_jwks().get_signing_key_from_jwt(token).key
+        else:
+            raise TokenInvalidoError(f"Algoritmo de token não suportado: {algoritmo}")
+
+        claims = jwt.decode(
+            token, chave, algorithms=[algoritmo], audience=SUPABASE_JWT_AUDIENCE,
+            options={"require": ["exp", "sub"]}
+        )
+    except jwt.PyJWKClientConnectionError as e:
+        raise _VerificacaoLocalIndisponivel(f"JWKS inacessível: {str(e)}")
+    except jwt.PyJWTError as e:
+        raise TokenInvalidoError(str(e))
+
+    return UsuarioToken(claims)
+
+
+def _avisar_indisponivel(erro):
+    global _aviso_emitido
+    if not _aviso_emitido:
+        _aviso_emitido = True
+        print(f"Verificação local do token indisponível, usando o GoTrue: {str(erro)}")
+
+
+def _verificar_token_remoto(token):
+    user = cliente_anonimo().auth.get_user(token).user
+    if not user:
+        raise TokenInvalidoError("Usuário não autenticado")
+    return user
+
+
+def _expiracao_sem_assinatura(token):
+    """exp das claims sem conferir a assinatura (só para tokens que o GoTrue acabou de aceitar)"""
+    try:
+        import jwt
+        return jwt.decode(token, options={"verify_signature": False}).get('exp')
+    except Exception:
+        return None
+
+
+def _guardar_validado(chave, usuario, exp):
+    restante = exp - time.time() - MARGEM_EXPIRACAO if exp else 0
+    if restante > 0:
+        tokens_validados.set(chave, usuario, ttl=min(restante, TOKEN_CACHE_MAX_SEGUNDOS))
+
+
+def verificar_token(token, estrito=False):
+    """
+    Usuário dono do token. Por padrão a verificação é local e o resultado fica
+    em cache até o token expirar; estrito=True (rotas sensíveis) ou
+    AUTH_MODO_ESTRITO também consulta o GoTrue. Sem segredo nem JWKS
+    disponíveis, cai para a consulta remota, cujo resultado também fica em
+    cache até o token expirar. Levanta TokenInvalidoError.
+    """
+    if not token:
+        raise TokenInvalidoError("Token de autenticação não fornecido")
+    if estrito or AUTH_MODO_ESTRITO:
+        return _verificar_token_remoto(token)
+
+    chave = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    usuario = tokens_validados.get(chave)
+    if usuario is not None:
+        return usuario
+
+    try:
+        usuario = verificar_token_local(token)
+    except TokenInvalidoError:
+        raise
+    except (_VerificacaoLocalIndisponivel, ImportError) as e:
+        # Sem segredo, sem PyJWT ou JWKS inacessível: mantém a validação pelo GoTrue
+        _avisar_indisponivel(e)
+        usuario = _verificar_token_remoto(token)
+        _guardar_validado(chave, usuario, _expiracao_sem_assinatura(token))
+        return usuario
+
+    _guardar_validado(chave, usuario, usuario.claims['exp'])
+    return usuario
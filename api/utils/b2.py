@@ -0,0 +1,120 @@
+import os
+import threading
+from b2sdk.v2 import (
+    InMemoryAccountInfo, SqliteAccountInfo, AuthInfoCache, B2Api,
+    UploadSourceStream, UploadSourceLocalFile
+)
+from b2sdk.v2.exception import InvalidAuthToken, Unauthorized
+
+MB = 1024 * 1024
+
+# Tamanho de cada parte no upload de arquivos grandes (mínimo do B2: 5 MB)
+TAMANHO_PARTE = max(5, int(os.environ.get("B2_TAMANHO_PARTE_MB", "10"))) * MB
+
+# Quantas partes são enviadas ao mesmo tempo
+PARTES_CONCORRENTES = max(1, int(os.environ.get("B2_PARTES_CONCORRENTES", "4")))
+
+# Arquivo onde a autorização da conta e os ids de bucket são guardados entre
+# invocações no mesmo container ("" desativa e usa apenas memória)
+B2_ACCOUNT_INFO_PATH = os.environ.get("B2_ACCOUNT_INFO_PATH", "/tmp/b2_account_info.sqlite")
+
+b2_application_key_id = os.environ.get("B2_APPLICATION_KEY_ID")
+b2_application_key = os.environ.get("B2_APPLICATION_KEY")
+b2_bucket_name = os.environ.get("B2_BUCKET_NAME")
+
+# Sessão B2 compartilhada pelo processo (instância "quente" da função)
+_sessao_lock = threading.Lock()
+_sessao = {"b2_api": None, "bucket": None}
+
+
+def _criar_account_info():
+    if B2_ACCOUNT_INFO_PATH:
+        try:
+            return SqliteAccountInfo(file_name=B2_ACCOUNT_INFO_PATH)
+        except Exception as info_error:
+            print(f"Não foi possível usar cache persistente do B2, usando memória: {info_error}")
+    return InMemoryAccountInfo()
+
+
+def _autorizacao_salva_valida(info):
+    """Verifica se o account info já tem uma autorização desta mesma chave"""
+    try:
+        return (
+            info.get_application_key_id() == b2_application_key_id
+            and bool(info.get_account_auth_token())
+        )
+    except Exception:
+        return False
+
+
+def criar_b2_api():
+    """Cria um B2Api com o pool de upload dimensionado para PARTES_CONCORRENTES"""
+    info = _criar_account_info()
+    return B2Api(info, cache=AuthInfoCache(info), max_upload_workers=PARTES_CONCORRENTES)
+
+
+def obter_bucket(renovar=False):
+    """
+    Retorna o bucket configurado, autorizando a conta apenas na primeira chamada
+    do processo (ou quando a autorização salva em disco não serve).
+    Com renovar=True descarta a sessão atual e autoriza novamente.
+    """
+    with _sessao_lock:
+        if _sessao["bucket"] is not None and not renovar:
+            return _sessao["bucket"]
+
+        b2_api = _sessao["b2_api"] if _sessao["b2_api"] is not None and not renovar else criar_b2_api()
+
+        if renovar or not _autorizacao_salva_valida(b2_api.account_info):
+            print("Autorizando conta no Backblaze B2")
+            b2_api.authorize_account("production", b2_application_key_id, b2_application_key)
+
+        # Com AuthInfoCache o id do bucket vem do account info quando já conhecido
+        bucket = b2_api.get_bucket_by_name(b2_bucket_name)
+
+        _sessao["b2_api"] = b2_api
+        _sessao["bucket"] = bucket
+        return bucket
+
+
+def executar_com_bucket(operacao):
+    """
+    Executa operacao(bucket) com o bucket compartilhado. O b2sdk já renova tokens
+    expirados sozinho; se ainda assim o B2 responder 401, a sessão é recriada
+    e a operação repetida uma vez.
+    """
+    try:
+        return operacao(obter_bucket())
+    except (InvalidAuthToken, Unauthorized) as auth_error:
+        print(f"Autorização do B2 recusada ({auth_error}), renovando sessão")
+        return operacao(obter_bucket(renovar=True))
+
+
+def enviar_arquivo_b2(bucket, arquivo, nome_arquivo, content_type, file_info):
+    """
+    Envia um ArquivoRecebido (api/utils/multipart.py) para o bucket.
+
+    Arquivos em disco com pelo menos duas partes são enviados como "large file"
+    do B2: cada parte é lida do arquivo por offset e enviada em paralelo pelo
+    pool do B2Api, e uma parte que falha é reenviada sozinha pelo b2sdk.
+    Arquivos menores seguem em uma única requisição, a partir do stream.
+    """
+    if arquivo.path and arquivo.tamanho >= 2 * TAMANHO_PARTE:
+        fonte = UploadSourceLocalFile(arquivo.path, content_sha1=arquivo.sha1)
+        print(f"Upload em partes: {arquivo.tamanho} bytes, partes de {TAMANHO_PARTE} bytes, "
+              f"{PARTES_CONCORRENTES} em paralelo")
+    else:
+        fonte = UploadSourceStream(arquivo.open, stream_length=arquivo.tamanho, stream_sha1=arquivo.sha1)
+
+    return bucket.upload(
+        fonte,
+        nome_arquivo,
+        content_type=content_type,
+        file_info=file_info,
+        min_part_size=TAMANHO_PARTE
+    )
+
+
+def excluir_arquivo_b2(bucket, nome_arquivo, file_id):
+    """Remove uma versão de arquivo do bucket (ex.: upload redundante de um PDF já armazenado)"""
+    return bucket.delete_file_version(file_id, nome_arquivo)
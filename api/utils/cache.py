@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheLRU:
+    """
+    Cache em memória, seguro para threads, com limite de itens (LRU) e
+    expiração opcional por item. Mantém contadores de acertos e falhas.
+    """
+
+    def __init__(self, max_itens=1024, ttl=None):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, chave):
+        agora = time.monotonic()
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None:
+                valor, expira_em = item
+                if expira_em is None or expira_em > agora:
+                    self._itens.move_to_end(chave)
+                    self.hits += 1
+                    return valor
+                del self._itens[chave]
+            self.misses += 1
+            return None
+
+    def __contains__(self, chave):
+        """Verifica se a chave está no cache e válida, sem afetar contadores nem a ordem LRU"""
+        with self._lock:
+            item = self._itens.get(chave)
+            return item is not None and (item[1] is None or item[1] > time.monotonic())
+
+    def set(self, chave, valor, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expira_em = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._itens[chave] = (valor, expira_em)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def invalidar(self, chave):
+        with self._lock:
+            self._itens.pop(chave, None)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def estatisticas(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "tamanho": len(self._itens)
+            }
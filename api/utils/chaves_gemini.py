@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+from api.utils.resiliencia import BaldeTokens, GeminiIndisponivelError
+from api.utils.llm import obter_backend
+from api.utils.configuracao import obter_config
+
+# Cota de cada chave: requisições por minuto e rajada máxima
+GEMINI_RPM = float(os.environ.get('GEMINI_RPM', '60'))
+GEMINI_RAJADA = float(os.environ.get('GEMINI_RAJADA', '10'))
+
+# Tempo fora da rotação quando a chave recebe erro de cota (429) ou é recusada (401/403)
+PAUSA_COTA_ESGOTADA = float(os.environ.get('GEMINI_CHAVE_PAUSA_COTA', '60'))
+PAUSA_CHAVE_RECUSADA = float(os.environ.get('GEMINI_CHAVE_PAUSA_RECUSADA', '600'))
+
+# Intervalo para recarregar a lista de chaves vigentes do Supabase
+RECARREGAR_CHAVES_SEGUNDOS = 300
+
+
+class ChaveGemini:
+    """Uma chave da API com seu limitador de cota e estado na rotação"""
+
+    def __init__(self, chave, rpm=GEMINI_RPM, rajada=GEMINI_RAJADA):
+        self.chave = chave
+        self.balde = BaldeTokens(taxa=rpm / 60, capacidade=rajada)
+        self.pausada_ate = 0
+        self.chamadas = 0
+        self.cotas_esgotadas = 0
+        self._cliente = None
+        self._cliente_lock = threading.Lock()
+
+    @property
+    def sufixo(self):
+        """Final da chave, para logs sem expor o segredo"""
+        return f"...{self.chave[-4:]}" if self.chave else "?"
+
+    def cliente(self):
+        """
+        Cliente da API exclusivo desta chave, criado na primeira chamada e
+        reaproveitado (mantém a conexão). Evita genai.configure, que é global
+        ao processo e seria sobrescrito por requisições concorrentes.
+        """
+        with self._cliente_lock:
+            if self._cliente is None:
+                from google.ai import generativelanguage as glm
+                self._cliente = glm.GenerativeServiceClient(client_options={'api_key': self.chave})
+            return self._cliente
+
+
+def erro_cota(erro):
+    """429 / RESOURCE_EXHAUSTED: a cota desta chave acabou"""
+    return getattr(erro, 'code', None) == 429
+
+
+def erro_chave_recusada(erro):
+    """401 / 403: chave inválida, revogada ou sem permissão"""
+    return getattr(erro, 'code', None) in (401, 403)
+
+
+class PoolChaves:
+    """
+    Conjunto das chaves vigentes. Cada chamada usa a chave com mais cota
+    restante no momento; chaves com cota esgotada saem da rotação por um tempo.
+    """
+
+    def __init__(self, chaves=()):
+        self._lock = threading.Lock()
+        self._chaves = {}
+        self.atualizar(chaves)
+
+    def atualizar(self, chaves):
+        """Substitui a lista de chaves, preservando o estado das que continuam vigentes"""
+        with self._lock:
+            self._chaves = {chave: self._chaves.get(chave) or ChaveGemini(chave) for chave in chaves if chave}
+
+    def tem_chaves(self):
+        with self._lock:
+            return bool(self._chaves)
+
+    def adquirir(self, prazo=None):
+        """
+        Reserva uma requisição na chave ativa com mais cota restante, esperando
+        se todas estiverem no limite. Levanta GeminiIndisponivelError se nenhuma
+        ficar disponível antes do prazo (instante em time.monotonic()).
+        """
+        while True:
+            with self._lock:
+                chaves = list(self._chaves.values())
+            if not chaves:
+                raise GeminiIndisponivelError("Nenhuma chave API da Gemini configurada")
+
+            agora = time.monotonic()
+            ativas = [c for c in chaves if c.pausada_ate <= agora]
+            espera = min((c.pausada_ate - agora for c in chaves if c.pausada_ate > agora), default=None)
+
+            for chave in sorted(ativas, key=lambda c: c.balde.disponiveis(), reverse=True):
+                conseguiu, espera_chave = chave.balde.tentar_adquirir()
+                if conseguiu:
+                    chave.chamadas += 1
+                    return chave
+                espera = espera_chave if espera is None else min(espera, espera_chave)
+
+            if prazo is not None and agora + espera > prazo:
+                raise GeminiIndisponivelError("Cota de todas as chaves da Gemini esgotada", retry_after=espera)
+            time.sleep(espera)
+
+    def chave_ativa(self):
+        """Chave ativa com mais cota restante, sem consumir cota (ex.: contagem de tokens)"""
+        agora = time.monotonic()
+        with self._lock:
+            ativas = [c for c in self._chaves.values() if c.pausada_ate <= agora]
+        return max(ativas, key=lambda c: c.balde.disponiveis(), default=None)
+
+    def pausar(self, chave, erro):
+        """
+        Tira a chave da rotação após erro de cota ou de autorização.
+        Retorna True se ainda há outra chave ativa para tentar na hora.
+        A última chave ativa não é pausada por cota: nesse caso a chamada
+        segue para as novas tentativas com backoff.
+        """
+        duracao = PAUSA_CHAVE_RECUSADA if erro_chave_recusada(erro) else PAUSA_COTA_ESGOTADA
+        retry_after = getattr(erro, 'retry_after', None)
+        if isinstance(retry_after, (int, float)) and retry_after > 0:
+            duracao = retry_after
+        agora = time.monotonic()
+        with self._lock:
+            chave.cotas_esgotadas += 1
+            outras_ativas = any(c is not chave and c.pausada_ate <= agora for c in self._chaves.values())
+            if not outras_ativas and not erro_chave_recusada(erro):
+                return False
+            chave.pausada_ate = agora + duracao
+        print(f"Chave Gemini {chave.sufixo} fora da rotação por {duracao:.0f}s ({type(erro).__name__})")
+        return outras_ativas
+
+    def estatisticas(self):
+        agora = time.monotonic()
+        with self._lock:
+            chaves = list(self._chaves.values())
+        return [
+            {
+                "chave": c.sufixo,
+                "chamadas": c.chamadas,
+                "cotas_esgotadas": c.cotas_esgotadas,
+                "cota_restante": round(c.balde.disponiveis(), 2),
+                "ativa": c.pausada_ate <= agora
+            }
+            for c in chaves
+        ]
+
+
+# Pool compartilhado pelo processo
+pool_chaves = PoolChaves()
+_carregar_lock = threading.Lock()
+
+
+def _carregar_chaves(service_supabase):
+    response = service_supabase.table('configuracoes_gemini').select('chave').eq('vigente', True).execute()
+    chaves = [row.get('chave') for row in response.data or []]
+    # O modelo local (stub) não usa chave; uma chave fictícia mantém o controle de cota
+    if not chaves and obter_backend().nome == 'stub':
+        chaves = ['stub-local']
+    return chaves
+
+
+def obter_pool_chaves(service_supabase):
+    """
+    Pool com todas as chaves vigentes de configuracoes_gemini. A lista vem do
+    cache de configuração (recarregada a cada RECARREGAR_CHAVES_SEGUNDOS ou
+    quando a versão da configuração muda); o estado das chaves é preservado.
+    """
+    with _carregar_lock:
+        try:
+            chaves = obter_config(
+                service_supabase, 'configuracoes_gemini:vigentes',
+                lambda: _carregar_chaves(service_supabase), ttl=RECARREGAR_CHAVES_SEGUNDOS
+            )
+            pool_chaves.atualizar(chaves)
+        except Exception as e:
+            # Mantém as chaves já conhecidas se o Supabase falhar na recarga
+            print(f"Erro ao carregar chaves da Gemini: {str(e)}")
+            if not pool_chaves.tem_chaves():
+                raise
+        return pool_chaves
@@ -0,0 +1,108 @@
+import os
+import threading
+import time
+from api.utils.cache import CacheLRU
+
+# Configuração lida a cada análise (chaves da Gemini, prompts, prompt de cada
+# categoria) fica em memória por até CONFIG_CACHE_TTL segundos
+CONFIG_CACHE_TTL = float(os.environ.get('CONFIG_CACHE_TTL', '300'))
+
+# Invalidação: essas tabelas são alteradas pelo frontend direto no Supabase,
+# então a linha id=1 de configuracao_versao tem o campo versao incrementado
+# por triggers em prompts, prompts_indicadores, categorias e
+# configuracoes_gemini (migração 20261018000020). A versão é conferida no
+# máximo a cada CONFIG_VERSAO_INTERVALO segundos; se mudou, o cache inteiro
+# é descartado.
+TABELA_VERSAO = 'configuracao_versao'
+CONFIG_VERSAO_INTERVALO = float(os.environ.get('CONFIG_VERSAO_INTERVALO', '15'))
+
+cache_config = CacheLRU(max_itens=512, ttl=CONFIG_CACHE_TTL)
+
+_versao = None
+_versao_verificada_em = 0
+_versao_lock = threading.Lock()
+_consultas = {"config": 0, "versao": 0}
+
+
+def _contar(campo):
+    with _versao_lock:
+        _consultas[campo] += 1
+
+
+def _verificar_versao(service_supabase):
+    """Limpa o cache se a versão da configuração mudou desde a última conferência"""
+    global _versao, _versao_verificada_em
+    with _versao_lock:
+        agora = time.monotonic()
+        if agora - _versao_verificada_em < CONFIG_VERSAO_INTERVALO:
+            return
+        _versao_verificada_em = agora
+
+    try:
+        _contar("versao")
+        response = service_supabase.table(TABELA_VERSAO).select('versao').eq('id', 1).execute()
+        versao = response.data[0].get('versao') if response.data else None
+    except Exception as e:
+        # Sem a tabela de versão o cache expira só pelo TTL
+        print(f"Erro ao verificar versão da configuração: {str(e)}")
+        return
+
+    with _versao_lock:
+        if _versao is not None and versao != _versao:
+            print(f"Configuração alterada (versão {_versao} -> {versao}), limpando cache")
+            cache_config.limpar()
+        _versao = versao
+
+
+def obter_config(service_supabase, chave, carregar, ttl=None):
+    """
+    Valor da configuração em cache ou carregar() (consulta ao Supabase). O
+    resultado é guardado mesmo se for None (ex.: prompt inexistente); exceções
+    não são guardadas.
+    """
+    _verificar_versao(service_supabase)
+    item = cache_config.get(chave)
+    if item is not None:
+        return item[0]
+
+    _contar("config")
+    valor = carregar()
+    cache_config.set(chave, (valor,), ttl=ttl)
+    return valor
+
+
+def buscar_prompt(service_supabase, tabela, prompt_id):
+    """Linha do prompt pelo id em prompts ou prompts_indicadores, ou None"""
+    def carregar():
+        response = service_supabase.table(tabela).select('*').eq('id', prompt_id).execute()
+        return response.data[0] if response.data else None
+    return obter_config(service_supabase, f"{tabela}:{prompt_id}", carregar)
+
+
+def buscar_prompt_padrao(service_supabase):
+    """Linha do prompt marcado como padrão, ou None"""
+    def carregar():
+        response = service_supabase.table('prompts').select('*').eq('padrao', True).execute()
+        return response.data[0] if response.data else None
+    return obter_config(service_supabase, "prompts:padrao", carregar)
+
+
+def buscar_prompt_id_categoria(service_supabase, categoria_id):
+    """prompt_id vinculado à categoria, ou None"""
+    def carregar():
+        response = service_supabase.table('categorias').select('prompt_id').eq('id', categoria_id).execute()
+        return response.data[0].get('prompt_id') if response.data else None
+    return obter_config(service_supabase, f"categorias:{categoria_id}", carregar)
+
+
+def estatisticas_config():
+    """Acertos do cache e consultas feitas ao Supabase por este processo"""
+    with _versao_lock:
+        consultas = dict(_consultas)
+        versao = _versao
+    return {
+        **cache_config.estatisticas(),
+        "consultas_config": consultas["config"],
+        "consultas_versao": consultas["versao"],
+        "versao": versao
+    }
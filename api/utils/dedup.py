@@ -0,0 +1,73 @@
+import hashlib
+
+# Colunas de base_dados_conteudo reaproveitadas quando um PDF já conhecido é reenviado
+COLUNAS_DOCUMENTO_DEDUP = (
+    'id, backblaze_filename, url_arquivo, conteudo, tamanho_arquivo, '
+    'retorno_ia, hash_prompt_ia, hash_retorno_ia'
+)
+
+
+def hash_texto(texto):
+    """SHA-256 (hex) de um texto, usado para comparar prompts e resultados da IA"""
+    return hashlib.sha256((texto or '').encode('utf-8')).hexdigest()
+
+
+def buscar_documento_por_hash(service_supabase, hash_conteudo):
+    """
+    Procura um documento já enviado com o mesmo conteúdo (SHA-256 do arquivo).
+    Retorna o registro mais antigo com arquivo no Backblaze ou None.
+    """
+    if not hash_conteudo:
+        return None
+    response = service_supabase.table('base_dados_conteudo') \
+        .select(COLUNAS_DOCUMENTO_DEDUP) \
+        .eq('hash_conteudo', hash_conteudo) \
+        .not_.is_('backblaze_filename', 'null') \
+        .order('id') \
+        .limit(1) \
+        .execute()
+    return response.data[0] if response.data else None
+
+
+def retorno_ia_reutilizavel(documento, texto_prompt):
+    """
+    O retorno_ia de um documento existente só é reaproveitado se foi gerado
+    com o mesmo prompt resolvido e não foi editado depois (hash do resultado confere).
+    """
+    retorno_ia = documento.get('retorno_ia')
+    if not retorno_ia or not documento.get('hash_prompt_ia'):
+        return None
+    if documento['hash_prompt_ia'] != hash_texto(texto_prompt):
+        return None
+    if documento.get('hash_retorno_ia') != hash_texto(retorno_ia):
+        return None
+    return retorno_ia
+
+
+def estatisticas_dedup(service_supabase):
+    """
+    Taxa de acerto da deduplicação e bytes de armazenamento economizados,
+    agregados no banco pela função estatisticas_dedup()
+    """
+    response = service_supabase.rpc('estatisticas_dedup', {}).execute()
+    dados = response.data or {}
+    if isinstance(dados, list):
+        dados = dados[0] if dados else {}
+
+    total_uploads = dados.get('total_uploads') or 0
+    total_dedup = dados.get('uploads_deduplicados') or 0
+
+    return {
+        "total_uploads": total_uploads,
+        "uploads_deduplicados": total_dedup,
+        "taxa_acerto": round(total_dedup / total_uploads, 4) if total_uploads else 0.0,
+        "bytes_economizados": dados.get('bytes_economizados') or 0
+    }
+
+
+def conflito_documento_original(erro):
+    """
+    Verdadeiro se a inserção falhou no índice único de documento original por
+    hash_conteudo (outro upload do mesmo PDF foi gravado primeiro)
+    """
+    return getattr(erro, 'code', None) == '23505' and 'original_por_hash' in str(erro)
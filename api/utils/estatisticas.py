@@ -0,0 +1,55 @@
+import json
+from urllib.parse import parse_qs
+from api.utils.autenticacao import verificar_token
+from api.utils.gemini import estatisticas_cache
+from api.utils.chaves_gemini import pool_chaves
+from api.utils.configuracao import estatisticas_config
+
+
+def estatisticas_processo():
+    """
+    Contadores mantidos em memória por esta instância da função (cada endpoint
+    do Vercel roda em processos próprios, então os números são por endpoint)
+    """
+    return {
+        "cache_ia": estatisticas_cache(),
+        # Só o final de cada chave; o segredo nunca sai do processo
+        "chaves_gemini": pool_chaves.estatisticas(),
+        "configuracao": estatisticas_config()
+    }
+
+
+def responder_estatisticas(handler):
+    """
+    GET <endpoint>?stats=1 dos endpoints de análise: valida o token e responde
+    com estatisticas_processo()
+    """
+    query_components = parse_qs(handler.path.split('?')[1]) if '?' in handler.path else {}
+    if query_components.get('stats', [''])[0] != '1':
+        handler.send_response(405)
+        handler.send_header('Content-Type', 'application/json')
+        handler.end_headers()
+        handler.wfile.write(json.dumps({"error": "Use POST para análises ou GET ?stats=1 para estatísticas"}).encode())
+        return
+
+    auth_header = handler.headers.get('Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        handler.send_response(401)
+        handler.send_header('Content-Type', 'application/json')
+        handler.end_headers()
+        handler.wfile.write(json.dumps({"error": "Token de autenticação não fornecido"}).encode())
+        return
+
+    try:
+        verificar_token(auth_header.split(' ')[1])
+    except Exception as auth_error:
+        handler.send_response(401)
+        handler.send_header('Content-Type', 'application/json')
+        handler.end_headers()
+        handler.wfile.write(json.dumps({"error": f"Autenticação inválida: {str(auth_error)}"}).encode())
+        return
+
+    handler.send_response(200)
+    handler.send_header('Content-Type', 'application/json')
+    handler.end_headers()
+    handler.wfile.write(json.dumps(estatisticas_processo()).encode())
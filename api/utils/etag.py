@@ -0,0 +1,47 @@
+import hashlib
+import json
+
+# Respostas com dados do usuário (RLS): só o navegador guarda, sempre revalidando com o ETag
+CACHE_CONTROL_PRIVADO = 'private, no-cache'
+
+
+def calcular_etag(*partes):
+    """ETag forte (entre aspas) a partir de valores serializáveis em JSON"""
+    dados = json.dumps(partes, sort_keys=True, separators=(',', ':'), default=str)
+    return '"' + hashlib.sha256(dados.encode('utf-8')).hexdigest()[:32] + '"'
+
+
+def etag_corresponde(if_none_match, etag):
+    """
+    Confere o header If-None-Match (lista separada por vírgulas ou *) com o
+    ETag atual; a comparação é fraca, como pede a RFC 9110 para esse header.
+    """
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    atual = etag[2:] if etag.startswith('W/') else etag
+    for candidato in if_none_match.split(','):
+        candidato = candidato.strip()
+        if candidato.startswith('W/'):
+            candidato = candidato[2:]
+        if candidato == atual:
+            return True
+    return False
+
+
+def responder_nao_modificado(handler, etag, cache_control=CACHE_CONTROL_PRIVADO):
+    """304 sem corpo, repetindo ETag e Cache-Control"""
+    handler.send_response(304)
+    handler.send_header('ETag', etag)
+    handler.send_header('Cache-Control', cache_control)
+    handler.send_header('Vary', 'Authorization')
+    handler.end_headers()
+
+
+def enviar_cabecalhos_cache(handler, etag, cache_control=CACHE_CONTROL_PRIVADO):
+    """ETag (se houver) e Cache-Control de uma resposta 200; chamar antes de end_headers"""
+    if etag:
+        handler.send_header('ETag', etag)
+    handler.send_header('Cache-Control', cache_control)
+    handler.send_header('Vary', 'Authorization')
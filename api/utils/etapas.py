@@ -0,0 +1,64 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Pool do processo para consultas independentes de uma requisição (Supabase,
+# configuração). As funções submetidas não devem submeter novas tarefas a ele.
+CONSULTAS_CONCORRENTES = int(os.environ.get('CONSULTAS_CONCORRENTES', '16'))
+executor_consultas = ThreadPoolExecutor(max_workers=CONSULTAS_CONCORRENTES)
+
+
+class MedidorEtapas:
+    """
+    Registra início e duração de cada etapa de uma requisição, relativos ao
+    início da requisição, para visualizar o caminho crítico quando etapas
+    rodam em paralelo.
+    """
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self._etapas = {}
+        self._lock = threading.Lock()
+
+    def medir(self, nome, funcao, *args, **kwargs):
+        """Executa funcao(*args, **kwargs) registrando o tempo como a etapa `nome`"""
+        t0 = time.perf_counter()
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            t1 = time.perf_counter()
+            with self._lock:
+                self._etapas[nome] = {
+                    "inicio_ms": round((t0 - self.inicio) * 1000, 1),
+                    "duracao_ms": round((t1 - t0) * 1000, 1)
+                }
+
+    def resumo(self):
+        with self._lock:
+            etapas = dict(sorted(self._etapas.items(), key=lambda item: item[1]["inicio_ms"]))
+        return {
+            "total_ms": round((time.perf_counter() - self.inicio) * 1000, 1),
+            "etapas": etapas
+        }
+
+
+class ConsultasParalelas:
+    """
+    Dispara consultas que não dependem umas das outras ao mesmo tempo; obter()
+    espera o resultado de uma delas e levanta a exceção que ela levantou, de
+    modo que o tratamento de erro de cada etapa continua no ponto de uso.
+    """
+
+    def __init__(self, medidor=None):
+        self.medidor = medidor
+        self._futuros = {}
+
+    def iniciar(self, nome, funcao, *args, **kwargs):
+        if self.medidor is not None:
+            self._futuros[nome] = executor_consultas.submit(self.medidor.medir, nome, funcao, *args, **kwargs)
+        else:
+            self._futuros[nome] = executor_consultas.submit(funcao, *args, **kwargs)
+
+    def obter(self, nome):
+        return self._futuros[nome].result()
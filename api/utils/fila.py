@@ -0,0 +1,326 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+# Estados de um job na fila
+STATUS_PENDENTE = 'pendente'
+STATUS_PROCESSANDO = 'processando'
+STATUS_CONCLUIDO = 'concluido'
+STATUS_ERRO = 'erro'
+
+# Tempo (segundos) que um job reservado fica invisível para outros workers.
+# Se o worker morrer sem concluir/falhar o job, ele volta para a fila após esse prazo.
+TIMEOUT_VISIBILIDADE = 300
+
+MAX_TENTATIVAS = 3
+
+# Espera antes de uma nova tentativa: BACKOFF_BASE * 2^(tentativas - 1) segundos
+BACKOFF_BASE = 30
+
+
+def _backoff(tentativas):
+    return BACKOFF_BASE * (2 ** max(0, tentativas - 1))
+
+
+class FilaJobs:
+    """
+    Interface da fila de jobs. Um job é um dict com as chaves
+    id, tipo, payload, status, tentativas, max_tentativas, erro,
+    criado_em e atualizado_em.
+
+    Ciclo de vida: enfileirar -> reservar | reservar_job -> concluir | falhar.
+    reservar() incrementa as tentativas e esconde o job por timeout_visibilidade;
+    falhar() devolve o job para a fila com backoff até esgotar max_tentativas.
+
+    concluir() e falhar() recebem as tentativas do job reservado e só alteram
+    o job se ele continua nessa reserva: um worker cuja reserva expirou (e o
+    job foi reservado de novo por outro) não sobrescreve o resultado do outro.
+    Retornam False nesse caso.
+    """
+
+    def enfileirar(self, tipo, payload, max_tentativas=MAX_TENTATIVAS):
+        raise NotImplementedError
+
+    def reservar(self, timeout_visibilidade=TIMEOUT_VISIBILIDADE):
+        """Reserva o próximo job disponível ou retorna None"""
+        raise NotImplementedError
+
+    def reservar_job(self, job_id, timeout_visibilidade=TIMEOUT_VISIBILIDADE):
+        """
+        Reserva um job específico se ele ainda está pendente e disponível
+        (usado para processar logo após enfileirar); retorna o job ou None
+        """
+        raise NotImplementedError
+
+    def concluir(self, job_id, tentativa):
+        raise NotImplementedError
+
+    def falhar(self, job_id, erro, tentativa):
+        raise NotImplementedError
+
+    def status(self, job_id):
+        """Retorna o job (dict) ou None se não existir"""
+        raise NotImplementedError
+
+
+class FilaSQLite(FilaJobs):
+    """Fila local em SQLite, usada em desenvolvimento e testes"""
+
+    def __init__(self, caminho=':memory:'):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS fila_jobs (
+                id TEXT PRIMARY KEY,
+                tipo TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                tentativas INTEGER NOT NULL DEFAULT 0,
+                max_tentativas INTEGER NOT NULL,
+                disponivel_em REAL NOT NULL,
+                erro TEXT,
+                criado_em REAL NOT NULL,
+                atualizado_em REAL NOT NULL
+            )
+        ''')
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_fila_jobs_disponivel ON fila_jobs (status, disponivel_em)'
+        )
+
+    def _para_dict(self, row):
+        if row is None:
+            return None
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        return job
+
+    def enfileirar(self, tipo, payload, max_tentativas=MAX_TENTATIVAS):
+        agora = time.time()
+        job_id = str(uuid.uuid4())
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO fila_jobs (id, tipo, payload, status, tentativas, max_tentativas, '
+                'disponivel_em, criado_em, atualizado_em) VALUES (?, ?, ?, ?, 0, ?, ?, ?, ?)',
+                (job_id, tipo, json.dumps(payload), STATUS_PENDENTE, max_tentativas, agora, agora, agora)
+            )
+        return job_id
+
+    def reservar(self, timeout_visibilidade=TIMEOUT_VISIBILIDADE):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                while True:
+                    agora = time.time()
+                    row = self._conn.execute(
+                        'SELECT * FROM fila_jobs WHERE status IN (?, ?) AND disponivel_em <= ? '
+                        'ORDER BY disponivel_em LIMIT 1',
+                        (STATUS_PENDENTE, STATUS_PROCESSANDO, agora)
+                    ).fetchone()
+                    if row is None:
+                        self._conn.execute('COMMIT')
+                        return None
+
+                    # Reserva expirada na última tentativa: o worker morreu, não há mais retries
+                    if row['status'] == STATUS_PROCESSANDO and row['tentativas'] >= row['max_tentativas']:
+                        self._conn.execute(
+                            'UPDATE fila_jobs SET status = ?, erro = ?, atualizado_em = ? WHERE id = ?',
+                            (STATUS_ERRO, 'Tempo de processamento esgotado', agora, row['id'])
+                        )
+                        continue
+
+                    self._conn.execute(
+                        'UPDATE fila_jobs SET status = ?, tentativas = tentativas + 1, '
+                        'disponivel_em = ?, atualizado_em = ? WHERE id = ?',
+                        (STATUS_PROCESSANDO, agora + timeout_visibilidade, agora, row['id'])
+                    )
+                    job = self._para_dict(
+                        self._conn.execute('SELECT * FROM fila_jobs WHERE id = ?', (row['id'],)).fetchone()
+                    )
+                    self._conn.execute('COMMIT')
+                    return job
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def reservar_job(self, job_id, timeout_visibilidade=TIMEOUT_VISIBILIDADE):
+        with self._lock:
+            agora = time.time()
+            cursor = self._conn.execute(
+                'UPDATE fila_jobs SET status = ?, tentativas = tentativas + 1, '
+                'disponivel_em = ?, atualizado_em = ? WHERE id = ? AND status = ? AND disponivel_em <= ?',
+                (STATUS_PROCESSANDO, agora + timeout_visibilidade, agora, job_id, STATUS_PENDENTE, agora)
+            )
+            if cursor.rowcount == 0:
+                return None
+            return self._para_dict(
+                self._conn.execute('SELECT * FROM fila_jobs WHERE id = ?', (job_id,)).fetchone()
+            )
+
+    def concluir(self, job_id, tentativa):
+        with self._lock:
+            cursor = self._conn.execute(
+                'UPDATE fila_jobs SET status = ?, erro = NULL, atualizado_em = ? '
+                'WHERE id = ? AND status = ? AND tentativas = ?',
+                (STATUS_CONCLUIDO, time.time(), job_id, STATUS_PROCESSANDO, tentativa)
+            )
+            return cursor.rowcount > 0
+
+    def falhar(self, job_id, erro, tentativa):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT tentativas, max_tentativas FROM fila_jobs WHERE id = ? AND status = ? AND tentativas = ?',
+                (job_id, STATUS_PROCESSANDO, tentativa)
+            ).fetchone()
+            if row is None:
+                return False
+            agora = time.time()
+            if row['tentativas'] >= row['max_tentativas']:
+                self._conn.execute(
+                    'UPDATE fila_jobs SET status = ?, erro = ?, atualizado_em = ? WHERE id = ?',
+                    (STATUS_ERRO, erro, agora, job_id)
+                )
+            else:
+                self._conn.execute(
+                    'UPDATE fila_jobs SET status = ?, erro = ?, disponivel_em = ?, atualizado_em = ? '
+                    'WHERE id = ?',
+                    (STATUS_PENDENTE, erro, agora + _backoff(row['tentativas']), agora, job_id)
+                )
+            return True
+
+    def status(self, job_id):
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM fila_jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._para_dict(row)
+
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+class FilaSupabase(FilaJobs):
+    """
+    Fila na tabela fila_jobs do Supabase (DDL em
+    supabase/migrations/20261018000004_fila_jobs.sql).
+
+    A reserva, a conclusão e a falha usam update condicional (status +
+    tentativas) para que dois workers nunca peguem nem finalizem o mesmo job.
+    """
+
+    def __init__(self, service_supabase):
+        self.supabase = service_supabase
+
+    def enfileirar(self, tipo, payload, max_tentativas=MAX_TENTATIVAS):
+        agora = _iso(time.time())
+        job_id = str(uuid.uuid4())
+        self.supabase.table('fila_jobs').insert({
+            'id': job_id,
+            'tipo': tipo,
+            'payload': payload,
+            'status': STATUS_PENDENTE,
+            'tentativas': 0,
+            'max_tentativas': max_tentativas,
+            'disponivel_em': agora,
+            'criado_em': agora,
+            'atualizado_em': agora
+        }).execute()
+        return job_id
+
+    def reservar(self, timeout_visibilidade=TIMEOUT_VISIBILIDADE):
+        agora = time.time()
+        candidatos = self.supabase.table('fila_jobs').select('*') \
+            .in_('status', [STATUS_PENDENTE, STATUS_PROCESSANDO]) \
+            .lte('disponivel_em', _iso(agora)) \
+            .order('disponivel_em') \
+            .limit(10) \
+            .execute()
+
+        for job in candidatos.data or []:
+            if job['status'] == STATUS_PROCESSANDO and job['tentativas'] >= job['max_tentativas']:
+                self.supabase.table('fila_jobs').update({
+                    'status': STATUS_ERRO,
+                    'erro': 'Tempo de processamento esgotado',
+                    'atualizado_em': _iso(agora)
+                }).eq('id', job['id']).eq('status', STATUS_PROCESSANDO) \
+                    .eq('tentativas', job['tentativas']).execute()
+                continue
+
+            reserva = self.supabase.table('fila_jobs').update({
+                'status': STATUS_PROCESSANDO,
+                'tentativas': job['tentativas'] + 1,
+                'disponivel_em': _iso(agora + timeout_visibilidade),
+                'atualizado_em': _iso(agora)
+            }).eq('id', job['id']).eq('status', job['status']) \
+                .eq('tentativas', job['tentativas']).execute()
+
+            # Outro worker reservou o job primeiro
+            if reserva.data:
+                return reserva.data[0]
+
+        return None
+
+    def reservar_job(self, job_id, timeout_visibilidade=TIMEOUT_VISIBILIDADE):
+        job = self.status(job_id)
+        agora = time.time()
+        if not job or job['status'] != STATUS_PENDENTE:
+            return None
+        reserva = self.supabase.table('fila_jobs').update({
+            'status': STATUS_PROCESSANDO,
+            'tentativas': job['tentativas'] + 1,
+            'disponivel_em': _iso(agora + timeout_visibilidade),
+            'atualizado_em': _iso(agora)
+        }).eq('id', job_id).eq('status', STATUS_PENDENTE) \
+            .eq('tentativas', job['tentativas']).lte('disponivel_em', _iso(agora)).execute()
+        return reserva.data[0] if reserva.data else None
+
+    def concluir(self, job_id, tentativa):
+        resposta = self.supabase.table('fila_jobs').update({
+            'status': STATUS_CONCLUIDO,
+            'erro': None,
+            'atualizado_em': _iso(time.time())
+        }).eq('id', job_id).eq('status', STATUS_PROCESSANDO).eq('tentativas', tentativa).execute()
+        return bool(resposta.data)
+
+    def falhar(self, job_id, erro, tentativa):
+        job = self.status(job_id)
+        if not job or job['status'] != STATUS_PROCESSANDO or job['tentativas'] != tentativa:
+            return False
+        agora = time.time()
+        if job['tentativas'] >= job['max_tentativas']:
+            dados = {'status': STATUS_ERRO, 'erro': erro, 'atualizado_em': _iso(agora)}
+        else:
+            dados = {
+                'status': STATUS_PENDENTE,
+                'erro': erro,
+                'disponivel_em': _iso(agora + _backoff(job['tentativas'])),
+                'atualizado_em': _iso(agora)
+            }
+        resposta = self.supabase.table('fila_jobs').update(dados).eq('id', job_id) \
+            .eq('status', STATUS_PROCESSANDO).eq('tentativas', tentativa).execute()
+        return bool(resposta.data)
+
+    def status(self, job_id):
+        response = self.supabase.table('fila_jobs').select('*').eq('id', job_id).execute()
+        return response.data[0] if response.data else None
+
+
+_filas_sqlite = {}
+
+
+def obter_fila(service_supabase=None):
+    """
+    Retorna a fila configurada em FILA_JOBS_BACKEND: 'supabase' (padrão)
+    ou 'sqlite' (arquivo em FILA_JOBS_SQLITE_PATH, compartilhado no processo)
+    """
+    backend = os.environ.get('FILA_JOBS_BACKEND', 'supabase')
+    if backend == 'sqlite':
+        caminho = os.environ.get('FILA_JOBS_SQLITE_PATH', '/tmp/fila_jobs.db')
+        if caminho not in _filas_sqlite:
+            _filas_sqlite[caminho] = FilaSQLite(caminho)
+        return _filas_sqlite[caminho]
+    return FilaSupabase(service_supabase)
@@ -0,0 +1,288 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from api.utils.cache import CacheLRU
+from api.utils.resiliencia import Disjuntor, executar_com_retentativas
+from api.utils.chaves_gemini import erro_cota, erro_chave_recusada
+from api.utils.llm import obter_backend
+
+MODELO_PADRAO = 'gemini-2.0-flash'
+
+# Tempo de vida (segundos) das respostas em cache; padrão de 7 dias
+CACHE_IA_TTL = int(os.environ.get('CACHE_IA_TTL', str(7 * 24 * 3600)))
+
+# Camada local: respostas mais recentes em memória do processo
+cache_memoria = CacheLRU(max_itens=256, ttl=CACHE_IA_TTL)
+
+# Prazo total de uma chamada, incluindo esperas e novas tentativas (abaixo do timeout da função)
+GEMINI_PRAZO_SEGUNDOS = float(os.environ.get('GEMINI_PRAZO_SEGUNDOS', '50'))
+
+disjuntor = Disjuntor(
+    limiar_falhas=int(os.environ.get('GEMINI_DISJUNTOR_FALHAS', '5')),
+    tempo_aberto=float(os.environ.get('GEMINI_DISJUNTOR_SEGUNDOS', '30'))
+)
+
+# Contadores por endpoint: acertos na memória, no cache persistente e chamadas à API
+_estatisticas_lock = threading.Lock()
+_estatisticas = {}
+
+
+def chave_cache(modelo, prompt_completo):
+    """Chave do cache: nome do modelo + SHA-256 do prompt completo"""
+    digest = hashlib.sha256(prompt_completo.encode('utf-8')).hexdigest()
+    return f"{modelo}:{digest}"
+
+
+class CacheRespostasSQLite:
+    """Camada persistente local em SQLite (desenvolvimento e testes)"""
+
+    def __init__(self, caminho):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache_respostas_ia (
+                chave TEXT PRIMARY KEY,
+                modelo TEXT NOT NULL,
+                resposta TEXT NOT NULL,
+                expira_em REAL NOT NULL
+            )
+        ''')
+
+    def get(self, chave):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT resposta FROM cache_respostas_ia WHERE chave = ? AND expira_em > ?',
+                (chave, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, chave, modelo, resposta, ttl):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO cache_respostas_ia (chave, modelo, resposta, expira_em) '
+                'VALUES (?, ?, ?, ?)',
+                (chave, modelo, resposta, time.time() + ttl)
+            )
+
+
+class CacheRespostasSupabase:
+    """
+    Camada persistente na tabela cache_respostas_ia do Supabase. Colunas esperadas:
+    chave (text, pk), modelo (text), resposta (text), expira_em (timestamptz)
+    """
+
+    def __init__(self, service_supabase):
+        self.supabase = service_supabase
+
+    def get(self, chave):
+        agora = datetime.now(timezone.utc).isoformat()
+        response = self.supabase.table('cache_respostas_ia').select('resposta') \
+            .eq('chave', chave).gt('expira_em', agora).limit(1).execute()
+        return response.data[0]['resposta'] if response.data else None
+
+    def set(self, chave, modelo, resposta, ttl):
+        expira_em = datetime.fromtimestamp(time.time() + ttl, tz=timezone.utc).isoformat()
+        self.supabase.table('cache_respostas_ia').upsert({
+            'chave': chave,
+            'modelo': modelo,
+            'resposta': resposta,
+            'expira_em': expira_em
+        }).execute()
+
+
+_caches_sqlite = {}
+
+
+def obter_cache_persistente(service_supabase=None):
+    """
+    Camada persistente configurada em CACHE_IA_BACKEND: 'supabase' (padrão),
+    'sqlite' (arquivo em CACHE_IA_SQLITE_PATH) ou 'desativado'
+    """
+    backend = os.environ.get('CACHE_IA_BACKEND', 'supabase')
+    if backend == 'desativado':
+        return None
+    if backend == 'sqlite':
+        caminho = os.environ.get('CACHE_IA_SQLITE_PATH', '/tmp/cache_respostas_ia.db')
+        if caminho not in _caches_sqlite:
+            _caches_sqlite[caminho] = CacheRespostasSQLite(caminho)
+        return _caches_sqlite[caminho]
+    if service_supabase is None:
+        return None
+    return CacheRespostasSupabase(service_supabase)
+
+
+def _contar(endpoint, campo):
+    with _estatisticas_lock:
+        contadores = _estatisticas.setdefault(endpoint, {
+            "hits_memoria": 0,
+            "hits_persistente": 0,
+            "chamadas_gemini": 0
+        })
+        contadores[campo] += 1
+        return dict(contadores)
+
+
+def estatisticas_cache(endpoint=None):
+    """Taxa de acerto e chamadas à Gemini evitadas, por endpoint"""
+    with _estatisticas_lock:
+        itens = {k: dict(v) for k, v in _estatisticas.items() if endpoint is None or k == endpoint}
+    for contadores in itens.values():
+        evitadas = contadores["hits_memoria"] + contadores["hits_persistente"]
+        total = evitadas + contadores["chamadas_gemini"]
+        contadores["chamadas_evitadas"] = evitadas
+        contadores["hit_rate"] = round(evitadas / total, 4) if total else 0.0
+    return itens
+
+
+def erro_transitorio(erro):
+    """429 e 5xx da API (exceções do google.api_core trazem o status em .code) ou falha de rede"""
+    if isinstance(erro, (ConnectionError, TimeoutError)):
+        return True
+    codigo = getattr(erro, 'code', None)
+    return isinstance(codigo, int) and (codigo == 429 or 500 <= codigo < 600)
+
+
+def _chamar_modelo(chaves, modelo, prompt_completo, prazo, stream=False):
+    """
+    Geração pelo backend configurado (api/utils/llm.py) com a chave de maior
+    cota restante do pool (PoolChaves), novas tentativas com backoff e
+    disjuntor. Erro de cota ou de autorização em uma chave tira essa chave da
+    rotação e a chamada segue na hora por outra. No modo stream, a tentativa
+    inclui o primeiro trecho (quando a maioria dos erros aparece); retorna
+    (primeiro_trecho, restante).
+    """
+    prazo = prazo if prazo is not None else time.monotonic() + GEMINI_PRAZO_SEGUNDOS
+    backend = obter_backend()
+
+    def operacao():
+        while True:
+            chave = chaves.adquirir(prazo)
+            timeout = max(1, prazo - time.monotonic())
+            try:
+                if not stream:
+                    return backend.gerar(chave, modelo, prompt_completo, timeout)
+                iterador = iter(backend.gerar_stream(chave, modelo, prompt_completo, timeout))
+                return next(iterador, ""), iterador
+            except Exception as erro:
+                if (erro_cota(erro) or erro_chave_recusada(erro)) and chaves.pausar(chave, erro):
+                    continue
+                raise
+
+    return executar_com_retentativas(operacao, erro_transitorio, disjuntor=disjuntor, prazo=prazo)
+
+
+def _consultar_cache(chave, endpoint, cache_persistente):
+    """Procura a resposta na memória e depois no cache persistente"""
+    resposta = cache_memoria.get(chave)
+    if resposta is not None:
+        _contar(endpoint, "hits_memoria")
+        print(f"Cache de IA ({endpoint}): acerto em memória {estatisticas_cache(endpoint)}")
+        return resposta
+
+    if cache_persistente is not None:
+        try:
+            resposta = cache_persistente.get(chave)
+        except Exception as cache_error:
+            print(f"Erro ao consultar cache persistente de respostas: {str(cache_error)}")
+            resposta = None
+        if resposta is not None:
+            cache_memoria.set(chave, resposta)
+            _contar(endpoint, "hits_persistente")
+            print(f"Cache de IA ({endpoint}): acerto persistente {estatisticas_cache(endpoint)}")
+            return resposta
+
+    return None
+
+
+def _gravar_cache(chave, modelo, resposta, cache_persistente):
+    cache_memoria.set(chave, resposta)
+    if cache_persistente is not None:
+        try:
+            cache_persistente.set(chave, modelo, resposta, CACHE_IA_TTL)
+        except Exception as cache_error:
+            print(f"Erro ao gravar cache persistente de respostas: {str(cache_error)}")
+
+
+def _preparar_cache(modelo, prompt_completo, service_supabase):
+    # Respostas do modelo local (stub) nunca se misturam com as da Gemini
+    chave = chave_cache(obter_backend().identificador(modelo), prompt_completo)
+    cache_persistente = None
+    try:
+        cache_persistente = obter_cache_persistente(service_supabase)
+    except Exception as cache_error:
+        print(f"Cache persistente de respostas indisponível: {str(cache_error)}")
+    return chave, cache_persistente
+
+
+def gerar_resposta(chaves, prompt_completo, endpoint, service_supabase=None,
+                   modelo=MODELO_PADRAO, ignorar_cache=False, prazo=None):
+    """
+    Gera a resposta do modelo para o prompt usando o pool de chaves (ver
+    chaves_gemini.obter_pool_chaves), consultando antes o cache
+    (memória e depois persistente). Com ignorar_cache=True a consulta é pulada,
+    mas a nova resposta ainda é gravada. prazo (time.monotonic()) limita esperas
+    e novas tentativas; por padrão GEMINI_PRAZO_SEGUNDOS a partir de agora.
+    Retorna (texto, veio_do_cache).
+    """
+    chave, cache_persistente = _preparar_cache(modelo, prompt_completo, service_supabase)
+
+    if not ignorar_cache:
+        resposta = _consultar_cache(chave, endpoint, cache_persistente)
+        if resposta is not None:
+            return resposta, True
+
+    resposta = _chamar_modelo(chaves, modelo, prompt_completo, prazo)
+    _contar(endpoint, "chamadas_gemini")
+
+    _gravar_cache(chave, modelo, resposta, cache_persistente)
+    return resposta, False
+
+
+def gerar_resposta_stream(chaves, prompt_completo, endpoint, service_supabase=None,
+                          modelo=MODELO_PADRAO, ignorar_cache=False, prazo=None):
+    """
+    Versão em streaming de gerar_resposta. Retorna (trechos, veio_do_cache), onde
+    trechos é um iterador com o texto na ordem em que o modelo o produz (uma
+    resposta em cache vem em um único trecho). A chamada ao modelo e o primeiro
+    trecho acontecem antes do retorno, então erros da API (cota, circuito
+    aberto) são lançados aqui, antes de o handler enviar os cabeçalhos. A
+    resposta completa é gravada no cache quando o iterador termina.
+    """
+    chave, cache_persistente = _preparar_cache(modelo, prompt_completo, service_supabase)
+
+    if not ignorar_cache:
+        resposta = _consultar_cache(chave, endpoint, cache_persistente)
+        if resposta is not None:
+            return iter([resposta]), True
+
+    primeiro, restante = _chamar_modelo(chaves, modelo, prompt_completo, prazo, stream=True)
+    _contar(endpoint, "chamadas_gemini")
+
+    def trechos():
+        partes = []
+        if primeiro:
+            partes.append(primeiro)
+            yield primeiro
+        for texto in restante:
+            partes.append(texto)
+            yield texto
+        _gravar_cache(chave, modelo, "".join(partes), cache_persistente)
+
+    return trechos(), False
+
+
+def contador_tokens(chaves, modelo=MODELO_PADRAO, timeout=10):
+    """
+    Função texto -> tokens com a contagem exata do backend (count_tokens da
+    Gemini), para usar na pré-verificação de tamanho. Retorna None se não há
+    chave ativa ou o backend não oferece contagem.
+    """
+    def contar(texto):
+        chave = chaves.chave_ativa()
+        if chave is None:
+            return None
+        return obter_backend().contar_tokens(chave, modelo, texto, timeout)
+    return contar
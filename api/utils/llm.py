@@ -0,0 +1,165 @@
+import hashlib
+import os
+import random
+import threading
+import time
+
+# Backend de geração usado por todas as chamadas de IA: 'gemini' (padrão) ou
+# 'stub' (modelo local determinístico, para testes de carga sem rede)
+LLM_BACKEND = os.environ.get('LLM_BACKEND', 'gemini')
+
+
+class BackendLLM:
+    """
+    Interface dos backends de geração de texto. `chave` é a ChaveGemini
+    escolhida no pool (api/utils/chaves_gemini.py); timeout em segundos.
+    """
+
+    nome = None
+
+    def identificador(self, modelo):
+        """Nome do modelo usado nas chaves do cache de respostas"""
+        return modelo
+
+    def gerar(self, chave, modelo, prompt, timeout):
+        """Retorna o texto completo da resposta"""
+        raise NotImplementedError
+
+    def gerar_stream(self, chave, modelo, prompt, timeout):
+        """Iterador com os trechos de texto na ordem em que são gerados"""
+        raise NotImplementedError
+
+    def contar_tokens(self, chave, modelo, texto, timeout):
+        """Contagem exata de tokens do texto, ou None se o backend não oferece"""
+        return None
+
+
+class BackendGemini(BackendLLM):
+    """API Gemini via google-generativeai, com o cliente próprio de cada chave"""
+
+    nome = 'gemini'
+
+    def _modelo(self, chave, modelo):
+        import google.generativeai as genai
+        # Cliente da chave em vez de genai.configure (global ao processo). _client é
+        # interno do google-generativeai: versão fixada em requirements.txt e uso
+        # conferido em tests/test_llm.py
+        model = genai.GenerativeModel(modelo)
+        model._client = chave.cliente()
+        return model
+
+    def gerar(self, chave, modelo, prompt, timeout):
+        response = self._modelo(chave, modelo).generate_content(prompt, request_options={'timeout': timeout})
+        return response.text
+
+    def gerar_stream(self, chave, modelo, prompt, timeout):
+        response = self._modelo(chave, modelo).generate_content(
+            prompt, stream=True, request_options={'timeout': timeout}
+        )
+        for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    def contar_tokens(self, chave, modelo, texto, timeout):
+        response = self._modelo(chave, modelo).count_tokens(texto, request_options={'timeout': timeout})
+        return response.total_tokens
+
+
+class ErroStub(Exception):
+    """Falha simulada; .code segue o status HTTP, como nas exceções do google.api_core"""
+
+    def __init__(self, code):
+        super().__init__(f"Falha simulada do modelo local (HTTP {code})")
+        self.code = code
+
+
+class BackendStub(BackendLLM):
+    """
+    Modelo local determinístico: a mesma semente e o mesmo prompt produzem
+    sempre a mesma latência, o mesmo erro e o mesmo texto.
+
+    latencia_ms / desvio_latencia_ms: tempo até o primeiro token (normal, truncada em 0)
+    tokens_por_segundo: velocidade de geração depois do primeiro token
+    taxa_erro: fração das chamadas que falham com 429/500/503
+    tokens_saida: tamanho da resposta
+    """
+
+    nome = 'stub'
+
+    PALAVRAS = (
+        "análise", "indicador", "documento", "resultado", "saúde", "período",
+        "tendência", "valor", "meta", "observação", "dados", "relatório"
+    )
+
+    def __init__(self, latencia_ms=800, desvio_latencia_ms=200, tokens_por_segundo=80,
+                 taxa_erro=0.0, tokens_saida=400, semente=0):
+        self.latencia_ms = latencia_ms
+        self.desvio_latencia_ms = desvio_latencia_ms
+        self.tokens_por_segundo = tokens_por_segundo
+        self.taxa_erro = taxa_erro
+        self.tokens_saida = tokens_saida
+        self.semente = semente
+        self._chamadas = {}
+        self._lock = threading.Lock()
+
+    def identificador(self, modelo):
+        return f"stub/{modelo}"
+
+    def _sorteio(self, prompt):
+        """Gerador aleatório da chamada: semente + prompt + quantas vezes o prompt já foi pedido"""
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        with self._lock:
+            n = self._chamadas.get(digest, 0)
+            self._chamadas[digest] = n + 1
+        return random.Random(f"{self.semente}:{digest}:{n}"), digest
+
+    def _preparar(self, prompt, timeout):
+        rng, digest = self._sorteio(prompt)
+        latencia = max(0.0, rng.gauss(self.latencia_ms, self.desvio_latencia_ms)) / 1000
+        if latencia > timeout:
+            time.sleep(timeout)
+            raise ErroStub(504)
+        time.sleep(latencia)
+        if rng.random() < self.taxa_erro:
+            raise ErroStub(rng.choice((429, 500, 503)))
+        palavras = [self.PALAVRAS[int(digest[i % 64], 16) % len(self.PALAVRAS)] for i in range(self.tokens_saida)]
+        return palavras
+
+    def gerar(self, chave, modelo, prompt, timeout):
+        palavras = self._preparar(prompt, timeout)
+        time.sleep(len(palavras) / self.tokens_por_segundo)
+        return " ".join(palavras)
+
+    def gerar_stream(self, chave, modelo, prompt, timeout):
+        palavras = self._preparar(prompt, timeout)
+        # Trechos de ~20 tokens, no ritmo de tokens_por_segundo
+        for i in range(0, len(palavras), 20):
+            trecho = palavras[i:i + 20]
+            time.sleep(len(trecho) / self.tokens_por_segundo)
+            yield (" " if i else "") + " ".join(trecho)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def obter_backend():
+    """Backend configurado em LLM_BACKEND; o stub lê os parâmetros das variáveis LLM_STUB_*"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if LLM_BACKEND == 'stub':
+                _backend = BackendStub(
+                    latencia_ms=float(os.environ.get('LLM_STUB_LATENCIA_MS', '800')),
+                    desvio_latencia_ms=float(os.environ.get('LLM_STUB_DESVIO_LATENCIA_MS', '200')),
+                    tokens_por_segundo=float(os.environ.get('LLM_STUB_TOKENS_POR_SEGUNDO', '80')),
+                    taxa_erro=float(os.environ.get('LLM_STUB_TAXA_ERRO', '0')),
+                    tokens_saida=int(os.environ.get('LLM_STUB_TOKENS_SAIDA', '400')),
+                    semente=int(os.environ.get('LLM_STUB_SEMENTE', '0'))
+                )
+                print(f"Usando modelo local (stub): latência {_backend.latencia_ms}ms, "
+                      f"{_backend.tokens_por_segundo} tokens/s, erro {_backend.taxa_erro:.0%}, "
+                      f"{_backend.tokens_saida} tokens de saída")
+            else:
+                _backend = BackendGemini()
+        return _backend
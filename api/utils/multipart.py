@@ -0,0 +1,300 @@
+import hashlib
+import io
+import os
+import tempfile
+from email.message import Message
+
+# Tamanho dos blocos lidos do socket
+TAMANHO_BLOCO = 64 * 1024
+
+# Arquivos até este tamanho ficam em memória; acima disso vão para o disco
+LIMITE_SPOOL_MEMORIA = 1024 * 1024
+
+# Limites para cabeçalhos de cada parte e para campos de texto
+MAX_TAMANHO_CABECALHOS = 16 * 1024
+MAX_TAMANHO_CAMPO = 64 * 1024
+
+
+class MultipartError(Exception):
+    """Erro de formato no corpo multipart/form-data"""
+
+
+class ArquivoMuitoGrandeError(MultipartError):
+    """O corpo ou o arquivo enviado ultrapassa o limite configurado"""
+
+
+def _parse_cabecalho(valor, nome_cabecalho='content-type'):
+    """Separa um cabeçalho no valor principal e seus parâmetros"""
+    msg = Message()
+    msg[nome_cabecalho] = valor
+    params = msg.get_params(header=nome_cabecalho) or []
+    principal = params[0][0].lower() if params else ''
+    return principal, msg
+
+
+class ArquivoRecebido:
+    """
+    Arquivo recebido no upload, gravado em blocos à medida que chega.
+    Calcula tamanho, SHA-256 e SHA-1 (usado pelo B2) sem manter o arquivo
+    inteiro em memória: acima de LIMITE_SPOOL_MEMORIA o conteúdo vai para disco.
+    """
+
+    def __init__(self, filename, content_type, max_tamanho, limite_memoria=LIMITE_SPOOL_MEMORIA):
+        self.filename = filename
+        self.content_type = content_type
+        self.max_tamanho = max_tamanho
+        self.limite_memoria = limite_memoria
+        self.tamanho = 0
+        self._sha256 = hashlib.sha256()
+        self._sha1 = hashlib.sha1()
+        self._buffer = io.BytesIO()
+        self._arquivo_disco = None
+        self.path = None
+
+    @property
+    def sha256(self):
+        return self._sha256.hexdigest()
+
+    @property
+    def sha1(self):
+        return self._sha1.hexdigest()
+
+    @property
+    def em_disco(self):
+        return self._arquivo_disco is not None
+
+    def write(self, dados):
+        if not dados:
+            return
+        self.tamanho += len(dados)
+        if self.max_tamanho is not None and self.tamanho > self.max_tamanho:
+            raise ArquivoMuitoGrandeError(f"Arquivo excede o limite de {self.max_tamanho} bytes")
+
+        self._sha256.update(dados)
+        self._sha1.update(dados)
+
+        if self._arquivo_disco is None and self.tamanho > self.limite_memoria:
+            # Passar o que já está em memória para um arquivo temporário
+            self._arquivo_disco = tempfile.NamedTemporaryFile(delete=False, suffix='.upload')
+            self.path = self._arquivo_disco.name
+            self._arquivo_disco.write(self._buffer.getbuffer())
+            self._buffer = None
+
+        if self._arquivo_disco is not None:
+            self._arquivo_disco.write(dados)
+        else:
+            self._buffer.write(dados)
+
+    def finalizar(self):
+        """Fecha o arquivo em disco para que possa ser reaberto para leitura"""
+        if self._arquivo_disco is not None and not self._arquivo_disco.closed:
+            self._arquivo_disco.flush()
+            self._arquivo_disco.close()
+
+    def open(self):
+        """Retorna um novo stream de leitura posicionado no início do arquivo"""
+        self.finalizar()
+        if self.path:
+            return open(self.path, 'rb')
+        return io.BytesIO(self._buffer.getvalue())
+
+    def read_bytes(self):
+        with self.open() as f:
+            return f.read()
+
+    def close(self):
+        """Remove o arquivo temporário (se houver) e libera o buffer"""
+        self.finalizar()
+        if self.path:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            self.path = None
+        self._arquivo_disco = None
+        self._buffer = io.BytesIO()
+
+
+class FormularioMultipart:
+    """Resultado do parse: campos de texto e arquivos por nome"""
+
+    def __init__(self):
+        self.campos = {}
+        self.arquivos = {}
+
+    def __contains__(self, nome):
+        return nome in self.campos or nome in self.arquivos
+
+    def __getitem__(self, nome):
+        if nome in self.arquivos:
+            return self.arquivos[nome]
+        return self.campos[nome]
+
+    def getvalue(self, nome, padrao=None):
+        return self.campos.get(nome, padrao)
+
+    def close(self):
+        for arquivo in self.arquivos.values():
+            arquivo.close()
+
+
+class _CampoTexto:
+    def __init__(self, max_tamanho):
+        self.max_tamanho = max_tamanho
+        self.dados = bytearray()
+
+    def write(self, dados):
+        if len(self.dados) + len(dados) > self.max_tamanho:
+            raise MultipartError("Campo de formulário excede o tamanho máximo")
+        self.dados += dados
+
+
+class MultipartParser:
+    """
+    Parser incremental de multipart/form-data.
+    Lê o corpo em blocos de TAMANHO_BLOCO, nunca além do Content-Length,
+    e grava cada parte de arquivo diretamente em um ArquivoRecebido.
+    Corpos maiores que max_corpo são rejeitados antes de qualquer leitura.
+    """
+
+    def __init__(self, fp, content_type, content_length, max_arquivo, max_corpo=None,
+                 tamanho_bloco=TAMANHO_BLOCO, limite_memoria=LIMITE_SPOOL_MEMORIA):
+        tipo, msg = _parse_cabecalho(content_type or '')
+        if tipo != 'multipart/form-data':
+            raise MultipartError("Formato de conteúdo inválido. Esperado multipart/form-data")
+
+        boundary = msg.get_param('boundary', header='content-type')
+        if not boundary:
+            raise MultipartError("Boundary do multipart não informado")
+
+        try:
+            self.restante = int(content_length)
+        except (TypeError, ValueError):
+            raise MultipartError("Content-Length ausente ou inválido")
+
+        if max_corpo is not None and self.restante > max_corpo:
+            raise ArquivoMuitoGrandeError(f"Corpo da requisição excede o limite de {max_corpo} bytes")
+
+        self.fp = fp
+        self.max_arquivo = max_arquivo
+        self.tamanho_bloco = tamanho_bloco
+        self.limite_memoria = limite_memoria
+        self.delimitador = b'--' + boundary.encode('latin-1')
+        self.buffer = b''
+
+    def _ler(self):
+        """Lê mais um bloco do corpo; retorna False no fim dos dados"""
+        if self.restante <= 0:
+            return False
+        bloco = self.fp.read(min(self.tamanho_bloco, self.restante))
+        if not bloco:
+            self.restante = 0
+            return False
+        self.restante -= len(bloco)
+        self.buffer += bloco
+        return True
+
+    def _garantir(self, n):
+        while len(self.buffer) < n:
+            if not self._ler():
+                raise MultipartError("Corpo multipart truncado")
+
+    def _ler_cabecalhos(self):
+        while True:
+            fim = self.buffer.find(b'\r\n\r\n')
+            if fim != -1:
+                break
+            if len(self.buffer) > MAX_TAMANHO_CABECALHOS:
+                raise MultipartError("Cabeçalhos da parte excedem o tamanho máximo")
+            if not self._ler():
+                raise MultipartError("Corpo multipart truncado")
+
+        bruto = self.buffer[:fim].decode('utf-8', errors='replace')
+        self.buffer = self.buffer[fim + 4:]
+
+        cabecalhos = {}
+        for linha in bruto.split('\r\n'):
+            if ':' in linha:
+                nome, valor = linha.split(':', 1)
+                cabecalhos[nome.strip().lower()] = valor.strip()
+        return cabecalhos
+
+    def _copiar_corpo_parte(self, destino):
+        """Copia os dados da parte atual até o próximo delimitador"""
+        marcador = b'\r\n' + self.delimitador
+        while True:
+            idx = self.buffer.find(marcador)
+            if idx != -1:
+                destino.write(self.buffer[:idx])
+                self.buffer = self.buffer[idx + len(marcador):]
+                return
+            # Manter no buffer o suficiente para detectar um marcador partido entre blocos
+            seguro = len(self.buffer) - len(marcador) + 1
+            if seguro > 0:
+                destino.write(self.buffer[:seguro])
+                self.buffer = self.buffer[seguro:]
+            if not self._ler():
+                raise MultipartError("Corpo multipart truncado")
+
+    def parse(self):
+        form = FormularioMultipart()
+        try:
+            # Preâmbulo até o primeiro delimitador
+            while True:
+                idx = self.buffer.find(self.delimitador)
+                if idx != -1:
+                    self.buffer = self.buffer[idx + len(self.delimitador):]
+                    break
+                self.buffer = self.buffer[-len(self.delimitador):]
+                if not self._ler():
+                    raise MultipartError("Delimitador multipart não encontrado")
+
+            while True:
+                self._garantir(2)
+                if self.buffer[:2] == b'--':
+                    break
+                if self.buffer[:2] != b'\r\n':
+                    raise MultipartError("Delimitador multipart malformado")
+                self.buffer = self.buffer[2:]
+
+                cabecalhos = self._ler_cabecalhos()
+                _, disposicao = _parse_cabecalho(cabecalhos.get('content-disposition', ''),
+                                                 'content-disposition')
+                nome = disposicao.get_param('name', header='content-disposition')
+                filename = disposicao.get_filename()
+
+                if filename is not None:
+                    destino = ArquivoRecebido(filename, cabecalhos.get('content-type'),
+                                              self.max_arquivo, self.limite_memoria)
+                    if nome is not None and nome not in form.arquivos:
+                        form.arquivos[nome] = destino
+                    self._copiar_corpo_parte(destino)
+                    destino.finalizar()
+                    if form.arquivos.get(nome) is not destino:
+                        destino.close()
+                else:
+                    destino = _CampoTexto(MAX_TAMANHO_CAMPO)
+                    self._copiar_corpo_parte(destino)
+                    if nome is not None and nome not in form.campos:
+                        form.campos[nome] = destino.dados.decode('utf-8', errors='replace')
+
+            # Descartar o epílogo sem mantê-lo em memória
+            self.buffer = b''
+            while self._ler():
+                self.buffer = b''
+        except Exception:
+            form.close()
+            raise
+        return form
+
+
+def parse_multipart(fp, headers, max_arquivo, max_corpo=None):
+    """Atalho para fazer o parse do corpo de uma requisição BaseHTTPRequestHandler"""
+    parser = MultipartParser(
+        fp,
+        headers.get('Content-Type'),
+        headers.get('Content-Length'),
+        max_arquivo=max_arquivo,
+        max_corpo=max_corpo
+    )
+    return parser.parse()
@@ -0,0 +1,121 @@
+import io
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PyPDF2 import PdfReader
+
+# Abaixo deste número de páginas a extração serial é mais rápida que subir o pool
+MIN_PAGINAS_PARALELO = 16
+
+# Tempo máximo (segundos) para extrair o texto de uma única página
+TIMEOUT_PAGINA = 10
+
+# Quantos intervalos de páginas por processo (equilibra páginas lentas entre workers)
+INTERVALOS_POR_WORKER = 2
+
+
+class _TempoPaginaEsgotado(Exception):
+    pass
+
+
+def _alarme(signum, frame):
+    raise _TempoPaginaEsgotado()
+
+
+def _abrir(fonte):
+    """Abre a fonte do PDF: caminho de arquivo ou bytes em memória"""
+    if isinstance(fonte, (bytes, bytearray)):
+        return io.BytesIO(fonte)
+    return open(fonte, 'rb')
+
+
+def _extrair_intervalo(fonte, inicio, fim, timeout_pagina):
+    """Extrai o texto das páginas [inicio, fim) e retorna uma lista com o texto de cada página"""
+    # O timeout por página usa SIGALRM, disponível apenas na thread principal
+    # (sempre o caso dentro dos processos do pool)
+    usar_alarme = (
+        bool(timeout_pagina)
+        and hasattr(signal, 'setitimer')
+        and threading.current_thread() is threading.main_thread()
+    )
+    handler_anterior = signal.signal(signal.SIGALRM, _alarme) if usar_alarme else None
+
+    partes = []
+    try:
+        with _abrir(fonte) as f:
+            reader = PdfReader(f)
+            for i in range(inicio, fim):
+                try:
+                    if usar_alarme:
+                        signal.setitimer(signal.ITIMER_REAL, timeout_pagina)
+                    partes.append(reader.pages[i].extract_text() or "")
+                except _TempoPaginaEsgotado:
+                    print(f"Tempo esgotado ao extrair texto da página {i + 1}, página ignorada")
+                    partes.append("")
+                finally:
+                    if usar_alarme:
+                        signal.setitimer(signal.ITIMER_REAL, 0)
+    finally:
+        if usar_alarme:
+            signal.signal(signal.SIGALRM, handler_anterior)
+    return partes
+
+
+def _dividir_paginas(total, n_intervalos):
+    """Divide [0, total) em até n_intervalos faixas contíguas de tamanho parecido"""
+    n_intervalos = max(1, min(n_intervalos, total))
+    base, resto = divmod(total, n_intervalos)
+    intervalos = []
+    inicio = 0
+    for i in range(n_intervalos):
+        fim = inicio + base + (1 if i < resto else 0)
+        intervalos.append((inicio, fim))
+        inicio = fim
+    return intervalos
+
+
+def _contexto_processos():
+    """
+    Processos do pool sem fork: no upload a extração roda enquanto outras threads
+    (envio ao B2 e as partes do b2sdk) podem estar segurando locks, que um fork
+    copiaria travados para os filhos. forkserver quando existe, senão spawn.
+    """
+    metodos = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in metodos else 'spawn')
+
+
+def extrair_texto_paginas(fonte, max_workers=None, timeout_pagina=TIMEOUT_PAGINA):
+    """
+    Extrai o texto de todas as páginas do PDF, dividindo as páginas entre
+    processos quando o documento é grande. O resultado é idêntico ao da
+    extração serial (texto das páginas concatenado na ordem original).
+    Se o ambiente não suportar multiprocessing, cai para a extração serial.
+    """
+    with _abrir(fonte) as f:
+        total_paginas = len(PdfReader(f).pages)
+
+    workers = min(max_workers or os.cpu_count() or 1, total_paginas)
+
+    if total_paginas < MIN_PAGINAS_PARALELO or workers < 2:
+        return "".join(_extrair_intervalo(fonte, 0, total_paginas, timeout_pagina))
+
+    intervalos = _dividir_paginas(total_paginas, workers * INTERVALOS_POR_WORKER)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_contexto_processos()) as executor:
+            futuros = [
+                executor.submit(_extrair_intervalo, fonte, inicio, fim, timeout_pagina)
+                for inicio, fim in intervalos
+            ]
+            partes = []
+            for futuro in futuros:
+                partes.extend(futuro.result())
+    except (OSError, NotImplementedError, BrokenProcessPool) as pool_error:
+        # Ex.: ambientes serverless sem /dev/shm não suportam os semáforos do multiprocessing
+        print(f"Extração paralela indisponível ({pool_error}), usando extração serial")
+        return "".join(_extrair_intervalo(fonte, 0, total_paginas, timeout_pagina))
+
+    return "".join(partes)
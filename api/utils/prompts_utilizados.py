@@ -0,0 +1,139 @@
+import base64
+import time
+import zlib
+from api.utils.cache import CacheLRU
+from api.utils.dedup import hash_texto
+
+# Tabela de conteúdo endereçado por hash: cada prompt_utilizado distinto é
+# gravado uma vez, comprimido, e as linhas do histórico guardam só o hash
+TABELA_PROMPTS = 'prompts_utilizados'
+COMPRESSAO = 'zlib'
+
+# Tabelas que referenciam a tabela de prompts pela coluna prompt_hash
+TABELAS_COM_PROMPT = ('controle_indicador', 'historico_analises_indicador', 'historico_analises_multiplas')
+
+# Hashes já gravados e prompts já lidos neste processo (conteúdo imutável, sem TTL)
+hashes_gravados = CacheLRU(max_itens=4096)
+prompts_lidos = CacheLRU(max_itens=256)
+
+
+def comprimir(texto):
+    """zlib nível 9 em base64 (coluna text; o texto dos indicadores comprime ~10x)"""
+    return base64.b64encode(zlib.compress(texto.encode('utf-8'), 9)).decode('ascii')
+
+
+def descomprimir(conteudo):
+    return zlib.decompress(base64.b64decode(conteudo)).decode('utf-8')
+
+
+def armazenar_prompt(service_supabase, texto):
+    """Grava o prompt (se ainda não existir) e retorna o hash que o referencia"""
+    prompt_hash = hash_texto(texto)
+    if prompt_hash in hashes_gravados:
+        return prompt_hash
+
+    conteudo = comprimir(texto)
+    service_supabase.table(TABELA_PROMPTS).upsert({
+        'hash': prompt_hash,
+        'conteudo': conteudo,
+        'compressao': COMPRESSAO,
+        'tamanho_original': len(texto.encode('utf-8')),
+        'tamanho_comprimido': len(conteudo)
+    }, on_conflict='hash', ignore_duplicates=True).execute()
+
+    hashes_gravados.set(prompt_hash, True)
+    prompts_lidos.set(prompt_hash, texto)
+    return prompt_hash
+
+
+def colunas_prompt(service_supabase, texto):
+    """
+    Colunas a gravar no lugar de prompt_utilizado. Se a tabela de prompts
+    falhar, grava o texto na própria linha como antes para não perder o histórico.
+    """
+    try:
+        return {'prompt_hash': armazenar_prompt(service_supabase, texto), 'prompt_utilizado': None}
+    except Exception as e:
+        print(f"Erro ao armazenar prompt utilizado, gravando o texto na linha: {str(e)}")
+        return {'prompt_utilizado': texto}
+
+
+def carregar_prompts(service_supabase, hashes):
+    """Textos dos prompts pelos hashes, numa única consulta para os que não estão em memória"""
+    prompts = {}
+    faltando = []
+    for prompt_hash in set(h for h in hashes if h):
+        texto = prompts_lidos.get(prompt_hash)
+        if texto is None:
+            faltando.append(prompt_hash)
+        else:
+            prompts[prompt_hash] = texto
+
+    if faltando:
+        response = service_supabase.table(TABELA_PROMPTS) \
+            .select('hash, conteudo') \
+            .in_('hash', faltando) \
+            .execute()
+        for row in response.data or []:
+            texto = descomprimir(row['conteudo'])
+            prompts_lidos.set(row['hash'], texto)
+            prompts[row['hash']] = texto
+
+    return prompts
+
+
+def migrar_prompts(service_supabase, tabela, tamanho_lote=100, tempo_max=50):
+    """
+    Migração única: move o prompt_utilizado das linhas existentes para a tabela
+    de prompts e deixa só o hash. Pode ser executada várias vezes; cada execução
+    continua de onde a anterior parou, até tempo_max segundos.
+    """
+    if tabela not in TABELAS_COM_PROMPT:
+        raise ValueError(f"Tabela sem prompt_utilizado: {tabela}")
+
+    inicio = time.time()
+    linhas = 0
+    distintos = set()
+    bytes_originais = 0
+
+    while time.time() - inicio < tempo_max:
+        response = service_supabase.table(tabela) \
+            .select('id, prompt_utilizado') \
+            .not_.is_('prompt_utilizado', 'null') \
+            .order('id') \
+            .limit(tamanho_lote) \
+            .execute()
+        lote = response.data or []
+        if not lote:
+            break
+
+        # Linhas com o mesmo prompt são atualizadas juntas
+        ids_por_hash = {}
+        for row in lote:
+            texto = row['prompt_utilizado']
+            prompt_hash = armazenar_prompt(service_supabase, texto)
+            ids_por_hash.setdefault(prompt_hash, []).append(row['id'])
+            distintos.add(prompt_hash)
+            bytes_originais += len(texto.encode('utf-8'))
+
+        for prompt_hash, ids in ids_por_hash.items():
+            service_supabase.table(tabela) \
+                .update({'prompt_hash': prompt_hash, 'prompt_utilizado': None}) \
+                .in_('id', ids) \
+                .execute()
+        linhas += len(lote)
+
+    restantes = service_supabase.table(tabela) \
+        .select('id', count='exact') \
+        .not_.is_('prompt_utilizado', 'null') \
+        .limit(1) \
+        .execute()
+
+    return {
+        "tabela": tabela,
+        "linhas_migradas": linhas,
+        "prompts_distintos": len(distintos),
+        "bytes_originais": bytes_originais,
+        "linhas_restantes": restantes.count or 0,
+        "duracao": round(time.time() - inicio, 3)
+    }
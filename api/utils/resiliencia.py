@@ -0,0 +1,177 @@
+import random
+import threading
+import time
+
+
+class GeminiIndisponivelError(Exception):
+    """
+    A chamada não foi feita (ou foi abandonada) para proteger a API: limite de
+    taxa sem vaga dentro do prazo ou circuito aberto. retry_after indica em
+    quantos segundos vale a pena tentar de novo.
+    """
+
+    def __init__(self, mensagem, retry_after=None):
+        super().__init__(mensagem)
+        self.retry_after = retry_after
+
+
+class BaldeTokens:
+    """
+    Limitador de taxa (token bucket) seguro para threads: `taxa` fichas por
+    segundo, acumulando no máximo `capacidade` para absorver rajadas curtas.
+    """
+
+    def __init__(self, taxa, capacidade):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self._fichas = capacidade
+        self._atualizado_em = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reabastecer(self, agora):
+        self._fichas = min(self.capacidade, self._fichas + (agora - self._atualizado_em) * self.taxa)
+        self._atualizado_em = agora
+
+    def tentar_adquirir(self):
+        """Consome uma ficha se houver; retorna (conseguiu, segundos até a próxima ficha)"""
+        with self._lock:
+            self._reabastecer(time.monotonic())
+            if self._fichas >= 1:
+                self._fichas -= 1
+                return True, 0
+            return False, (1 - self._fichas) / self.taxa
+
+    def disponiveis(self):
+        """Fichas disponíveis agora (cota restante da janela)"""
+        with self._lock:
+            self._reabastecer(time.monotonic())
+            return self._fichas
+
+    def adquirir(self, prazo=None):
+        """
+        Espera por uma ficha. prazo é o instante (time.monotonic()) limite;
+        se a ficha só ficaria disponível depois dele, levanta GeminiIndisponivelError
+        sem esperar.
+        """
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._reabastecer(agora)
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                espera = (1 - self._fichas) / self.taxa
+            if prazo is not None and agora + espera > prazo:
+                raise GeminiIndisponivelError("Limite de requisições à Gemini atingido", retry_after=espera)
+            time.sleep(espera)
+
+
+class Disjuntor:
+    """
+    Circuit breaker: após `limiar_falhas` falhas seguidas o circuito abre e as
+    chamadas falham na hora por `tempo_aberto` segundos. Depois disso uma única
+    chamada de teste é liberada (meio aberto); sucesso fecha o circuito e falha
+    o abre de novo.
+    """
+
+    FECHADO = 'fechado'
+    ABERTO = 'aberto'
+    MEIO_ABERTO = 'meio_aberto'
+
+    def __init__(self, limiar_falhas=5, tempo_aberto=30):
+        self.limiar_falhas = limiar_falhas
+        self.tempo_aberto = tempo_aberto
+        self.estado = self.FECHADO
+        self._falhas = 0
+        self._aberto_em = 0
+        self._teste_em_andamento = False
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        """Levanta GeminiIndisponivelError se o circuito não aceita chamadas agora"""
+        with self._lock:
+            if self.estado == self.FECHADO:
+                return
+            restante = self._aberto_em + self.tempo_aberto - time.monotonic()
+            if self.estado == self.ABERTO and restante <= 0:
+                self.estado = self.MEIO_ABERTO
+                self._teste_em_andamento = False
+            if self.estado == self.MEIO_ABERTO and not self._teste_em_andamento:
+                self._teste_em_andamento = True
+                return
+            raise GeminiIndisponivelError(
+                "API Gemini temporariamente indisponível, tente novamente em instantes",
+                retry_after=max(1, restante)
+            )
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self.estado = self.FECHADO
+            self._falhas = 0
+            self._teste_em_andamento = False
+
+    def liberar_teste(self):
+        """
+        A chamada terminou sem dizer nada sobre a saúde da API (erro da própria
+        requisição ou sem chave disponível): o estado não muda, só a vaga de
+        teste do meio aberto é devolvida
+        """
+        with self._lock:
+            self._teste_em_andamento = False
+
+    def registrar_falha(self):
+        with self._lock:
+            self._falhas += 1
+            if self.estado == self.MEIO_ABERTO or self._falhas >= self.limiar_falhas:
+                if self.estado != self.ABERTO:
+                    print(f"Circuito da Gemini aberto após {self._falhas} falhas seguidas")
+                self.estado = self.ABERTO
+                self._aberto_em = time.monotonic()
+                self._teste_em_andamento = False
+
+
+def espera_backoff(tentativa, base, maximo):
+    """Backoff exponencial com jitter completo: aleatório em [0, min(maximo, base * 2^tentativa)]"""
+    return random.uniform(0, min(maximo, base * (2 ** tentativa)))
+
+
+def executar_com_retentativas(operacao, erro_transitorio, limitador=None, disjuntor=None,
+                              prazo=None, max_tentativas=4, backoff_base=1.0, backoff_maximo=8.0):
+    """
+    Executa operacao() respeitando o limitador de taxa e o disjuntor. Erros para
+    os quais erro_transitorio(erro) é verdadeiro (429, 5xx) são repetidos com
+    backoff exponencial com jitter, desde que a espera caiba antes do prazo
+    (instante em time.monotonic()). Os demais erros são repassados na hora.
+    O disjuntor só registra sucesso quando operacao() retorna.
+    """
+    tentativa = 0
+    while True:
+        if disjuntor is not None:
+            disjuntor.permitir()
+        if limitador is not None:
+            limitador.adquirir(prazo)
+
+        try:
+            resultado = operacao()
+        except Exception as erro:
+            if not erro_transitorio(erro):
+                # Erro da requisição (ex.: prompt inválido) ou pool sem chave: não indica
+                # que a API voltou nem que caiu, então o disjuntor fica como está
+                if disjuntor is not None:
+                    disjuntor.liberar_teste()
+                raise
+            if disjuntor is not None:
+                disjuntor.registrar_falha()
+
+            tentativa += 1
+            espera = espera_backoff(tentativa - 1, backoff_base, backoff_maximo)
+            if tentativa >= max_tentativas or (prazo is not None and time.monotonic() + espera > prazo):
+                raise
+            print(f"Erro transitório na Gemini ({type(erro).__name__}: {erro}), "
+                  f"nova tentativa em {espera:.1f}s ({tentativa}/{max_tentativas - 1})")
+            time.sleep(espera)
+            continue
+
+        if disjuntor is not None:
+            disjuntor.registrar_sucesso()
+        return resultado
@@ -0,0 +1,48 @@
+import json
+
+# Erros de escrita quando o cliente fecha a conexão no meio do stream
+ERROS_CONEXAO = (BrokenPipeError, ConnectionResetError, ConnectionAbortedError)
+
+
+def iniciar_sse(handler):
+    """Envia os cabeçalhos de uma resposta server-sent events (text/event-stream)"""
+    handler.send_response(200)
+    handler.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+    handler.send_header('Cache-Control', 'no-cache')
+    handler.send_header('X-Accel-Buffering', 'no')
+    handler.end_headers()
+    handler.wfile.flush()
+
+
+def enviar_evento(handler, dados, evento=None):
+    """
+    Escreve um evento SSE com os dados em JSON e força o envio imediato.
+    Retorna False (sem lançar) se o cliente já desconectou; eventos seguintes
+    da mesma resposta são descartados.
+    """
+    if getattr(handler, 'sse_desconectado', False):
+        return False
+    mensagem = f"data: {json.dumps(dados)}\n\n"
+    if evento:
+        mensagem = f"event: {evento}\n{mensagem}"
+    try:
+        handler.wfile.write(mensagem.encode())
+        handler.wfile.flush()
+    except ERROS_CONEXAO as erro:
+        print(f"Cliente desconectou durante o stream: {erro}")
+        handler.sse_desconectado = True
+        return False
+    return True
+
+
+def transmitir_trechos(handler, trechos):
+    """
+    Repassa ao cliente cada trecho de texto como um evento 'data: {"texto": ...}'
+    e retorna o texto completo. Se o cliente desconectar, o restante do modelo
+    continua sendo lido, para que o texto completo seja gravado como no modo normal.
+    """
+    partes = []
+    for texto in trechos:
+        partes.append(texto)
+        enviar_evento(handler, {"texto": texto})
+    return "".join(partes)
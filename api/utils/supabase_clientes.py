@@ -0,0 +1,119 @@
+import importlib.util
+import os
+import threading
+import httpx
+from supabase import create_client, Client
+
+# Configuração do cliente Supabase
+supabase_url = os.environ.get("NEXT_PUBLIC_SUPABASE_URL")
+supabase_key = os.environ.get("NEXT_PUBLIC_SUPABASE_ANON_KEY")
+supabase_service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+
+# Conexões mantidas abertas entre requisições pela mesma instância
+SUPABASE_MAX_CONEXOES = int(os.environ.get('SUPABASE_MAX_CONEXOES', '20'))
+SUPABASE_KEEPALIVE_SEGUNDOS = float(os.environ.get('SUPABASE_KEEPALIVE_SEGUNDOS', '60'))
+SUPABASE_TIMEOUT = float(os.environ.get('SUPABASE_TIMEOUT', '30'))
+
+_transporte = None
+_clientes = {}
+_lock = threading.Lock()
+
+
+def http2_disponivel():
+    """HTTP/2 no httpx depende do pacote opcional h2"""
+    return importlib.util.find_spec('h2') is not None
+
+
+class TransporteCompartilhado(httpx.HTTPTransport):
+    """
+    Pool de conexões do processo. Cada httpx.Client fecha o transporte ao ser
+    fechado (close ou with); como o pool é de todos os clientes, ele vive até
+    o fim do processo.
+    """
+
+    def close(self):
+        pass
+
+    def __exit__(self, *args):
+        pass
+
+
+def transporte_http():
+    """
+    Único pool de conexões do processo: conexões keep-alive (HTTP/2 quando
+    disponível) reaproveitadas entre requisições, sem novo handshake TLS a
+    cada chamada. Só o pool é compartilhado; headers e base_url ficam em um
+    httpx.Client por credencial (ver cliente_http).
+    """
+    global _transporte
+    with _lock:
+        if _transporte is None:
+            _transporte = TransporteCompartilhado(
+                http2=http2_disponivel(),
+                limits=httpx.Limits(
+                    max_connections=SUPABASE_MAX_CONEXOES,
+                    max_keepalive_connections=SUPABASE_MAX_CONEXOES,
+                    keepalive_expiry=SUPABASE_KEEPALIVE_SEGUNDOS
+                )
+            )
+        return _transporte
+
+
+def cliente_http():
+    """
+    httpx.Client novo sobre o pool compartilhado. O postgrest-py e o
+    supabase-py alteram base_url e headers do cliente que recebem, então cada
+    credencial (e cada token de usuário) tem o seu.
+    """
+    return httpx.Client(
+        transport=transporte_http(),
+        timeout=httpx.Timeout(SUPABASE_TIMEOUT, connect=10),
+        follow_redirects=True
+    )
+
+
+def _criar_cliente(chave):
+    try:
+        from supabase import ClientOptions
+        return create_client(supabase_url, chave, options=ClientOptions(httpx_client=cliente_http()))
+    except (ImportError, TypeError):
+        # Versões antigas do supabase-py não aceitam httpx_client: cliente próprio, ainda reaproveitado
+        return create_client(supabase_url, chave)
+
+
+def obter_cliente(chave) -> Client:
+    """Cliente Supabase do processo para a chave (anônima ou de serviço), criado uma vez"""
+    cliente = _clientes.get(chave)
+    if cliente is None:
+        cliente = _criar_cliente(chave)
+        with _lock:
+            cliente = _clientes.setdefault(chave, cliente)
+    return cliente
+
+
+def cliente_servico() -> Client:
+    """Cliente com a chave de serviço (ignora RLS)"""
+    return obter_cliente(supabase_service_key)
+
+
+def cliente_anonimo() -> Client:
+    """
+    Cliente com a chave anônima, para validar tokens com auth.get_user(token).
+    Não usar sign_in/sign_out nele: a sessão ficaria no cliente compartilhado.
+    """
+    return obter_cliente(supabase_key)
+
+
+def cliente_usuario(token):
+    """
+    Cliente PostgREST com o token do usuário (consultas sujeitas a RLS), criado
+    por requisição com httpx.Client próprio sobre o pool compartilhado.
+    Substitui auth.set_auth no cliente global, que vazava o token entre
+    requisições concorrentes.
+    """
+    from postgrest import SyncPostgrestClient
+    headers = {"apikey": supabase_key, "Authorization": f"Bearer {token}"}
+    try:
+        return SyncPostgrestClient(f"{supabase_url}/rest/v1", headers=headers, http_client=cliente_http())
+    except TypeError:
+        return SyncPostgrestClient(f"{supabase_url}/rest/v1", headers=headers)
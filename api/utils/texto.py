@@ -0,0 +1,44 @@
+import re
+
+# Caracteres de controle removidos (mantém \t, \n e \r, que é normalizado depois)
+_TABELA_CONTROLE = dict.fromkeys(
+    [c for c in range(0x00, 0x20) if c not in (0x09, 0x0A, 0x0D)] + [0x7F]
+)
+
+# str.translate só é rápido em texto ASCII; com outros caracteres a classe
+# regex remove os controles em uma fração do tempo
+_CONTROLE = re.compile(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]+')
+
+# Equivalentes a \n{3,} e ' {2,}', mas o motor de regex os percorre mais rápido
+_QUEBRAS_EXCESSIVAS = re.compile(r'\n\n\n+')
+_ESPACOS_EXCESSIVOS = re.compile(r'  +')
+
+
+def limpar_texto_para_postgres(texto):
+    """
+    Limpa texto para ser compatível com PostgreSQL
+    Remove null bytes e outros caracteres de controle (translate em texto ASCII,
+    uma regex nos demais), normaliza quebras de linha e colapsa linhas em branco e espaços repetidos.
+    Cada etapa de substituição só percorre o texto se houver algo a substituir.
+    """
+    if not texto:
+        return ""
+
+    if texto.isascii():
+        texto_limpo = texto.translate(_TABELA_CONTROLE)
+    else:
+        texto_limpo = _CONTROLE.sub('', texto)
+
+    # Normalizar quebras de linha (\r\n e \r viram \n)
+    if '\r' in texto_limpo:
+        texto_limpo = texto_limpo.replace('\r\n', '\n').replace('\r', '\n')
+
+    # Remover múltiplas quebras de linha consecutivas
+    if '\n\n\n' in texto_limpo:
+        texto_limpo = _QUEBRAS_EXCESSIVAS.sub('\n\n', texto_limpo)
+
+    # Remover espaços em excesso
+    if '  ' in texto_limpo:
+        texto_limpo = _ESPACOS_EXCESSIVOS.sub(' ', texto_limpo)
+
+    return texto_limpo.strip()
@@ -0,0 +1,152 @@
+import os
+import re
+from collections import Counter
+from api.utils.texto import limpar_texto_para_postgres
+
+# Média de caracteres por token em português (estimativa conservadora)
+CARACTERES_POR_TOKEN = 4
+
+# Orçamento de tokens do prompt completo (prompt + texto) nas análises múltiplas
+ORCAMENTO_TOKENS = int(os.environ.get('GEMINI_ORCAMENTO_TOKENS', '250000'))
+
+# Acima desta fração do orçamento a estimativa local é confirmada com a contagem exata da API
+MARGEM_CONTAGEM_EXATA = 0.75
+
+# Linha repetida pelo menos este número de vezes em uma mesma fonte é tratada
+# como cabeçalho/rodapé e mantida só na primeira ocorrência
+MIN_REPETICOES_BOILERPLATE = 3
+MIN_TAMANHO_BOILERPLATE = 15
+
+MARCA_TRUNCADO = "[... trecho truncado para caber no limite de tokens ...]"
+
+# Cabeçalhos que separam as fontes no texto montado pelo frontend:
+# "### Texto Documento ID 1 (arquivo.pdf) ###" e "=== INDICADOR: nome ==="
+_RE_CABECALHO_FONTE = re.compile(r'^(?:###\s.*\s###|===\s.*\s===)[ \t]*$', re.M)
+_RE_ESPACOS_FIM_LINHA = re.compile(r'[ \t]+\n')
+_RE_TABS = re.compile(r'\t+')
+
+
+def estimar_tokens(texto):
+    """Estimativa rápida do número de tokens de um texto"""
+    return len(texto) // CARACTERES_POR_TOKEN + 1
+
+
+def contar_tokens(texto, contador_exato=None, orcamento=ORCAMENTO_TOKENS):
+    """
+    Retorna (tokens, metodo). Usa a estimativa local e, se ela chegar perto do
+    orçamento e houver contador_exato(texto) -> int, confirma com a contagem exata.
+    """
+    estimativa = estimar_tokens(texto)
+    if contador_exato is not None and estimativa >= orcamento * MARGEM_CONTAGEM_EXATA:
+        try:
+            exato = contador_exato(texto)
+            if exato is not None:
+                return exato, "exato"
+        except Exception as e:
+            print(f"Contagem exata de tokens indisponível, usando estimativa: {str(e)}")
+    return estimativa, "estimado"
+
+
+def dividir_fontes(texto):
+    """Divide o texto combinado em fontes (cabeçalho + conteúdo); sem cabeçalhos, é uma fonte só"""
+    inicios = [m.start() for m in _RE_CABECALHO_FONTE.finditer(texto)]
+    if not inicios:
+        return [texto]
+    if inicios[0] > 0:
+        inicios.insert(0, 0)
+    return [texto[a:b] for a, b in zip(inicios, inicios[1:] + [len(texto)])]
+
+
+def _remover_boilerplate(fonte):
+    """Mantém só a primeira ocorrência de linhas repetidas várias vezes na fonte (cabeçalhos de página etc.)"""
+    linhas = fonte.split('\n')
+    contagem = Counter(linha.strip() for linha in linhas)
+    repetidas = {
+        linha for linha, n in contagem.items()
+        if n >= MIN_REPETICOES_BOILERPLATE and len(linha) >= MIN_TAMANHO_BOILERPLATE
+    }
+    if not repetidas:
+        return fonte
+    vistas = set()
+    resultado = []
+    for linha in linhas:
+        chave = linha.strip()
+        if chave in repetidas:
+            if chave in vistas:
+                continue
+            vistas.add(chave)
+        resultado.append(linha)
+    return '\n'.join(resultado)
+
+
+def compactar(texto):
+    """Remove espaços em excesso e boilerplate repetido, fonte a fonte"""
+    fontes = []
+    for fonte in dividir_fontes(texto):
+        fonte = _RE_TABS.sub(' ', fonte)
+        fonte = _RE_ESPACOS_FIM_LINHA.sub('\n', fonte)
+        fonte = limpar_texto_para_postgres(_remover_boilerplate(fonte))
+        if fonte:
+            fontes.append(fonte)
+    return '\n\n'.join(fontes)
+
+
+def truncar_proporcional(texto, max_tokens):
+    """
+    Corta cada fonte na mesma proporção para o texto caber em max_tokens
+    (estimados). Os cortes são feitos em fim de linha e sinalizados no texto.
+    """
+    fontes = dividir_fontes(texto)
+    total = sum(len(fonte) for fonte in fontes)
+    max_caracteres = max_tokens * CARACTERES_POR_TOKEN - len(MARCA_TRUNCADO) * len(fontes)
+    if total <= max_caracteres:
+        return texto
+    fator = max(0, max_caracteres) / total
+    cortadas = []
+    for fonte in fontes:
+        limite = int(len(fonte) * fator)
+        if len(fonte) <= limite:
+            cortadas.append(fonte)
+            continue
+        quebra = fonte.rfind('\n', 0, limite)
+        corte = fonte[:quebra if quebra > limite // 2 else limite].rstrip()
+        cortadas.append(f"{corte}\n{MARCA_TRUNCADO}")
+    return '\n\n'.join(cortadas)
+
+
+def preparar_entrada(texto_prompt, texto, contador_exato=None, orcamento=ORCAMENTO_TOKENS, truncar=True):
+    """
+    Pré-verificação do texto enviado junto com o prompt. Dentro do orçamento o
+    texto segue sem alteração; acima dele é compactado e, se ainda não couber e
+    truncar=True, cortado proporcionalmente por fonte.
+
+    Retorna {"texto", "excede", "tokens": {original, final, orcamento, metodo,
+    compactado, truncado}}; excede=True indica que o texto não cabe e não foi cortado.
+    """
+    tokens_prompt = estimar_tokens(texto_prompt) + 1
+    original, metodo = contar_tokens(f"{texto_prompt}\n\n{texto}", contador_exato, orcamento)
+    info = {
+        "original": original,
+        "final": original,
+        "orcamento": orcamento,
+        "metodo": metodo,
+        "compactado": False,
+        "truncado": False
+    }
+    if original <= orcamento:
+        return {"texto": texto, "excede": False, "tokens": info}
+
+    texto = compactar(texto)
+    info["compactado"] = True
+    info["final"], info["metodo"] = contar_tokens(f"{texto_prompt}\n\n{texto}", contador_exato, orcamento)
+
+    if info["final"] > orcamento and truncar:
+        # A contagem exata pode ser maior que a estimativa: corta na mesma proporção
+        proporcao = estimar_tokens(texto) / max(1, info["final"] - tokens_prompt)
+        texto = truncar_proporcional(texto, int((orcamento - tokens_prompt) * min(1, proporcao)))
+        info["truncado"] = True
+        # Se a contagem exata já foi usada, mantém o mesmo método para conferir o corte
+        limiar = 0 if info["metodo"] == "exato" else orcamento
+        info["final"], info["metodo"] = contar_tokens(f"{texto_prompt}\n\n{texto}", contador_exato, limiar)
+
+    return {"texto": texto, "excede": info["final"] > orcamento, "tokens": info}
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { toast } from 'react-hot-toast';
 import { supabase } from '../utils/supabaseClient';
+import { reidratarPromptsUtilizados } from '../utils/promptUtilizado';
 import { FiAward, FiZap, FiCpu } from 'react-icons/fi';
 
 const GeminiIndicatorAnalysisDialog = ({ indicadorData, controleIndicadorId, onClose, onAnalysisComplete }) => {
@@ -24,7 +25,7 @@ const GeminiIndicatorAnalysisDialog = ({ indicadorData, controleIndicadorId, onC
       
       const { data, error } = await supabase
         .from('controle_indicador')
-        .select('resultado_analise, prompt_utilizado, prompt_id')
+        .select('resultado_analise, prompt_utilizado, prompt_hash, prompt_id')
         .eq('id', controleIndicadorId)
         .single();
 
@@ -34,8 +35,9 @@ const GeminiIndicatorAnalysisDialog = ({ indicadorData, controleIndicadorId, onC
       }
 
       // Verificar se todos os campos estão preenchidos
-      if (data && data.resultado_analise && data.prompt_utilizado && data.prompt_id) {
-        setExistingAnalysis(data);
+      if (data && data.resultado_analise && (data.prompt_utilizado || data.prompt_hash) && data.prompt_id) {
+        const [analise] = await reidratarPromptsUtilizados([data]);
+        setExistingAnalysis(analise);
         console.log('Análise existente encontrada:', data);
       } else {
         console.log('Nenhuma análise existente encontrada');
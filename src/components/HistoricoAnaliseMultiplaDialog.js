@@ -2,6 +2,7 @@
 import React, { useState, useEffect } from 'react';
 import { toast } from 'react-hot-toast';
 import { supabase } from '../utils/supabaseClient';
+import { reidratarPromptsUtilizados } from '../utils/promptUtilizado';
 import { FiBookOpen, FiEye, FiCalendar, FiClock, FiX, FiUsers, FiTrash2 } from 'react-icons/fi';
 
 const HistoricoAnaliseMultiplaDialog = ({ onClose }) => {
@@ -61,9 +62,15 @@ const HistoricoAnaliseMultiplaDialog = ({ onClose }) => {
   };
 
   // Função para visualizar análise completa
-  const visualizarAnalise = (analise) => {
+  const visualizarAnalise = async (analise) => {
     setSelectedAnalise(analise);
     setShowAnaliseModal(true);
+
+    // O prompt utilizado fica na tabela prompts_utilizados; carregar só ao abrir a análise
+    if (!analise.prompt_utilizado && analise.prompt_hash) {
+      const [completa] = await reidratarPromptsUtilizados([analise]);
+      setSelectedAnalise(completa);
+    }
   };
 
   // Função para deletar análise
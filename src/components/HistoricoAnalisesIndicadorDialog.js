@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { toast } from 'react-hot-toast';
 import { supabase } from '../utils/supabaseClient';
+import { reidratarPromptsUtilizados } from '../utils/promptUtilizado';
 import { FiBookOpen, FiEye, FiCalendar, FiClock, FiX } from 'react-icons/fi';
 
 const HistoricoAnalisesIndicadorDialog = ({ indicadorId, onClose }) => {
@@ -62,9 +63,15 @@ const HistoricoAnalisesIndicadorDialog = ({ indicadorId, onClose }) => {
   };
 
   // Função para visualizar análise completa
-  const visualizarAnalise = (analise) => {
+  const visualizarAnalise = async (analise) => {
     setSelectedAnalise(analise);
     setShowAnaliseModal(true);
+
+    // O prompt utilizado fica na tabela prompts_utilizados; carregar só ao abrir a análise
+    if (!analise.prompt_utilizado && analise.prompt_hash) {
+      const [completa] = await reidratarPromptsUtilizados([analise]);
+      setSelectedAnalise(completa);
+    }
   };
 
   return (
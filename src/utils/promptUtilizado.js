@@ -0,0 +1,41 @@
+// src/utils/promptUtilizado.js
+import { supabase } from './supabaseClient';
+
+/**
+ * Preenche prompt_utilizado nos registros de análise que guardam só o
+ * prompt_hash (o texto fica comprimido na tabela prompts_utilizados).
+ * @param {Array<Object>} registros - Linhas de controle_indicador ou do histórico
+ * @returns {Promise<Array<Object>>} - Novos objetos com prompt_utilizado preenchido quando possível
+ */
+export const reidratarPromptsUtilizados = async (registros) => {
+  const hashes = [...new Set(
+    registros
+      .filter((registro) => !registro.prompt_utilizado && registro.prompt_hash)
+      .map((registro) => registro.prompt_hash)
+  )];
+  if (hashes.length === 0) return registros;
+
+  try {
+    const { data: { session } } = await supabase.auth.getSession();
+    if (!session) return registros;
+
+    const response = await fetch(`/api/prompts_utilizados?hash=${hashes.join(',')}`, {
+      headers: {
+        'Authorization': `Bearer ${session.access_token}`
+      }
+    });
+    if (!response.ok) throw new Error(`Erro ${response.status} ao carregar prompts`);
+
+    const { prompts } = await response.json();
+    return registros.map((registro) => (
+      !registro.prompt_utilizado && prompts[registro.prompt_hash]
+        ? { ...registro, prompt_utilizado: prompts[registro.prompt_hash] }
+        : registro
+    ));
+  } catch (error) {
+    console.error('Erro ao carregar prompt utilizado:', error);
+    return registros;
+  }
+};
+
+export default reidratarPromptsUtilizados;
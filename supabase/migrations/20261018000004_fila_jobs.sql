@@ -0,0 +1,23 @@
+-- Fila de jobs em segundo plano (api/utils/fila.py, FILA_JOBS_BACKEND=supabase).
+-- Usada pelo upload (enfileira a análise de IA), por /api/processar_analises
+-- (worker) e por /api/status_analise. Acesso apenas com a chave de serviço.
+create table if not exists public.fila_jobs (
+    id uuid primary key,
+    tipo text not null,
+    payload jsonb not null,
+    status text not null
+        check (status in ('pendente', 'processando', 'concluido', 'erro')),
+    tentativas integer not null default 0,
+    max_tentativas integer not null default 3,
+    disponivel_em timestamptz not null default now(),
+    erro text,
+    criado_em timestamptz not null default now(),
+    atualizado_em timestamptz not null default now()
+);
+
+-- Próximos jobs disponíveis (reservar)
+create index if not exists idx_fila_jobs_disponivel
+    on public.fila_jobs (status, disponivel_em);
+
+-- Sem políticas: só a service role (que ignora RLS) lê e escreve
+alter table public.fila_jobs enable row level security;
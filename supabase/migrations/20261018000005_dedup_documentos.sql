@@ -0,0 +1,40 @@
+-- Deduplicação de uploads por conteúdo (api/utils/dedup.py, api/upload.py)
+alter table public.base_dados_conteudo
+    add column if not exists hash_conteudo text,
+    add column if not exists dedup_origem_id bigint
+        references public.base_dados_conteudo (id) on delete set null,
+    add column if not exists hash_prompt_ia text,
+    add column if not exists hash_retorno_ia text;
+
+-- Busca do documento original pelo SHA-256 do arquivo
+create index if not exists idx_base_dados_conteudo_hash_conteudo
+    on public.base_dados_conteudo (hash_conteudo)
+    where hash_conteudo is not null;
+
+-- Um único documento original (com o arquivo no B2) por conteúdo; as cópias
+-- deduplicadas apontam para ele em dedup_origem_id
+create unique index if not exists uq_base_dados_conteudo_original_por_hash
+    on public.base_dados_conteudo (hash_conteudo)
+    where hash_conteudo is not null and dedup_origem_id is null;
+
+create index if not exists idx_base_dados_conteudo_dedup_origem
+    on public.base_dados_conteudo (dedup_origem_id)
+    where dedup_origem_id is not null;
+
+-- Estatísticas de /api/estatisticas_dedup agregadas no banco (sem o limite
+-- de linhas do PostgREST)
+create or replace function public.estatisticas_dedup()
+returns json
+language sql
+stable
+as $$
+    select json_build_object(
+        'total_uploads', count(*),
+        'uploads_deduplicados', count(*) filter (where dedup_origem_id is not null),
+        'bytes_economizados', coalesce(sum(tamanho_arquivo) filter (where dedup_origem_id is not null), 0)
+    )
+    from public.base_dados_conteudo;
+$$;
+
+revoke execute on function public.estatisticas_dedup() from public, anon, authenticated;
+grant execute on function public.estatisticas_dedup() to service_role;
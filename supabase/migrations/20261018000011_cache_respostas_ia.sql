@@ -0,0 +1,18 @@
+-- Cache persistente das respostas da Gemini (api/utils/gemini.py,
+-- CACHE_IA_BACKEND=supabase). chave = modelo + SHA-256 do prompt completo.
+-- Acesso apenas com a chave de serviço.
+create table if not exists public.cache_respostas_ia (
+    chave text primary key,
+    modelo text not null,
+    resposta text not null,
+    expira_em timestamptz not null,
+    criado_em timestamptz not null default now()
+);
+
+-- Limpeza das respostas vencidas:
+--   delete from public.cache_respostas_ia where expira_em < now();
+create index if not exists idx_cache_respostas_ia_expira_em
+    on public.cache_respostas_ia (expira_em);
+
+-- Sem políticas: só a service role (que ignora RLS) lê e escreve
+alter table public.cache_respostas_ia enable row level security;
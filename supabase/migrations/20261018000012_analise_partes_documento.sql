@@ -0,0 +1,20 @@
+-- Resultados parciais do modo map-reduce de /api/analyze_with_gemini
+-- (api/utils/analise_partes.py): uma linha por parte do documento analisada
+-- com um prompt. hash_parte = SHA-256 do prompt enviado para a parte; numa
+-- nova análise só as partes com hash novo vão ao modelo.
+-- Acesso apenas com a chave de serviço.
+create table if not exists public.analise_partes_documento (
+    documento_id bigint not null
+        references public.base_dados_conteudo (id) on delete cascade,
+    -- id da tabela prompts, guardado como texto (vem do corpo da requisição)
+    prompt_id text not null,
+    indice integer not null,
+    hash_parte text not null,
+    resultado text not null,
+    atualizado_em timestamptz not null default now(),
+    -- Alvo do upsert (on_conflict='documento_id,prompt_id,hash_parte')
+    primary key (documento_id, prompt_id, hash_parte)
+);
+
+-- Sem políticas: só a service role (que ignora RLS) lê e escreve
+alter table public.analise_partes_documento enable row level security;
@@ -0,0 +1,35 @@
+-- Lotes de análise de /api/analyze_batch (api/utils/analise_lote.py).
+-- pendentes: ids ainda a analisar (o lote parcial é retomado a partir deles);
+-- falhas: id -> mensagem do último erro. Acesso apenas com a chave de serviço.
+create table if not exists public.analises_lote (
+    id uuid primary key,
+    -- id da tabela prompts, guardado como texto (vem do corpo da requisição)
+    prompt_id text not null,
+    usuario_id uuid,
+    documento_ids jsonb not null,
+    pendentes jsonb not null,
+    concluidos integer not null default 0,
+    falhas jsonb not null default '{}'::jsonb,
+    status text not null
+        check (status in ('processando', 'parcial', 'concluido')),
+    criado_em timestamptz not null default now(),
+    atualizado_em timestamptz not null default now()
+);
+
+-- Sem políticas: só a service role (que ignora RLS) lê e escreve
+alter table public.analises_lote enable row level security;
+
+-- Gravação de retorno_ia de vários documentos em um único UPDATE.
+-- resultados: [{"id": 1, "retorno_ia": "..."}, ...]
+create or replace function public.gravar_retornos_ia(resultados jsonb)
+returns void
+language sql
+as $$
+    update public.base_dados_conteudo as documento
+    set retorno_ia = resultado.retorno_ia
+    from jsonb_to_recordset(resultados) as resultado(id bigint, retorno_ia text)
+    where documento.id = resultado.id;
+$$;
+
+revoke execute on function public.gravar_retornos_ia(jsonb) from public, anon, authenticated;
+grant execute on function public.gravar_retornos_ia(jsonb) to service_role;
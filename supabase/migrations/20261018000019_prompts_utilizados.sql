@@ -0,0 +1,24 @@
+-- Prompts utilizados nas análises guardados uma única vez, comprimidos
+-- (api/utils/prompts_utilizados.py). hash = SHA-256 do texto; conteudo =
+-- zlib nível 9 em base64. Lidos pelo frontend via /api/prompts_utilizados.
+-- Acesso apenas com a chave de serviço.
+create table if not exists public.prompts_utilizados (
+    hash text primary key,
+    conteudo text not null,
+    compressao text not null default 'zlib',
+    tamanho_original integer not null,
+    tamanho_comprimido integer not null,
+    criado_em timestamptz not null default now()
+);
+
+-- Sem políticas: só a service role (que ignora RLS) lê e escreve
+alter table public.prompts_utilizados enable row level security;
+
+-- As linhas das análises guardam só o hash; prompt_utilizado fica nulo
+-- (ou com o texto, nas linhas antigas ainda não migradas)
+alter table public.controle_indicador
+    add column if not exists prompt_hash text references public.prompts_utilizados (hash);
+alter table public.historico_analises_indicador
+    add column if not exists prompt_hash text references public.prompts_utilizados (hash);
+alter table public.historico_analises_multiplas
+    add column if not exists prompt_hash text references public.prompts_utilizados (hash);
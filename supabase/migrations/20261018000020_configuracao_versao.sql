@@ -0,0 +1,53 @@
+-- Versão da configuração lida pelas funções Python (api/utils/configuracao.py).
+-- Cada instância guarda prompts, prompts de categoria e chaves da Gemini em
+-- memória e descarta o cache quando esta versão muda. Os triggers abaixo a
+-- incrementam em qualquer alteração nas tabelas de configuração, que o
+-- frontend edita direto no Supabase.
+create table if not exists public.configuracao_versao (
+    id integer primary key check (id = 1),
+    versao bigint not null default 0,
+    atualizado_em timestamptz not null default now()
+);
+
+insert into public.configuracao_versao (id, versao)
+values (1, 0)
+on conflict (id) do nothing;
+
+-- Sem políticas: só a service role (que ignora RLS) lê
+alter table public.configuracao_versao enable row level security;
+
+-- security definer: o trigger roda com o usuário do frontend, que não
+-- tem acesso à tabela de versão
+create or replace function public.incrementar_configuracao_versao()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    update public.configuracao_versao
+    set versao = versao + 1, atualizado_em = now()
+    where id = 1;
+    return null;
+end;
+$$;
+
+drop trigger if exists trg_configuracao_versao on public.prompts;
+create trigger trg_configuracao_versao
+    after insert or update or delete or truncate on public.prompts
+    for each statement execute function public.incrementar_configuracao_versao();
+
+drop trigger if exists trg_configuracao_versao on public.prompts_indicadores;
+create trigger trg_configuracao_versao
+    after insert or update or delete or truncate on public.prompts_indicadores
+    for each statement execute function public.incrementar_configuracao_versao();
+
+drop trigger if exists trg_configuracao_versao on public.categorias;
+create trigger trg_configuracao_versao
+    after insert or update or delete or truncate on public.categorias
+    for each statement execute function public.incrementar_configuracao_versao();
+
+drop trigger if exists trg_configuracao_versao on public.configuracoes_gemini;
+create trigger trg_configuracao_versao
+    after insert or update or delete or truncate on public.configuracoes_gemini
+    for each statement execute function public.incrementar_configuracao_versao();
@@ -0,0 +1,22 @@
+-- Versão de cada linha de base_dados_conteudo para os ETags de /api/conteudo
+-- (api/conteudo.py). As linhas existentes recebem o instante da migração; o
+-- trigger atualiza a coluna em todo UPDATE, inclusive os feitos pelo
+-- frontend e pelas análises que gravam retorno_ia.
+alter table public.base_dados_conteudo
+    add column if not exists updated_at timestamptz not null default now();
+
+-- clock_timestamp(): dois UPDATEs na mesma transação ainda geram versões diferentes
+create or replace function public.atualizar_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at = clock_timestamp();
+    return new;
+end;
+$$;
+
+drop trigger if exists trg_updated_at on public.base_dados_conteudo;
+create trigger trg_updated_at
+    before update on public.base_dados_conteudo
+    for each row execute function public.atualizar_updated_at();
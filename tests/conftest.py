@@ -0,0 +1,193 @@
+import pytest
+
+
+class Resposta:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class ConsultaFalsa:
+    """Subconjunto do query builder do postgrest-py sobre listas de dicts em memória"""
+
+    def __init__(self, banco, tabela):
+        self.banco = banco
+        self.tabela = tabela
+        self.operacao = 'select'
+        self.colunas = None
+        self.valores = None
+        self.filtros = []
+        self.limite = None
+        self.ordem = None
+        self.contar = False
+        self._negar = False
+
+    @property
+    def linhas(self):
+        return self.banco.tabelas.setdefault(self.tabela, [])
+
+    # Operações
+    def select(self, colunas='*', count=None, **kwargs):
+        self.operacao = 'select'
+        self.contar = count is not None
+        self.colunas = [c.strip() for c in colunas.split(',')] if colunas != '*' else None
+        return self
+
+    def insert(self, valores, **kwargs):
+        self.operacao, self.valores = 'insert', valores
+        return self
+
+    def upsert(self, valores, on_conflict='id', ignore_duplicates=False, **kwargs):
+        self.operacao, self.valores = 'upsert', valores
+        self.on_conflict = on_conflict.split(',')
+        self.ignorar_duplicados = ignore_duplicates
+        return self
+
+    def update(self, valores, **kwargs):
+        self.operacao, self.valores = 'update', valores
+        return self
+
+    def delete(self, **kwargs):
+        self.operacao = 'delete'
+        return self
+
+    # Filtros
+    def _filtro(self, funcao):
+        negar, self._negar = self._negar, False
+        self.filtros.append((lambda linha: not funcao(linha)) if negar else funcao)
+        return self
+
+    @property
+    def not_(self):
+        self._negar = True
+        return self
+
+    def eq(self, coluna, valor):
+        return self._filtro(lambda linha: linha.get(coluna) == valor)
+
+    def in_(self, coluna, valores):
+        valores = list(valores)
+        return self._filtro(lambda linha: linha.get(coluna) in valores)
+
+    def is_(self, coluna, valor):
+        esperado = None if valor == 'null' else valor
+        return self._filtro(lambda linha: linha.get(coluna) is esperado)
+
+    def gt(self, coluna, valor):
+        return self._filtro(lambda linha: linha.get(coluna) is not None and linha.get(coluna) > valor)
+
+    def order(self, coluna, desc=False):
+        self.ordem = (coluna, desc)
+        return self
+
+    def limit(self, quantidade):
+        self.limite = quantidade
+        return self
+
+    def _selecionadas(self):
+        return [linha for linha in self.linhas if all(f(linha) for f in self.filtros)]
+
+    def execute(self):
+        self.banco.consultas.append((self.tabela, self.operacao))
+        if self.operacao == 'insert':
+            novas = self.valores if isinstance(self.valores, list) else [self.valores]
+            self.linhas.extend(dict(v) for v in novas)
+            return Resposta([dict(v) for v in novas])
+        if self.operacao == 'upsert':
+            novas = self.valores if isinstance(self.valores, list) else [self.valores]
+            for valor in novas:
+                chave = tuple(valor.get(c) for c in self.on_conflict)
+                existente = next((l for l in self.linhas if tuple(l.get(c) for c in self.on_conflict) == chave), None)
+                if existente is None:
+                    self.linhas.append(dict(valor))
+                elif not self.ignorar_duplicados:
+                    existente.update(valor)
+            return Resposta([dict(v) for v in novas])
+        selecionadas = self._selecionadas()
+        if self.operacao == 'update':
+            for linha in selecionadas:
+                linha.update(self.valores)
+            return Resposta([dict(l) for l in selecionadas])
+        if self.operacao == 'delete':
+            self.banco.tabelas[self.tabela] = [l for l in self.linhas if l not in selecionadas]
+            return Resposta([dict(l) for l in selecionadas])
+        total = len(selecionadas) if self.contar else None
+        if self.ordem:
+            coluna, desc = self.ordem
+            selecionadas = sorted(selecionadas, key=lambda l: l.get(coluna), reverse=desc)
+        if self.limite is not None:
+            selecionadas = selecionadas[:self.limite]
+        if self.colunas:
+            selecionadas = [{c: l.get(c) for c in self.colunas} for l in selecionadas]
+        return Resposta([dict(l) for l in selecionadas], count=total)
+
+
+class ChamadaRpcFalsa:
+    def __init__(self, banco, nome, parametros):
+        self.banco, self.nome, self.parametros = banco, nome, parametros
+
+    def execute(self):
+        self.banco.consultas.append((self.nome, 'rpc'))
+        if self.nome not in self.banco.funcoes:
+            raise Exception(f"Could not find the function public.{self.nome}")
+        return Resposta(self.banco.funcoes[self.nome](self.banco, **self.parametros))
+
+
+class SupabaseFalso:
+    """
+    Cliente Supabase em memória para os testes: tabelas são listas de dicts e
+    funções RPC são callables registradas em `funcoes` (banco, **parametros)
+    """
+
+    def __init__(self, tabelas=None):
+        self.tabelas = {nome: [dict(l) for l in linhas] for nome, linhas in (tabelas or {}).items()}
+        self.funcoes = {}
+        self.consultas = []
+
+    def table(self, nome):
+        return ConsultaFalsa(self, nome)
+
+    def rpc(self, nome, parametros=None):
+        return ChamadaRpcFalsa(self, nome, parametros or {})
+
+
+@pytest.fixture
+def supabase_falso():
+    return SupabaseFalso
+
+
+@pytest.fixture
+def modelo_stub(monkeypatch):
+    """
+    Fábrica que troca o backend de geração pelo modelo local: modelo_stub(**parametros
+    do BackendStub) ou modelo_stub(backend=...). Disjuntor novo e sem cache de respostas.
+    """
+    from api.utils import gemini
+    from api.utils.llm import BackendStub
+    from api.utils.resiliencia import Disjuntor
+
+    def criar(backend=None, **parametros):
+        stub = backend or BackendStub(**parametros)
+        monkeypatch.setattr(gemini, 'obter_backend', lambda: stub)
+        return stub
+
+    monkeypatch.setattr(gemini, 'disjuntor', Disjuntor())
+    monkeypatch.setenv('CACHE_IA_BACKEND', 'desativado')
+    gemini.cache_memoria.limpar()
+    yield criar
+    gemini.cache_memoria.limpar()
+
+
+@pytest.fixture
+def pool_stub():
+    """Fábrica de PoolChaves com n chaves locais e a cota (rpm, rajada) de cada uma"""
+    from api.utils.chaves_gemini import PoolChaves
+    from api.utils.resiliencia import BaldeTokens
+
+    def criar(n=1, rpm=60_000, rajada=1000):
+        pool = PoolChaves([f'stub-{i:04d}' for i in range(n)])
+        for chave in pool._chaves.values():
+            chave.balde = BaldeTokens(taxa=rpm / 60, capacidade=rajada)
+        return pool
+
+    return criar
@@ -0,0 +1,73 @@
+import pytest
+
+from api.utils import analise_lote
+from api.utils.analise_lote import (
+    STATUS_LOTE_CONCLUIDO, criar_lote, gravar_resultados, processar_lote
+)
+
+
+def gravar_retornos_ia(banco, resultados):
+    """Equivalente em memória da função SQL gravar_retornos_ia"""
+    por_id = {r['id']: r['retorno_ia'] for r in resultados}
+    for linha in banco.tabelas['base_dados_conteudo']:
+        if linha['id'] in por_id:
+            linha['retorno_ia'] = por_id[linha['id']]
+    return None
+
+
+@pytest.fixture
+def banco(supabase_falso, monkeypatch):
+    documentos = [{'id': i, 'conteudo': f'texto {i}', 'retorno_ia': None} for i in range(1, 31)]
+    documentos[4]['conteudo'] = '   '  # id 5 sem texto extraído
+    banco = supabase_falso({'base_dados_conteudo': documentos})
+    banco.funcoes['gravar_retornos_ia'] = gravar_retornos_ia
+
+    def gerar_resposta(chaves, prompt, endpoint, service_supabase, ignorar_cache=False):
+        return f"análise de {prompt.split()[-1]}", False
+    monkeypatch.setattr(analise_lote, 'gerar_resposta', gerar_resposta)
+    return banco
+
+
+def test_documento_apagado_ou_vazio_vira_falha_permanente(banco):
+    ids = list(range(1, 31)) + [999]  # 999 não existe
+    lote = criar_lote(banco, 'p1', ids)
+
+    resumo = processar_lote(banco, lote, None, 'Resuma', concorrencia=4)
+
+    assert resumo['status'] == STATUS_LOTE_CONCLUIDO
+    assert resumo['pendentes'] == 0
+    assert resumo['concluidos'] == 29
+    assert set(resumo['falhas']) == {'5', '999'}
+    assert banco.tabelas['analises_lote'][0]['pendentes'] == []
+
+    # Retomar não tenta os documentos inválidos de novo
+    assert processar_lote(banco, lote, None, 'Resuma')['concluidos'] == 29
+
+
+def test_progresso_que_falha_nao_interrompe_o_lote(banco):
+    lote = criar_lote(banco, 'p1', list(range(1, 31)))
+    avisos = []
+
+    def ao_progredir(progresso):
+        avisos.append(progresso['concluidos'])
+        raise BrokenPipeError(32, 'Broken pipe')
+
+    resumo = processar_lote(banco, lote, None, 'Resuma', concorrencia=2, ao_progredir=ao_progredir)
+
+    assert resumo['concluidos'] == 29
+    assert avisos == [20, 29]
+    gravados = [l for l in banco.tabelas['base_dados_conteudo'] if l['retorno_ia']]
+    assert len(gravados) == 29
+
+
+def test_resultados_gravados_em_uma_chamada(banco):
+    gravar_resultados(banco, [(1, 'a'), (2, 'b'), (3, 'c')])
+    assert banco.consultas == [('gravar_retornos_ia', 'rpc')]
+    assert [l['retorno_ia'] for l in banco.tabelas['base_dados_conteudo'][:3]] == ['a', 'b', 'c']
+
+
+def test_sem_a_funcao_grava_um_a_um(banco):
+    del banco.funcoes['gravar_retornos_ia']
+    gravar_resultados(banco, [(1, 'a'), (2, 'b')])
+    assert banco.consultas[1:] == [('base_dados_conteudo', 'update')] * 2
+    assert [l['retorno_ia'] for l in banco.tabelas['base_dados_conteudo'][:2]] == ['a', 'b']
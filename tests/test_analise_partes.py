@@ -0,0 +1,163 @@
+import random
+import re
+import threading
+import time
+
+import pytest
+
+from api.utils import analise_partes, gemini
+from api.utils.analise_partes import (
+    INSTRUCAO_PARTE, INSTRUCAO_REDUCAO, analisar_em_partes, dividir_em_partes
+)
+from api.utils.tokens import CARACTERES_POR_TOKEN
+
+
+class ModeloFalso:
+    """
+    Substitui gerar_resposta: responde "[resumo de <marcadores>]" com os
+    marcadores §n encontrados no prompt, e registra as chamadas de parte e de redução
+    """
+
+    def __init__(self):
+        self.partes = []
+        self.reducoes = []
+        self._lock = threading.Lock()
+
+    def __call__(self, chaves, prompt, endpoint, service_supabase=None, ignorar_cache=False):
+        marcadores = re.findall(r'§\d+', prompt)
+        with self._lock:
+            (self.reducoes if INSTRUCAO_REDUCAO in prompt else self.partes).append(prompt)
+        return f"[resumo de {' '.join(marcadores)}]", False
+
+
+@pytest.fixture
+def modelo(monkeypatch):
+    falso = ModeloFalso()
+    monkeypatch.setattr(analise_partes, 'gerar_resposta', falso)
+    return falso
+
+
+@pytest.fixture
+def parciais_gravadas(monkeypatch):
+    """Tabela analise_partes_documento em memória: (documento, prompt) -> {hash_parte: resultado}"""
+    tabela = {}
+    monkeypatch.setattr(analise_partes, 'carregar_parciais',
+                        lambda supabase, doc, prompt: dict(tabela.get((doc, prompt), {})))
+    monkeypatch.setattr(analise_partes, 'salvar_parciais',
+                        lambda supabase, doc, prompt, partes: tabela.__setitem__((doc, prompt), dict(partes)))
+    return tabela
+
+
+def partes_de(monkeypatch, max_tokens):
+    """Partes menores que o padrão, para exercitar a divisão com documentos pequenos"""
+    monkeypatch.setattr(analise_partes, 'dividir_em_partes',
+                        lambda texto: dividir_em_partes(texto, max_tokens=max_tokens))
+
+
+def documento(paragrafos, palavras=40, semente=0):
+    rng = random.Random(semente)
+    return "\n\n".join(
+        f"§{i} " + " ".join(rng.choice(('dados', 'meta', 'indicador', 'valor')) for _ in range(palavras))
+        for i in range(paragrafos)
+    )
+
+
+@pytest.mark.parametrize('max_tokens', [20, 60, 200, 5000])
+def test_divisao_preserva_o_texto_e_respeita_o_limite(max_tokens):
+    texto = documento(30, palavras=25) + "\n\nlinha longa " + "x" * 900
+    partes = dividir_em_partes(texto, max_tokens=max_tokens)
+
+    assert all(len(parte) <= max_tokens * CARACTERES_POR_TOKEN for parte in partes)
+    # Só espaços e quebras nos pontos de corte podem mudar
+    assert "".join("".join(partes).split()) == "".join(texto.split())
+
+
+def test_paragrafos_nao_sao_cortados_quando_cabem():
+    texto = documento(12, palavras=10)
+    partes = dividir_em_partes(texto, max_tokens=60)
+    assert len(partes) > 1
+    for parte in partes:
+        for paragrafo in parte.split('\n\n'):
+            assert paragrafo in texto.split('\n\n')
+
+
+def test_cada_parte_vai_ao_modelo_uma_vez_e_a_reducao_recebe_todas_em_ordem(modelo, monkeypatch):
+    partes_de(monkeypatch, 100)
+    texto = documento(20)
+    esperadas = dividir_em_partes(texto, max_tokens=100)
+
+    info = analisar_em_partes(None, 'Resuma.', texto, 'teste', None)
+
+    assert info["partes"] == len(esperadas) > 1
+    assert info["partes_recalculadas"] == len(esperadas)
+    assert sorted(modelo.partes) == sorted(f"Resuma.\n\n{INSTRUCAO_PARTE}\n\n{p}" for p in esperadas)
+    assert len(modelo.reducoes) == 1
+    # A redução cita cada parcial na ordem do documento
+    assert re.findall(r'§\d+', modelo.reducoes[0]) == [f'§{i}' for i in range(20)]
+    assert info["resultado"] == "[resumo de " + " ".join(f'§{i}' for i in range(20)) + "]"
+
+
+def test_documento_curto_usa_uma_chamada_sem_reducao(modelo):
+    info = analisar_em_partes(None, 'Resuma.', documento(2), 'teste', None)
+    assert info["partes"] == 1 and not modelo.reducoes
+    assert modelo.partes == [f"Resuma.\n\n{documento(2)}"]
+
+
+def test_reducao_em_niveis_quando_as_parciais_nao_cabem_juntas(modelo, monkeypatch):
+    partes_de(monkeypatch, 60)
+    monkeypatch.setattr(analise_partes, 'TOKENS_REDUCAO', 40)
+    info = analisar_em_partes(None, 'Resuma.', documento(24), 'teste', None)
+
+    assert len(modelo.reducoes) > 1
+    assert info["resultado"] == "[resumo de " + " ".join(f'§{i}' for i in range(24)) + "]"
+
+
+def test_nova_analise_recalcula_so_as_partes_alteradas(modelo, parciais_gravadas, monkeypatch):
+    partes_de(monkeypatch, 100)
+    texto = documento(20)
+    primeira = analisar_em_partes(None, 'Resuma.', texto, 'teste', None, document_id=1, prompt_id=2)
+    chamadas = len(modelo.partes)
+    assert primeira["partes_recalculadas"] == chamadas
+
+    paragrafos = texto.split('\n\n')
+    paragrafos[-1] = "§19 texto revisado"
+    segunda = analisar_em_partes(None, 'Resuma.', "\n\n".join(paragrafos), 'teste', None,
+                                 document_id=1, prompt_id=2)
+
+    assert segunda["partes_recalculadas"] == 1
+    assert len(modelo.partes) == chamadas + 1
+    assert segunda["resultado"] == primeira["resultado"]
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('paragrafos', [40, 160])
+def test_benchmark_partes_vs_chamada_unica(modelo_stub, pool_stub, paragrafos):
+    """
+    Documento longo em uma chamada vs. map-reduce (partes em paralelo + redução), com
+    o modelo local lendo a entrada a 20 mil tokens/s além de 300 ms até o primeiro token
+    """
+    from api.utils.llm import BackendStub
+    from api.utils.tokens import estimar_tokens
+
+    class StubComLeitura(BackendStub):
+        def _preparar(self, prompt, timeout):
+            time.sleep(estimar_tokens(prompt) / 20_000)
+            return super()._preparar(prompt, timeout)
+
+    modelo_stub(backend=StubComLeitura(latencia_ms=300, desvio_latencia_ms=0,
+                                       tokens_por_segundo=400, tokens_saida=200))
+    texto = documento(paragrafos, palavras=400)
+    chaves = pool_stub()
+
+    inicio = time.perf_counter()
+    gemini.gerar_resposta(chaves, f"Resuma.\n\n{texto}", 'bench', ignorar_cache=True)
+    unica = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    info = analisar_em_partes(chaves, 'Resuma.', texto, 'bench', None, ignorar_cache=True)
+    partes = time.perf_counter() - inicio
+
+    print(f"\n{estimar_tokens(texto)} tokens: chamada única {unica:.2f}s, "
+          f"{info['partes']} partes + redução {partes:.2f}s")
+    # As partes rodam em paralelo: o custo é de poucas chamadas em sequência, não de uma por parte
+    assert partes < info['partes'] * 0.8
@@ -0,0 +1,55 @@
+import time
+
+import pytest
+
+jwt = pytest.importorskip('jwt')
+pytest.importorskip('postgrest')
+
+from api.utils import autenticacao  # noqa: E402
+
+
+class UsuarioGoTrue:
+    id = 'usuario-1'
+
+
+@pytest.fixture
+def gotrue(monkeypatch):
+    """Sem SUPABASE_JWT_SECRET: tokens HS256 vão ao GoTrue, que aqui só conta as chamadas"""
+    chamadas = []
+
+    def verificar_remoto(token):
+        chamadas.append(token)
+        return UsuarioGoTrue()
+
+    monkeypatch.setattr(autenticacao, 'SUPABASE_JWT_SECRET', None)
+    monkeypatch.setattr(autenticacao, 'AUTH_MODO_ESTRITO', False)
+    monkeypatch.setattr(autenticacao, '_verificar_token_remoto', verificar_remoto)
+    autenticacao.tokens_validados.limpar()
+    yield chamadas
+    autenticacao.tokens_validados.limpar()
+
+
+def token(expira_em):
+    claims = {'sub': 'usuario-1', 'aud': 'authenticated', 'exp': int(time.time() + expira_em)}
+    return jwt.encode(claims, 'segredo-do-projeto-com-pelo-menos-32-bytes', algorithm='HS256')
+
+
+def test_token_validado_no_gotrue_fica_em_cache(gotrue):
+    valido = token(3600)
+    assert autenticacao.verificar_token(valido).id == 'usuario-1'
+    assert autenticacao.verificar_token(valido).id == 'usuario-1'
+    assert gotrue == [valido]
+
+
+def test_token_perto_de_expirar_nao_fica_em_cache(gotrue):
+    quase_vencido = token(autenticacao.MARGEM_EXPIRACAO - 1)
+    autenticacao.verificar_token(quase_vencido)
+    autenticacao.verificar_token(quase_vencido)
+    assert len(gotrue) == 2
+
+
+def test_modo_estrito_sempre_consulta_o_gotrue(gotrue):
+    valido = token(3600)
+    autenticacao.verificar_token(valido)
+    autenticacao.verificar_token(valido, estrito=True)
+    assert len(gotrue) == 2
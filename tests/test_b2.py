@@ -0,0 +1,228 @@
+import io
+import os
+import time
+
+import pytest
+
+pytest.importorskip('b2sdk')
+
+from b2sdk.v2 import B2Api, B2HttpApiConfig, InMemoryAccountInfo, RawSimulator  # noqa: E402
+from b2sdk.v2.exception import InvalidAuthToken, ServiceError  # noqa: E402
+
+from api.utils import b2  # noqa: E402
+from api.utils.multipart import ArquivoRecebido  # noqa: E402
+
+NOME_BUCKET = 'bucket-teste'
+
+
+class B2Simulado:
+    """B2Api do b2sdk sobre o RawSimulator (servidor B2 em memória), com contagem de chamadas"""
+
+    def __init__(self):
+        self.chamadas = {'authorize_account': 0, 'upload_file': 0, 'upload_part': 0}
+        self.falhas_parte = 0
+        self.apis = []
+        api = self.nova_api()
+        self.raw = api.session.raw_api
+        self.key_id, self.key = self.raw.create_account()
+        api.authorize_account('production', self.key_id, self.key)
+        api.create_bucket(NOME_BUCKET, 'allPrivate')
+
+        raw = self.raw
+        upload_file_original = raw.upload_file
+        upload_part_original = raw.upload_part
+
+        def upload_file(*args, **kwargs):
+            self.chamadas['upload_file'] += 1
+            return upload_file_original(*args, **kwargs)
+
+        def upload_part(*args, **kwargs):
+            self.chamadas['upload_part'] += 1
+            if self.falhas_parte:
+                self.falhas_parte -= 1
+                raise ServiceError('503 falha simulada na parte')
+            return upload_part_original(*args, **kwargs)
+
+        raw.upload_file = upload_file
+        raw.upload_part = upload_part
+
+    def nova_api(self):
+        """B2Api novo (como criar_b2_api) que compartilha o mesmo servidor simulado"""
+        info = InMemoryAccountInfo()
+        api = B2Api(info, api_config=B2HttpApiConfig(_raw_api_class=RawSimulator),
+                    max_upload_workers=b2.PARTES_CONCORRENTES)
+        if self.apis:
+            api.session.raw_api = self.raw
+        authorize_original = api.authorize_account
+
+        def authorize_account(*args, **kwargs):
+            self.chamadas['authorize_account'] += 1
+            return authorize_original(*args, **kwargs)
+
+        api.authorize_account = authorize_account
+        self.apis.append(api)
+        return api
+
+    def ler(self, nome):
+        api = self.apis[0]
+        destino = api.get_bucket_by_name(NOME_BUCKET).download_file_by_name(nome)
+        saida = io.BytesIO()
+        destino.save(saida)
+        return saida.getvalue()
+
+
+@pytest.fixture
+def simulado(monkeypatch):
+    sim = B2Simulado()
+    sim.chamadas['authorize_account'] = 0
+    monkeypatch.setattr(b2, 'criar_b2_api', sim.nova_api)
+    monkeypatch.setattr(b2, 'b2_application_key_id', sim.key_id)
+    monkeypatch.setattr(b2, 'b2_application_key', sim.key)
+    monkeypatch.setattr(b2, 'b2_bucket_name', NOME_BUCKET)
+    monkeypatch.setattr(b2, '_sessao', {"b2_api": None, "bucket": None})
+    # Partes pequenas para exercitar o upload em partes sem arquivos de dezenas de MB
+    monkeypatch.setattr(b2, 'TAMANHO_PARTE', 1000)
+    return sim
+
+
+def arquivo_recebido(dados, limite_memoria):
+    arquivo = ArquivoRecebido('doc.pdf', 'application/pdf', None, limite_memoria=limite_memoria)
+    arquivo.write(dados)
+    arquivo.finalizar()
+    return arquivo
+
+
+def enviar(sim, dados, limite_memoria, nome):
+    arquivo = arquivo_recebido(dados, limite_memoria)
+    try:
+        enviado = b2.executar_com_bucket(
+            lambda bucket: b2.enviar_arquivo_b2(bucket, arquivo, nome, 'application/pdf', {'projeto_id': '1'})
+        )
+    finally:
+        arquivo.close()
+    return enviado
+
+
+def test_arquivo_pequeno_vai_em_uma_requisicao(simulado):
+    dados = os.urandom(1500)
+    enviar(simulado, dados, limite_memoria=10_000, nome='pequeno.pdf')
+    assert simulado.chamadas['upload_file'] == 1
+    assert simulado.chamadas['upload_part'] == 0
+    assert simulado.ler('pequeno.pdf') == dados
+
+
+def test_arquivo_grande_em_disco_vai_em_partes(simulado):
+    dados = os.urandom(5500)
+    enviar(simulado, dados, limite_memoria=1024, nome='grande.pdf')
+    assert simulado.chamadas['upload_file'] == 0
+    assert simulado.chamadas['upload_part'] == 5  # 1000 + 1000 + 1000 + 1000 + 1500
+    assert simulado.ler('grande.pdf') == dados
+
+
+def test_upload_redundante_e_removido(simulado):
+    enviar(simulado, b'original', limite_memoria=10_000, nome='original.pdf')
+    redundante = enviar(simulado, b'original', limite_memoria=10_000, nome='redundante.pdf')
+
+    b2.executar_com_bucket(lambda bucket: b2.excluir_arquivo_b2(bucket, 'redundante.pdf', redundante.id_))
+
+    nomes = [info.file_name for info, _ in simulado.apis[0].get_bucket_by_name(NOME_BUCKET).ls()]
+    assert nomes == ['original.pdf']
+
+
+def test_parte_que_falha_e_reenviada_sozinha(simulado, monkeypatch):
+    monkeypatch.setattr(time, 'sleep', lambda segundos: None)  # sem espera no backoff do b2sdk
+    simulado.falhas_parte = 1
+    dados = os.urandom(4000)
+    enviar(simulado, dados, limite_memoria=1024, nome='retentativa.pdf')
+    # 4 partes + 1 reenvio da parte que falhou
+    assert simulado.chamadas['upload_part'] == 5
+    assert simulado.ler('retentativa.pdf') == dados
+
+
+def test_sessao_autorizada_uma_vez_por_processo(simulado):
+    primeiro = b2.obter_bucket()
+    assert b2.obter_bucket() is primeiro
+    b2.executar_com_bucket(lambda bucket: bucket.name)
+    assert simulado.chamadas['authorize_account'] == 1
+
+
+class BucketExpirado:
+    """Bucket cuja autorização da conta foi revogada (B2 responde 401)"""
+    name = NOME_BUCKET
+
+    def __getattr__(self, nome):
+        def recusar(*args, **kwargs):
+            raise InvalidAuthToken('token expirado', 'expired_auth_token')
+        return recusar
+
+
+def test_401_renova_a_sessao_e_repete_a_operacao(simulado):
+    b2._sessao.update(b2_api=simulado.nova_api(), bucket=BucketExpirado())
+    buckets = []
+
+    def operacao(bucket):
+        buckets.append(bucket)
+        return bucket.get_download_authorization('doc.pdf', 600)
+
+    assert b2.executar_com_bucket(operacao)
+    assert isinstance(buckets[0], BucketExpirado)
+    assert not isinstance(buckets[1], BucketExpirado)
+    assert simulado.chamadas['authorize_account'] == 1
+    assert b2.obter_bucket() is buckets[1]
+
+
+def test_url_do_upload_e_gerada_com_o_bucket_renovado(simulado):
+    pytest.importorskip('supabase')
+    pytest.importorskip('PyPDF2')
+    from api import upload
+
+    b2._sessao.update(b2_api=simulado.nova_api(), bucket=BucketExpirado())
+    url = b2.executar_com_bucket(lambda bucket: upload.get_download_url(bucket, 'doc.pdf'))
+    assert 'Authorization=' in url
+    assert simulado.chamadas['authorize_account'] == 1
+
+
+@pytest.mark.benchmark
+def test_benchmark_latencia_sessao_compartilhada(simulado, monkeypatch):
+    """URL assinada por requisição: conta autorizada a cada vez vs. sessão do processo (50 ms por chamada ao B2)"""
+    raw = simulado.raw
+    for metodo in ('authorize_account', 'list_buckets', 'get_download_authorization'):
+        original = getattr(raw, metodo)
+
+        def com_latencia(*args, _original=original, **kwargs):
+            time.sleep(0.05)
+            return _original(*args, **kwargs)
+        monkeypatch.setattr(raw, metodo, com_latencia)
+
+    def por_requisicao():
+        api = simulado.nova_api()
+        api.authorize_account('production', simulado.key_id, simulado.key)
+        api.get_bucket_by_name(NOME_BUCKET).get_download_authorization('doc.pdf', 600)
+
+    def sessao_compartilhada():
+        b2.executar_com_bucket(lambda bucket: bucket.get_download_authorization('doc.pdf', 600))
+
+    sessao_compartilhada()  # primeira chamada do processo autoriza a conta
+    for nome, funcao in (('por requisição', por_requisicao), ('sessão compartilhada', sessao_compartilhada)):
+        inicio = time.perf_counter()
+        for _ in range(10):
+            funcao()
+        print(f"\n{nome}: {(time.perf_counter() - inicio) / 10 * 1000:.0f} ms por URL")
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('tamanho_mb', [5, 50, 200])
+def test_benchmark_vazao_upload(simulado, monkeypatch, tamanho_mb):
+    monkeypatch.setattr(b2, 'TAMANHO_PARTE', 5 * b2.MB)
+    dados = os.urandom(tamanho_mb * b2.MB)
+    arquivo = arquivo_recebido(dados, limite_memoria=b2.MB)
+
+    inicio = time.perf_counter()
+    b2.executar_com_bucket(
+        lambda bucket: b2.enviar_arquivo_b2(bucket, arquivo, 'bench.pdf', 'application/pdf', {})
+    )
+    duracao = time.perf_counter() - inicio
+    arquivo.close()
+
+    print(f"\n{tamanho_mb} MB: {duracao:.2f}s ({tamanho_mb / duracao:.0f} MB/s), "
+          f"{simulado.chamadas['upload_part']} partes, {simulado.chamadas['upload_file']} requisições únicas")
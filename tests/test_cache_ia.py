@@ -0,0 +1,43 @@
+import pytest
+
+from api.utils import gemini
+from api.utils.chaves_gemini import PoolChaves
+from api.utils.llm import BackendStub
+
+
+@pytest.fixture
+def modelo(monkeypatch, tmp_path):
+    stub = BackendStub(latencia_ms=0, desvio_latencia_ms=0, tokens_por_segundo=1e9, tokens_saida=30)
+    monkeypatch.setattr(gemini, 'obter_backend', lambda: stub)
+    monkeypatch.setenv('CACHE_IA_BACKEND', 'sqlite')
+    monkeypatch.setenv('CACHE_IA_SQLITE_PATH', str(tmp_path / 'cache.db'))
+    monkeypatch.setattr(gemini, '_estatisticas', {})
+    gemini.cache_memoria.limpar()
+    yield stub
+    gemini.cache_memoria.limpar()
+
+
+def test_acertos_por_camada_e_por_endpoint(modelo):
+    chaves = PoolChaves(['chave-teste'])
+    resposta, do_cache = gemini.gerar_resposta(chaves, 'prompt A', 'analyze_with_gemini')
+    assert not do_cache
+
+    assert gemini.gerar_resposta(chaves, 'prompt A', 'analyze_with_gemini') == (resposta, True)
+    gemini.cache_memoria.limpar()  # outra instância: só o cache persistente tem a resposta
+    assert gemini.gerar_resposta(chaves, 'prompt A', 'analyze_multiple') == (resposta, True)
+
+    estatisticas = gemini.estatisticas_cache()
+    assert estatisticas['analyze_with_gemini'] == {
+        "hits_memoria": 1, "hits_persistente": 0, "chamadas_gemini": 1,
+        "chamadas_evitadas": 1, "hit_rate": 0.5
+    }
+    assert estatisticas['analyze_multiple']['hits_persistente'] == 1
+    assert estatisticas['analyze_multiple']['hit_rate'] == 1.0
+
+
+def test_stream_grava_a_resposta_completa_no_cache(modelo):
+    chaves = PoolChaves(['chave-teste'])
+    trechos, do_cache = gemini.gerar_resposta_stream(chaves, 'prompt B', 'analyze_indicators')
+    texto = "".join(trechos)
+    assert not do_cache and len(texto.split()) == 30
+    assert gemini.gerar_resposta(chaves, 'prompt B', 'analyze_indicators') == (texto, True)
@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+from api.utils.chaves_gemini import PoolChaves
+from api.utils.llm import ErroStub
+
+
+def test_chave_com_cota_esgotada_sai_da_rotacao():
+    pool = PoolChaves(['chave-aaaa', 'chave-bbbb'])
+    primeira = pool.adquirir()
+    assert pool.pausar(primeira, ErroStub(429))
+
+    outra = pool.adquirir()
+    assert outra is not primeira
+    assert pool.chave_ativa() is outra
+
+
+def test_ultima_chave_ativa_nao_e_pausada_por_cota():
+    pool = PoolChaves(['chave-aaaa'])
+    chave = pool.adquirir()
+    assert not pool.pausar(chave, ErroStub(429))
+    assert pool.chave_ativa() is chave
+
+
+def test_estatisticas_mostram_so_o_final_da_chave():
+    pool = PoolChaves(['segredo-aaaa', 'segredo-bbbb'])
+    chave = pool.adquirir()
+    pool.pausar(chave, ErroStub(403))
+
+    estatisticas = {e['chave']: e for e in pool.estatisticas()}
+    assert set(estatisticas) == {'...aaaa', '...bbbb'}
+    assert estatisticas[chave.sufixo]['chamadas'] == 1
+    assert estatisticas[chave.sufixo]['cotas_esgotadas'] == 1
+    assert estatisticas[chave.sufixo]['ativa'] is False
+    assert 'segredo' not in repr(estatisticas)
+
+
+def test_estatisticas_do_processo_incluem_o_pool(monkeypatch):
+    pytest.importorskip('jwt')
+    from api.utils import estatisticas
+
+    pool = PoolChaves(['segredo-cccc'])
+    monkeypatch.setattr(estatisticas, 'pool_chaves', pool)
+    pool.adquirir()
+    assert estatisticas.estatisticas_processo()['chaves_gemini'][0]['chave'] == '...cccc'
+
+
+@pytest.mark.benchmark
+def test_benchmark_vazao_cresce_com_as_chaves(modelo_stub, pool_stub):
+    """Chamadas concluídas por segundo com 1, 2 e 4 chaves de 10 req/s cada (modelo local, 50 ms)"""
+    from api.utils import gemini
+
+    modelo_stub(latencia_ms=50, desvio_latencia_ms=0, tokens_por_segundo=1e9, tokens_saida=20)
+    duracao = 3.0
+    vazoes = {}
+    for n in (1, 2, 4):
+        chaves = pool_stub(n, rpm=600, rajada=1)
+        concluidas = []
+        fim = time.perf_counter() + duracao
+
+        def cliente(i):
+            j = 0
+            while time.perf_counter() < fim:
+                gemini.gerar_resposta(chaves, f'prompt {i}-{j}', 'bench', ignorar_cache=True)
+                concluidas.append(time.perf_counter())
+                j += 1
+
+        inicio = time.perf_counter()
+        threads = [threading.Thread(target=cliente, args=(i,)) for i in range(32)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        vazoes[n] = len(concluidas) / (time.perf_counter() - inicio)
+        print(f"\n{n} chave(s): {vazoes[n]:.1f} chamadas/s")
+
+    assert 1.6 < vazoes[2] / vazoes[1] < 2.4
+    assert 3.2 < vazoes[4] / vazoes[1] < 4.8
@@ -0,0 +1,91 @@
+import pytest
+
+from api.utils import configuracao
+from api.utils.configuracao import (
+    buscar_prompt, buscar_prompt_id_categoria, estatisticas_config, obter_config
+)
+
+
+@pytest.fixture
+def banco(supabase_falso, monkeypatch):
+    monkeypatch.setattr(configuracao, '_versao', None)
+    monkeypatch.setattr(configuracao, '_versao_verificada_em', 0)
+    monkeypatch.setattr(configuracao, '_consultas', {"config": 0, "versao": 0})
+    monkeypatch.setattr(configuracao, 'CONFIG_VERSAO_INTERVALO', 0)
+    configuracao.cache_config.limpar()
+    yield supabase_falso({
+        'prompts': [{'id': 7, 'texto_prompt': 'Resuma.'}],
+        'categorias': [{'id': 'c1', 'prompt_id': 7}],
+        'configuracao_versao': [{'id': 1, 'versao': 10}],
+    })
+    configuracao.cache_config.limpar()
+
+
+def consultas_a(banco, tabela):
+    return sum(1 for nome, operacao in banco.consultas if nome == tabela)
+
+
+def test_prompt_consultado_uma_vez(banco):
+    for _ in range(5):
+        assert buscar_prompt(banco, 'prompts', 7)['texto_prompt'] == 'Resuma.'
+    assert consultas_a(banco, 'prompts') == 1
+
+
+def test_ausencia_tambem_fica_em_cache(banco):
+    assert buscar_prompt(banco, 'prompts', 8) is None
+    assert buscar_prompt(banco, 'prompts', 8) is None
+    assert consultas_a(banco, 'prompts') == 1
+
+
+def test_mudanca_de_versao_descarta_o_cache(banco):
+    assert buscar_prompt_id_categoria(banco, 'c1') == 7
+    banco.tabelas['categorias'][0]['prompt_id'] = 9
+    assert buscar_prompt_id_categoria(banco, 'c1') == 7  # mesma versão: valor em cache
+
+    banco.tabelas['configuracao_versao'][0]['versao'] = 11  # trigger da alteração
+    assert buscar_prompt_id_categoria(banco, 'c1') == 9
+    assert estatisticas_config()['versao'] == 11
+
+
+def test_versao_conferida_no_maximo_a_cada_intervalo(banco, monkeypatch):
+    monkeypatch.setattr(configuracao, 'CONFIG_VERSAO_INTERVALO', 3600)
+    for _ in range(5):
+        buscar_prompt(banco, 'prompts', 7)
+    assert consultas_a(banco, 'configuracao_versao') == 1
+
+
+def test_sem_tabela_de_versao_o_cache_segue_pelo_ttl(banco, monkeypatch):
+    consultar = banco.table
+
+    def table(nome):
+        if nome == 'configuracao_versao':
+            raise Exception('relation "configuracao_versao" does not exist')
+        return consultar(nome)
+
+    monkeypatch.setattr(banco, 'table', table)
+    assert buscar_prompt(banco, 'prompts', 7)['texto_prompt'] == 'Resuma.'
+    assert buscar_prompt(banco, 'prompts', 7)['texto_prompt'] == 'Resuma.'
+    assert consultas_a(banco, 'prompts') == 1
+
+
+def test_erro_ao_carregar_nao_fica_em_cache(banco):
+    tentativas = []
+
+    def carregar():
+        tentativas.append(1)
+        if len(tentativas) == 1:
+            raise Exception('timeout')
+        return 'valor'
+
+    with pytest.raises(Exception):
+        obter_config(banco, 'chave', carregar)
+    assert obter_config(banco, 'chave', carregar) == 'valor'
+
+
+def test_estatisticas(banco):
+    buscar_prompt(banco, 'prompts', 7)
+    buscar_prompt(banco, 'prompts', 7)
+    estatisticas = estatisticas_config()
+    assert estatisticas['consultas_config'] == 1
+    assert estatisticas['consultas_versao'] == 2
+    assert estatisticas['versao'] == 10
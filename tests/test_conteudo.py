@@ -0,0 +1,44 @@
+import pytest
+
+pytest.importorskip('postgrest')
+
+from api import conteudo  # noqa: E402
+
+
+def parametros():
+    return conteudo.parametros_listagem({})
+
+
+def test_etag_da_pagina_muda_com_updated_at(supabase_falso):
+    banco = supabase_falso({'base_dados_conteudo': [
+        {'id': 1, 'updated_at': '2026-10-18T10:00:00+00:00'},
+        {'id': 2, 'updated_at': '2026-10-18T10:00:00+00:00'},
+    ]})
+    antes = conteudo.etag_pagina(banco, parametros())
+    banco.tabelas['base_dados_conteudo'][1]['updated_at'] = '2026-10-18T11:00:00+00:00'
+
+    assert antes and conteudo.etag_pagina(banco, parametros()) != antes
+
+
+def test_sem_updated_at_a_pagina_nao_tem_etag(supabase_falso):
+    banco = supabase_falso({'base_dados_conteudo': [
+        {'id': 1, 'updated_at': '2026-10-18T10:00:00+00:00'},
+        {'id': 2},
+    ]})
+    assert conteudo.etag_pagina(banco, parametros()) is None
+
+
+def test_coluna_inexistente_a_pagina_nao_tem_etag(supabase_falso, monkeypatch):
+    banco = supabase_falso({'base_dados_conteudo': [{'id': 1}]})
+
+    def sem_coluna(*args):
+        raise Exception('column base_dados_conteudo.updated_at does not exist')
+
+    monkeypatch.setattr(conteudo, 'consultar_pagina', sem_coluna)
+    assert conteudo.etag_pagina(banco, parametros()) is None
+
+
+def test_etag_do_conteudo():
+    assert conteudo.etag_conteudo({'id': 1, 'updated_at': '2026-10-18T10:00:00+00:00'})
+    assert conteudo.etag_conteudo({'id': 1, 'updated_at': None}) is None
+    assert conteudo.etag_conteudo({'id': 1}) is None
@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+from api.utils.dedup import (
+    hash_texto, retorno_ia_reutilizavel, estatisticas_dedup, conflito_documento_original
+)
+
+
+class SupabaseRpc:
+    def __init__(self, dados):
+        self.dados = dados
+        self.chamadas = []
+
+    def rpc(self, nome, parametros):
+        self.chamadas.append(nome)
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=self.dados))
+
+
+def test_estatisticas_agregadas_no_banco():
+    supabase = SupabaseRpc({'total_uploads': 2000, 'uploads_deduplicados': 500, 'bytes_economizados': 7_000_000})
+    assert estatisticas_dedup(supabase) == {
+        "total_uploads": 2000,
+        "uploads_deduplicados": 500,
+        "taxa_acerto": 0.25,
+        "bytes_economizados": 7_000_000
+    }
+    assert supabase.chamadas == ['estatisticas_dedup']
+
+
+def test_estatisticas_sem_documentos():
+    assert estatisticas_dedup(SupabaseRpc(None))['taxa_acerto'] == 0.0
+
+
+def test_retorno_ia_reutilizado_so_com_mesmo_prompt_e_sem_edicao():
+    documento = {
+        'retorno_ia': 'Resumo',
+        'hash_prompt_ia': hash_texto('Prompt A'),
+        'hash_retorno_ia': hash_texto('Resumo')
+    }
+    assert retorno_ia_reutilizavel(documento, 'Prompt A') == 'Resumo'
+    assert retorno_ia_reutilizavel(documento, 'Prompt B') is None
+    assert retorno_ia_reutilizavel({**documento, 'retorno_ia': 'Resumo editado'}, 'Prompt A') is None
+    assert retorno_ia_reutilizavel({**documento, 'hash_prompt_ia': None}, 'Prompt A') is None
+
+
+def test_conflito_documento_original():
+    class ErroBanco(Exception):
+        def __init__(self, mensagem, code):
+            super().__init__(mensagem)
+            self.code = code
+
+    assert conflito_documento_original(ErroBanco(
+        'duplicate key value violates unique constraint "uq_base_dados_conteudo_original_por_hash"', '23505'))
+    assert not conflito_documento_original(ErroBanco('duplicate key value violates "outra"', '23505'))
+    assert not conflito_documento_original(Exception('timeout'))
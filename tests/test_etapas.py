@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+from api.utils.etapas import ConsultasParalelas, MedidorEtapas
+
+
+def test_erro_de_uma_consulta_aparece_no_obter():
+    def falhar():
+        raise ValueError('documento inválido')
+
+    consultas = ConsultasParalelas()
+    consultas.iniciar('ok', lambda: 1)
+    consultas.iniciar('falha', falhar)
+
+    assert consultas.obter('ok') == 1
+    with pytest.raises(ValueError, match='documento inválido'):
+        consultas.obter('falha')
+
+
+def com_latencia(banco, latencia):
+    """Cada execute() do Supabase em memória espera `latencia` segundos, como uma ida ao PostgREST"""
+    table = banco.table
+
+    def table_lenta(nome):
+        consulta = table(nome)
+        executar = consulta.execute
+
+        def execute():
+            time.sleep(latencia)
+            return executar()
+
+        consulta.execute = execute
+        return consulta
+
+    banco.table = table_lenta
+    return banco
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('latencia_ms', [20, 50, 100])
+def test_benchmark_consultas_em_serie_vs_paralelas(supabase_falso, latencia_ms):
+    """Chaves, documento e prompt de analyze_with_gemini, uma depois da outra vs. ConsultasParalelas"""
+    banco = com_latencia(supabase_falso({
+        'configuracoes_gemini': [{'chave': 'stub', 'vigente': True}],
+        'base_dados_conteudo': [{'id': 1, 'conteudo': 'Relatório.'}],
+        'prompts': [{'id': 7, 'texto_prompt': 'Resuma.'}],
+    }), latencia_ms / 1000)
+    consultas = {
+        'chaves': lambda: banco.table('configuracoes_gemini').select('chave').eq('vigente', True).execute(),
+        'documento': lambda: banco.table('base_dados_conteudo').select('*').eq('id', 1).execute(),
+        'prompt': lambda: banco.table('prompts').select('*').eq('id', 7).execute(),
+    }
+
+    def em_serie():
+        return {nome: consulta() for nome, consulta in consultas.items()}
+
+    def paralelas():
+        paralelas = ConsultasParalelas(MedidorEtapas())
+        for nome, consulta in consultas.items():
+            paralelas.iniciar(nome, consulta)
+        return {nome: paralelas.obter(nome) for nome in consultas}
+
+    tempos = {}
+    for nome, funcao in (('em série', em_serie), ('paralelas', paralelas)):
+        inicio = time.perf_counter()
+        for _ in range(20):
+            resultado = funcao()
+        tempos[nome] = (time.perf_counter() - inicio) / 20
+        assert resultado['documento'].data[0]['conteudo'] == 'Relatório.'
+        print(f"\n{latencia_ms} ms por consulta, {nome}: {tempos[nome] * 1000:.0f} ms")
+
+    assert tempos['paralelas'] < tempos['em série'] / 2
@@ -0,0 +1,98 @@
+import time
+
+from api.utils import fila as fila_modulo
+from api.utils.fila import (
+    FilaSQLite, STATUS_CONCLUIDO, STATUS_ERRO, STATUS_PENDENTE, STATUS_PROCESSANDO
+)
+
+
+def test_ciclo_completo():
+    fila = FilaSQLite()
+    job_id = fila.enfileirar('analise_documento', {'document_id': 1})
+    assert fila.status(job_id)['status'] == STATUS_PENDENTE
+
+    job = fila.reservar()
+    assert job['id'] == job_id and job['tentativas'] == 1
+    assert job['payload'] == {'document_id': 1}
+    assert fila.reservar() is None  # invisível durante a reserva
+
+    assert fila.concluir(job_id, job['tentativas'])
+    assert fila.status(job_id)['status'] == STATUS_CONCLUIDO
+
+
+def test_worker_com_reserva_expirada_nao_sobrescreve_o_novo_worker():
+    fila = FilaSQLite()
+    job_id = fila.enfileirar('analise_documento', {})
+
+    antigo = fila.reservar(timeout_visibilidade=0)
+    novo = fila.reservar()
+    assert novo['id'] == job_id and novo['tentativas'] == antigo['tentativas'] + 1
+
+    # O worker antigo termina depois de perder a reserva
+    assert not fila.concluir(job_id, antigo['tentativas'])
+    assert not fila.falhar(job_id, 'erro atrasado', antigo['tentativas'])
+    assert fila.status(job_id)['status'] == STATUS_PROCESSANDO
+
+    assert fila.concluir(job_id, novo['tentativas'])
+    assert not fila.falhar(job_id, 'erro atrasado', antigo['tentativas'])
+    job = fila.status(job_id)
+    assert job['status'] == STATUS_CONCLUIDO and job['erro'] is None
+
+
+def test_falha_volta_para_fila_com_backoff_ate_esgotar(monkeypatch):
+    monkeypatch.setattr(fila_modulo, 'BACKOFF_BASE', 0)
+    fila = FilaSQLite()
+    job_id = fila.enfileirar('analise_documento', {}, max_tentativas=2)
+
+    job = fila.reservar()
+    assert fila.falhar(job_id, 'primeira', job['tentativas'])
+    assert fila.status(job_id)['status'] == STATUS_PENDENTE
+
+    job = fila.reservar()
+    assert job['tentativas'] == 2
+    assert fila.falhar(job_id, 'segunda', job['tentativas'])
+    job = fila.status(job_id)
+    assert job['status'] == STATUS_ERRO and job['erro'] == 'segunda'
+    assert fila.reservar() is None
+
+
+def test_reserva_expirada_na_ultima_tentativa_vira_erro():
+    fila = FilaSQLite()
+    job_id = fila.enfileirar('analise_documento', {}, max_tentativas=1)
+    fila.reservar(timeout_visibilidade=0)
+    time.sleep(0.01)
+    assert fila.reservar() is None
+    assert fila.status(job_id)['status'] == STATUS_ERRO
+
+
+def test_reservar_job_especifico_so_se_estiver_pendente():
+    fila = FilaSQLite()
+    outro = fila.enfileirar('analise_documento', {'documento_id': 1})
+    job_id = fila.enfileirar('analise_documento', {'documento_id': 2})
+
+    job = fila.reservar_job(job_id)
+    assert job['id'] == job_id and job['status'] == STATUS_PROCESSANDO and job['tentativas'] == 1
+    assert fila.reservar_job(job_id) is None  # já reservado
+    assert fila.reservar()['id'] == outro
+
+
+def test_job_que_falha_no_upload_fica_para_o_worker(monkeypatch):
+    from api.utils import analise_ia
+
+    def falhar(job, service_supabase):
+        raise Exception('Gemini indisponível')
+
+    monkeypatch.setattr(analise_ia, 'processar_job_analise', falhar)
+    fila = FilaSQLite()
+    job_id = analise_ia.enfileirar_analise_documento(fila, 1, None)
+
+    situacao, resultado = analise_ia.executar_job_analise(fila, fila.reservar_job(job_id), None)
+    assert (situacao, resultado) == ('falha', None)
+    job = fila.status(job_id)
+    assert job['status'] == STATUS_PENDENTE and job['erro'] == 'Gemini indisponível'
+    assert job['disponivel_em'] > time.time()  # backoff antes da nova tentativa
+
+    monkeypatch.setattr(analise_ia, 'processar_job_analise', lambda job, service_supabase: 'Resumo')
+    monkeypatch.setattr(time, 'time', lambda: job['disponivel_em'] + 1)
+    assert analise_ia.executar_job_analise(fila, fila.reservar(), None) == ('concluido', 'Resumo')
+    assert fila.status(job_id)['status'] == STATUS_CONCLUIDO
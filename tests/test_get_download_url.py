@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('supabase')
+pytest.importorskip('b2sdk')
+
+from api import get_download_url as modulo  # noqa: E402
+
+
+class BucketFalso:
+    """Registra os prefixos para os quais foram emitidas autorizações de download"""
+
+    def __init__(self, latencia=0):
+        self.prefixos = []
+        self.latencia = latencia
+        self.simultaneas = self.max_simultaneas = 0
+        self._lock = threading.Lock()
+
+    def get_download_authorization(self, prefixo, validade):
+        with self._lock:
+            self.prefixos.append(prefixo)
+            self.simultaneas += 1
+            self.max_simultaneas = max(self.max_simultaneas, self.simultaneas)
+            numero = len(self.prefixos)
+        time.sleep(self.latencia)
+        with self._lock:
+            self.simultaneas -= 1
+        return f'auth-{numero}'
+
+    def get_download_url(self, nome):
+        return f'https://f002.backblazeb2.com/file/bucket/{nome}'
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    falso = BucketFalso()
+    monkeypatch.setattr(modulo, 'executar_com_bucket', lambda operacao: operacao(falso))
+    modulo.cache_urls.limpar()
+    yield falso
+    modulo.cache_urls.limpar()
+
+
+def test_nomes_sem_prefixo_relevante_recebem_autorizacao_por_arquivo(bucket):
+    nomes = ['1700000001_1700000001_a.pdf', '1700000002_1700000002_b.pdf', 'c.pdf']
+    urls = modulo.get_temporary_urls(nomes)
+
+    # O prefixo comum ("170000000") abriria quase o bucket inteiro: nunca é assinado
+    assert sorted(bucket.prefixos) == sorted(nomes)
+    assert all(urls[nome].startswith(bucket.get_download_url(nome)) for nome in nomes)
+
+
+def test_arquivos_do_mesmo_upload_dividem_uma_autorizacao(bucket):
+    nomes = ['1700000001_1700000001_a.pdf', '1700000001_1700000001_b.pdf', '1700000002_1700000002_c.pdf']
+    urls = modulo.get_temporary_urls(nomes)
+
+    assert sorted(bucket.prefixos) == ['1700000001_1700000001_', '1700000002_1700000002_c.pdf']
+    assert urls[nomes[0]].split('Authorization=')[1] == urls[nomes[1]].split('Authorization=')[1]
+
+
+def test_urls_em_cache_nao_sao_assinadas_de_novo(bucket):
+    nomes = ['1700000001_1700000001_a.pdf', 'b.pdf']
+    primeira = modulo.get_temporary_urls(nomes)
+    assinadas = len(bucket.prefixos)
+    assert modulo.get_temporary_urls(nomes) == primeira
+    assert len(bucket.prefixos) == assinadas
+
+
+def test_lote_misto_faz_uma_autorizacao_por_grupo_e_por_avulso_em_paralelo(monkeypatch):
+    falso = BucketFalso(latencia=0.05)
+    monkeypatch.setattr(modulo, 'executar_com_bucket', lambda operacao: operacao(falso))
+    modulo.cache_urls.limpar()
+    modulo.cache_urls.set('em_cache.pdf', 'https://url-em-cache')
+
+    mesmo_upload = [f'1700000001_1700000001_{i}.pdf' for i in range(3)]
+    avulsos = [f'{1700000010 + i}_{1700000010 + i}_x.pdf' for i in range(8)] + ['antigo.pdf']
+    inicio = time.perf_counter()
+    urls = modulo.get_temporary_urls(mesmo_upload + avulsos + ['em_cache.pdf'])
+    duracao = time.perf_counter() - inicio
+    modulo.cache_urls.limpar()
+
+    assert len(urls) == 13 and urls['em_cache.pdf'] == 'https://url-em-cache'
+    assert len(falso.prefixos) == 1 + len(avulsos)
+    # 10 autorizações de 50 ms não saem uma depois da outra
+    assert falso.max_simultaneas > 1 and duracao < 0.05 * len(falso.prefixos)
@@ -0,0 +1,157 @@
+import io
+import json
+
+import pytest
+
+pytest.importorskip('supabase')
+pytest.importorskip('jwt')
+
+from api import analyze_with_gemini  # noqa: E402
+from api.utils import configuracao, gemini  # noqa: E402
+from api.utils.chaves_gemini import PoolChaves  # noqa: E402
+from api.utils.llm import BackendStub  # noqa: E402
+from api.utils.resiliencia import Disjuntor  # noqa: E402
+
+
+class SaidaCliente(io.BytesIO):
+    """wfile do handler; com `desconectar_apos`, o cliente fecha a conexão depois de N escritas"""
+
+    def __init__(self, desconectar_apos=None):
+        super().__init__()
+        self.desconectar_apos = desconectar_apos
+
+    def write(self, dados):
+        if self.desconectar_apos is not None:
+            if self.desconectar_apos <= 0:
+                raise BrokenPipeError(32, 'Broken pipe')
+            self.desconectar_apos -= 1
+        return super().write(dados)
+
+
+def requisitar(modulo, corpo, desconectar_apos=None, metodo='POST', caminho='/api/teste'):
+    """Executa o handler do endpoint sobre uma requisição HTTP em memória; retorna (status, headers, corpo)"""
+    dados = json.dumps(corpo).encode() if corpo is not None else b''
+    bruto = (
+        f"{metodo} {caminho} HTTP/1.1\r\nHost: teste\r\nAuthorization: Bearer token-teste\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(dados)}\r\n\r\n"
+    ).encode() + dados
+
+    handler = modulo.handler.__new__(modulo.handler)
+    handler.rfile = io.BytesIO(bruto)
+    handler.wfile = SaidaCliente(desconectar_apos)
+    handler.client_address = ('127.0.0.1', 0)
+    handler.server = None
+    handler.handle_one_request()
+
+    resposta = handler.wfile.getvalue()
+    cabecalho, _, corpo_resposta = resposta.partition(b'\r\n\r\n')
+    linhas = cabecalho.decode().split('\r\n')
+    status = int(linhas[0].split()[1]) if linhas[0] else None
+    headers = dict(linha.split(': ', 1) for linha in linhas[1:] if ': ' in linha)
+    return status, headers, corpo_resposta.decode()
+
+
+def eventos_sse(corpo):
+    eventos = []
+    for bloco in corpo.strip().split('\n\n'):
+        nome = 'message'
+        for linha in bloco.split('\n'):
+            if linha.startswith('event: '):
+                nome = linha[7:]
+            elif linha.startswith('data: '):
+                eventos.append((nome, json.loads(linha[6:])))
+    return eventos
+
+
+class UsuarioFalso:
+    id = 'usuario-teste'
+    email = 'teste@exemplo.com'
+
+
+@pytest.fixture
+def ambiente(supabase_falso, monkeypatch):
+    """analyze_with_gemini com Supabase em memória e o modelo local (BackendStub) no lugar da Gemini"""
+    banco = supabase_falso({
+        'base_dados_conteudo': [{'id': 1, 'conteudo': 'Relatório trimestral de indicadores.', 'retorno_ia': None}],
+        'prompts': [{'id': 7, 'texto_prompt': 'Resuma o documento.'}],
+    })
+    stub = BackendStub(latencia_ms=0, desvio_latencia_ms=0, tokens_por_segundo=1e9, tokens_saida=60)
+
+    monkeypatch.setattr(analyze_with_gemini, 'cliente_servico', lambda: banco)
+    monkeypatch.setattr(analyze_with_gemini, 'verificar_token', lambda token: UsuarioFalso())
+    monkeypatch.setattr(analyze_with_gemini, 'obter_pool_chaves', lambda supabase: PoolChaves(['stub-local']))
+    monkeypatch.setattr(gemini, 'obter_backend', lambda: stub)
+    monkeypatch.setattr(gemini, 'disjuntor', Disjuntor())
+    monkeypatch.setenv('CACHE_IA_BACKEND', 'desativado')
+    gemini.cache_memoria.limpar()
+    configuracao.cache_config.limpar()
+    yield banco
+    gemini.cache_memoria.limpar()
+    configuracao.cache_config.limpar()
+
+
+def retorno_gravado(banco):
+    return banco.tabelas['base_dados_conteudo'][0]['retorno_ia']
+
+
+def test_analise_normal(ambiente):
+    status, headers, corpo = requisitar(analyze_with_gemini, {'document_id': 1, 'prompt_id': 7})
+    resposta = json.loads(corpo)
+
+    assert status == 200 and headers['Content-Type'] == 'application/json'
+    assert resposta['success'] and resposta['do_cache'] is False
+    assert len(resposta['resultado'].split()) == 60
+    assert retorno_gravado(ambiente) == resposta['resultado']
+
+    # A mesma análise de novo vem do cache de respostas
+    assert json.loads(requisitar(analyze_with_gemini, {'document_id': 1, 'prompt_id': 7})[2])['do_cache'] is True
+
+
+def test_analise_em_stream(ambiente):
+    status, headers, corpo = requisitar(analyze_with_gemini, {'document_id': 1, 'prompt_id': 7, 'stream': True})
+    eventos = eventos_sse(corpo)
+
+    assert status == 200 and headers['Content-Type'].startswith('text/event-stream')
+    trechos = [dados['texto'] for nome, dados in eventos if nome == 'message']
+    assert len(trechos) == 3  # 60 tokens em trechos de 20
+    nome, fim = eventos[-1]
+    assert nome == 'fim' and fim['resultado'] == "".join(trechos)
+    assert retorno_gravado(ambiente) == fim['resultado']
+
+
+def test_cliente_desconectado_no_stream_ainda_grava_o_texto_completo(ambiente):
+    # Cabeçalhos e o primeiro trecho chegam; depois o cliente some
+    status, _, corpo = requisitar(analyze_with_gemini, {'document_id': 1, 'prompt_id': 7, 'stream': True},
+                                  desconectar_apos=2)
+    assert status == 200 and len(eventos_sse(corpo)) == 1
+    assert len(retorno_gravado(ambiente).split()) == 60
+
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_circuito_aberto_responde_503_com_retry_after(ambiente, monkeypatch, stream):
+    disjuntor = Disjuntor(limiar_falhas=1, tempo_aberto=30)
+    disjuntor.registrar_falha()
+    monkeypatch.setattr(gemini, 'disjuntor', disjuntor)
+
+    status, headers, corpo = requisitar(analyze_with_gemini, {'document_id': 1, 'prompt_id': 7, 'stream': stream})
+
+    assert status == 503
+    assert int(headers['Retry-After']) >= 1
+    assert 'error' in json.loads(corpo)
+    assert retorno_gravado(ambiente) is None
+
+
+def test_documento_inexistente(ambiente):
+    status, _, corpo = requisitar(analyze_with_gemini, {'document_id': 99, 'prompt_id': 7})
+    assert status == 404 and json.loads(corpo) == {"error": "Documento não encontrado"}
+
+
+def test_token_invalido_nao_consulta_o_supabase(ambiente, monkeypatch):
+    def recusar(token):
+        raise Exception('token expirado')
+
+    monkeypatch.setattr(analyze_with_gemini, 'verificar_token', recusar)
+    status, _, corpo = requisitar(analyze_with_gemini, {'document_id': 1, 'prompt_id': 7})
+
+    assert status == 401 and 'token expirado' in json.loads(corpo)['error']
+    assert ambiente.consultas == []
@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip('google.generativeai')
+
+from google.generativeai import protos  # noqa: E402
+
+from api.utils.llm import BackendGemini  # noqa: E402
+
+
+def resposta(texto):
+    return protos.GenerateContentResponse(candidates=[
+        protos.Candidate(content=protos.Content(parts=[protos.Part(text=texto)], role='model'))
+    ])
+
+
+class ClienteDaChave:
+    """GenerativeServiceClient de uma chave: registra as chamadas que recebe"""
+
+    def __init__(self):
+        self.chamadas = []
+
+    def generate_content(self, request, **kwargs):
+        self.chamadas.append('generate_content')
+        return resposta('texto completo')
+
+    def stream_generate_content(self, request, **kwargs):
+        self.chamadas.append('stream_generate_content')
+        return iter([resposta('primeiro '), resposta('segundo')])
+
+    def count_tokens(self, request, **kwargs):
+        self.chamadas.append('count_tokens')
+        return protos.CountTokensResponse(total_tokens=7)
+
+
+class ChaveFalsa:
+    def __init__(self):
+        self._cliente = ClienteDaChave()
+
+    def cliente(self):
+        return self._cliente
+
+
+def test_gemini_usa_o_cliente_da_chave():
+    """
+    BackendGemini troca GenerativeModel._client (atributo privado do
+    google-generativeai) pelo cliente da chave; se uma nova versão deixar de
+    usá-lo, as chamadas iriam para o cliente global e este teste falha.
+    """
+    chave = ChaveFalsa()
+    backend = BackendGemini()
+
+    assert backend.gerar(chave, 'gemini-teste', 'Resuma.', timeout=5) == 'texto completo'
+    assert "".join(backend.gerar_stream(chave, 'gemini-teste', 'Resuma.', timeout=5)) == 'primeiro segundo'
+    assert backend.contar_tokens(chave, 'gemini-teste', 'Resuma.', timeout=5) == 7
+    assert chave.cliente().chamadas == ['generate_content', 'stream_generate_content', 'count_tokens']
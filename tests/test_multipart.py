@@ -0,0 +1,166 @@
+import hashlib
+import io
+import os
+import threading
+import tracemalloc
+
+import pytest
+
+from api.utils.multipart import (
+    MultipartParser, MultipartError, ArquivoMuitoGrandeError, parse_multipart
+)
+
+BOUNDARY = '----limiteTeste7MA4YWxkTrZu0gW'
+CONTENT_TYPE = f'multipart/form-data; boundary={BOUNDARY}'
+
+
+def montar_corpo(campos, arquivos):
+    """Corpo multipart/form-data com campos de texto e arquivos (nome -> (filename, bytes))"""
+    partes = []
+    for nome, valor in campos.items():
+        partes.append(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{nome}"\r\n\r\n'.encode()
+            + valor.encode('utf-8') + b'\r\n'
+        )
+    for nome, (filename, dados) in arquivos.items():
+        partes.append(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{nome}"; filename="{filename}"\r\n'
+            f'Content-Type: application/pdf\r\n\r\n'.encode()
+            + dados + b'\r\n'
+        )
+    return b''.join(partes) + f'--{BOUNDARY}--\r\n'.encode()
+
+
+class LeituraContada(io.BytesIO):
+    """BytesIO que registra quantos bytes foram lidos"""
+
+    def __init__(self, dados):
+        super().__init__(dados)
+        self.lidos = 0
+
+    def read(self, n=-1):
+        bloco = super().read(n)
+        self.lidos += len(bloco)
+        return bloco
+
+
+def parse(corpo, tamanho_bloco, max_arquivo=None, max_corpo=None, limite_memoria=1024 * 1024):
+    parser = MultipartParser(
+        io.BytesIO(corpo), CONTENT_TYPE, str(len(corpo)), max_arquivo=max_arquivo,
+        max_corpo=max_corpo, tamanho_bloco=tamanho_bloco, limite_memoria=limite_memoria
+    )
+    return parser.parse()
+
+
+# Conteúdo com CRLF e pedaços do delimitador para exercitar marcadores partidos entre blocos
+ARQUIVO = (b'%PDF-1.4\r\n' + os.urandom(5000) + b'\r\n--' + BOUNDARY[:10].encode()
+           + b'\r\n\r\n' + os.urandom(3000) + b'\r\n')
+
+
+@pytest.mark.parametrize('tamanho_bloco', [1, 2, 7, 31, 64, 1000, 4096, 64 * 1024])
+def test_parse_independe_do_tamanho_do_bloco(tamanho_bloco):
+    corpo = montar_corpo({'projeto_id': '12', 'descricao': 'Relatório é ção'}, {'file': ('a.pdf', ARQUIVO)})
+    form = parse(corpo, tamanho_bloco)
+    try:
+        assert form.getvalue('projeto_id') == '12'
+        assert form.getvalue('descricao') == 'Relatório é ção'
+        arquivo = form['file']
+        assert arquivo.filename == 'a.pdf'
+        assert arquivo.read_bytes() == ARQUIVO
+        assert arquivo.tamanho == len(ARQUIVO)
+        assert arquivo.sha256 == hashlib.sha256(ARQUIVO).hexdigest()
+        assert arquivo.sha1 == hashlib.sha1(ARQUIVO).hexdigest()
+    finally:
+        form.close()
+
+
+def test_arquivo_acima_do_limite_de_memoria_vai_para_disco():
+    corpo = montar_corpo({}, {'file': ('grande.pdf', ARQUIVO)})
+    form = parse(corpo, 1000, limite_memoria=1024)
+    arquivo = form['file']
+    assert arquivo.em_disco
+    caminho = arquivo.path
+    assert arquivo.read_bytes() == ARQUIVO
+    form.close()
+    assert not os.path.exists(caminho)
+
+
+def test_arquivo_maior_que_o_limite_e_rejeitado_durante_a_leitura():
+    dados = b'x' * 50_000
+    corpo = montar_corpo({}, {'file': ('a.pdf', dados)})
+    fp = LeituraContada(corpo)
+    parser = MultipartParser(fp, CONTENT_TYPE, str(len(corpo)), max_arquivo=10_000, tamanho_bloco=1024)
+    with pytest.raises(ArquivoMuitoGrandeError):
+        parser.parse()
+    assert fp.lidos < len(corpo)
+
+
+def test_corpo_maior_que_o_limite_e_rejeitado_antes_de_ler():
+    corpo = montar_corpo({}, {'file': ('a.pdf', b'x' * 5000)})
+    fp = LeituraContada(corpo)
+    with pytest.raises(ArquivoMuitoGrandeError):
+        parse_multipart(fp, {'Content-Type': CONTENT_TYPE, 'Content-Length': str(len(corpo))},
+                        max_arquivo=None, max_corpo=1000)
+    assert fp.lidos == 0
+
+
+def test_nao_le_alem_do_content_length():
+    corpo = montar_corpo({'a': '1'}, {})
+    fp = LeituraContada(corpo + b'lixo depois do corpo')
+    MultipartParser(fp, CONTENT_TYPE, str(len(corpo)), max_arquivo=None, tamanho_bloco=7).parse()
+    assert fp.lidos == len(corpo)
+
+
+@pytest.mark.parametrize('corpo', [
+    b'',
+    f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="a"\r\n\r\nsem fim'.encode(),
+    f'--{BOUNDARY}XX'.encode(),
+])
+def test_corpo_truncado_ou_malformado(corpo):
+    with pytest.raises(MultipartError):
+        parse(corpo, 16)
+
+
+def test_content_type_invalido():
+    with pytest.raises(MultipartError):
+        MultipartParser(io.BytesIO(b''), 'application/json', '0', max_arquivo=None)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('concorrentes', [1, 10, 50])
+def test_benchmark_pico_de_memoria(concorrentes):
+    """
+    Pico de memória Python (tracemalloc) de N uploads simultâneos de 10 MB:
+    leitura do corpo inteiro (como cgi.FieldStorage + read()) vs. parser incremental.
+    """
+    corpo = montar_corpo({'projeto_id': '1'}, {'file': ('a.pdf', os.urandom(10 * 1024 * 1024))})
+
+    def antes():
+        dados = io.BytesIO(corpo).read()
+        inicio = dados.index(b'\r\n\r\n', dados.index(b'filename=')) + 4
+        arquivo = bytes(dados[inicio:dados.rindex(f'\r\n--{BOUNDARY}--'.encode())])
+        hashlib.sha256(arquivo).hexdigest()
+
+    def depois():
+        parse(corpo, 64 * 1024).close()
+
+    resultados = {}
+    for nome, funcao in (('antes', antes), ('depois', depois)):
+        barreira = threading.Barrier(concorrentes)
+
+        def executar():
+            barreira.wait()
+            funcao()
+
+        tracemalloc.start()
+        threads = [threading.Thread(target=executar) for _ in range(concorrentes)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        resultados[nome] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+
+    print(f"\n{concorrentes} uploads de 10 MB: pico {resultados['antes']:.1f} MB antes, "
+          f"{resultados['depois']:.1f} MB depois")
+    assert resultados['depois'] < resultados['antes']
@@ -0,0 +1,125 @@
+import time
+
+import pytest
+
+pytest.importorskip('PyPDF2')
+
+from PyPDF2 import PdfReader  # noqa: E402
+
+from api.utils import pdf_texto  # noqa: E402
+from api.utils.pdf_texto import extrair_texto_paginas, _dividir_paginas  # noqa: E402
+
+
+def gerar_pdf(paginas, linhas_por_pagina=20):
+    """PDF mínimo com texto (fonte Helvetica) em cada página"""
+    objetos = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,  # /Pages, preenchido depois de conhecer as páginas
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    kids = []
+    for p in range(paginas):
+        linhas = [f'Pagina {p + 1} linha {i}: texto de teste ({p * i})' for i in range(linhas_por_pagina)]
+        comandos = ['BT', '/F1 10 Tf', '14 TL', '50 780 Td']
+        for linha in linhas:
+            comandos.append(f'({linha}) Tj T*')
+        comandos.append('ET')
+        stream = '\n'.join(comandos).encode('latin-1')
+        objetos.append(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+        conteudo_id = len(objetos)
+        objetos.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % conteudo_id
+        )
+        kids.append(len(objetos))
+    objetos[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % k for k in kids), len(kids))
+
+    saida = bytearray(b'%PDF-1.4\n')
+    posicoes = []
+    for i, obj in enumerate(objetos, start=1):
+        posicoes.append(len(saida))
+        saida += b'%d 0 obj\n' % i + obj + b'\nendobj\n'
+    inicio_xref = len(saida)
+    saida += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objetos) + 1)
+    for pos in posicoes:
+        saida += b'%010d 00000 n \n' % pos
+    saida += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objetos) + 1, inicio_xref)
+    return bytes(saida)
+
+
+def extrair_serial_original(dados):
+    """Extração serial como era feita em extrair_texto_pdf antes do pool"""
+    import io
+    reader = PdfReader(io.BytesIO(dados))
+    texto = ""
+    for page in reader.pages:
+        texto += page.extract_text() or ""
+    return texto
+
+
+@pytest.mark.parametrize('total,n', [(1, 4), (10, 3), (17, 8), (500, 16), (5, 10)])
+def test_dividir_paginas_cobre_todas_em_ordem(total, n):
+    intervalos = _dividir_paginas(total, n)
+    assert intervalos[0][0] == 0 and intervalos[-1][1] == total
+    assert all(a[1] == b[0] for a, b in zip(intervalos, intervalos[1:]))
+    assert all(fim > inicio for inicio, fim in intervalos)
+    tamanhos = [fim - inicio for inicio, fim in intervalos]
+    assert max(tamanhos) - min(tamanhos) <= 1
+
+
+@pytest.mark.parametrize('paginas', [3, 40])
+def test_pool_identico_ao_serial(paginas, tmp_path):
+    dados = gerar_pdf(paginas)
+    esperado = extrair_serial_original(dados)
+    assert f'Pagina {paginas} linha 19' in esperado
+
+    assert extrair_texto_paginas(dados, max_workers=1) == esperado
+    assert extrair_texto_paginas(dados, max_workers=4) == esperado
+
+    caminho = tmp_path / 'doc.pdf'
+    caminho.write_bytes(dados)
+    assert extrair_texto_paginas(str(caminho), max_workers=4) == esperado
+
+
+def test_sem_multiprocessing_cai_para_serial(monkeypatch):
+    class PoolIndisponivel:
+        def __init__(self, *args, **kwargs):
+            raise OSError("sem /dev/shm")
+
+    monkeypatch.setattr(pdf_texto, 'ProcessPoolExecutor', PoolIndisponivel)
+    dados = gerar_pdf(20)
+    assert extrair_texto_paginas(dados, max_workers=4) == extrair_serial_original(dados)
+
+
+def test_pool_nao_usa_fork(monkeypatch):
+    contextos = []
+    pool_original = pdf_texto.ProcessPoolExecutor
+
+    def pool(*args, **kwargs):
+        contextos.append(kwargs.get('mp_context'))
+        return pool_original(*args, **kwargs)
+
+    monkeypatch.setattr(pdf_texto, 'ProcessPoolExecutor', pool)
+    dados = gerar_pdf(20)
+    assert extrair_texto_paginas(dados, max_workers=2) == extrair_serial_original(dados)
+
+    assert contextos and contextos[0].get_start_method() in ('forkserver', 'spawn')
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('paginas', [10, 100, 500])
+def test_benchmark_extracao(paginas):
+    dados = gerar_pdf(paginas, linhas_por_pagina=60)
+
+    inicio = time.perf_counter()
+    esperado = extrair_serial_original(dados)
+    serial = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    texto = extrair_texto_paginas(dados)
+    paralelo = time.perf_counter() - inicio
+
+    print(f"\n{paginas} páginas: serial {serial:.2f}s, em intervalos {paralelo:.2f}s "
+          f"({serial / paralelo:.1f}x)")
+    assert texto == esperado
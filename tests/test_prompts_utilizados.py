@@ -0,0 +1,79 @@
+import pytest
+
+from api.utils import prompts_utilizados
+from api.utils.prompts_utilizados import (
+    armazenar_prompt, carregar_prompts, colunas_prompt, migrar_prompts
+)
+
+PROMPT = "Analise os indicadores abaixo.\n\n" + "=== INDICADOR: cobertura ===\n2024: 87%\n" * 400
+
+
+@pytest.fixture(autouse=True)
+def caches_limpos():
+    prompts_utilizados.hashes_gravados.limpar()
+    prompts_utilizados.prompts_lidos.limpar()
+    yield
+    prompts_utilizados.hashes_gravados.limpar()
+    prompts_utilizados.prompts_lidos.limpar()
+
+
+def test_prompt_gravado_uma_vez_e_comprimido(supabase_falso):
+    banco = supabase_falso()
+    primeiro = armazenar_prompt(banco, PROMPT)
+    prompts_utilizados.hashes_gravados.limpar()  # outra instância grava o mesmo prompt
+    assert armazenar_prompt(banco, PROMPT) == primeiro
+
+    linhas = banco.tabelas['prompts_utilizados']
+    assert len(linhas) == 1
+    assert linhas[0]['tamanho_comprimido'] * 10 < linhas[0]['tamanho_original']
+
+
+def test_texto_lido_de_volta_pelo_hash(supabase_falso):
+    banco = supabase_falso()
+    prompt_hash = armazenar_prompt(banco, PROMPT)
+    prompts_utilizados.prompts_lidos.limpar()
+
+    assert carregar_prompts(banco, [prompt_hash, prompt_hash, None]) == {prompt_hash: PROMPT}
+    assert carregar_prompts(banco, ['hash-inexistente']) == {}
+
+
+def test_sem_a_tabela_o_texto_fica_na_linha(supabase_falso):
+    class BancoSemTabela(supabase_falso):
+        def table(self, nome):
+            raise Exception('relation "prompts_utilizados" does not exist')
+
+    assert colunas_prompt(BancoSemTabela(), PROMPT) == {'prompt_utilizado': PROMPT}
+
+
+class RelogioUmLote:
+    """time.time() que só deixa a migração processar um lote antes de esgotar o tempo"""
+
+    def __init__(self):
+        self.leituras = [0, 0]
+
+    def time(self):
+        return self.leituras.pop(0) if self.leituras else 1000
+
+
+def test_migracao_move_os_prompts_e_pode_ser_retomada(supabase_falso, monkeypatch):
+    linhas = [{'id': i, 'prompt_utilizado': PROMPT if i % 2 else 'outro prompt', 'prompt_hash': None}
+              for i in range(1, 8)]
+    banco = supabase_falso({'historico_analises_indicador': linhas})
+
+    with monkeypatch.context() as m:
+        m.setattr(prompts_utilizados, 'time', RelogioUmLote())
+        parcial = migrar_prompts(banco, 'historico_analises_indicador', tamanho_lote=3, tempo_max=50)
+    assert parcial['linhas_migradas'] == 3 and parcial['linhas_restantes'] == 4
+
+    final = migrar_prompts(banco, 'historico_analises_indicador', tamanho_lote=3)
+    assert final['linhas_restantes'] == 0
+    assert len(banco.tabelas['prompts_utilizados']) == 2
+    migradas = banco.tabelas['historico_analises_indicador']
+    assert all(l['prompt_utilizado'] is None and l['prompt_hash'] for l in migradas)
+    textos = carregar_prompts(banco, [l['prompt_hash'] for l in migradas])
+    assert sorted(textos.values()) == sorted([PROMPT, 'outro prompt'])
+
+
+def test_migracao_recusa_tabela_desconhecida(supabase_falso):
+    with pytest.raises(ValueError):
+        migrar_prompts(supabase_falso(), 'usuarios')
@@ -0,0 +1,123 @@
+import time
+
+import pytest
+
+from api.utils import gemini, resiliencia
+from api.utils.chaves_gemini import PoolChaves
+from api.utils.llm import BackendLLM, ErroStub
+from api.utils.resiliencia import (
+    BaldeTokens, Disjuntor, GeminiIndisponivelError, executar_com_retentativas
+)
+
+
+class ModeloComFalhas(BackendLLM):
+    """
+    Modelo falso com falhas injetadas: cada chamada consome o próximo item do
+    roteiro (um status HTTP de erro ou 'ok'); roteiro vazio responde 'ok'
+    """
+
+    nome = 'falso'
+
+    def __init__(self, *roteiro):
+        self.roteiro = list(roteiro)
+        self.chamadas = 0
+
+    def gerar(self, chave, modelo, prompt, timeout):
+        self.chamadas += 1
+        resultado = self.roteiro.pop(0) if self.roteiro else 'ok'
+        if resultado != 'ok':
+            raise ErroStub(resultado)
+        return f"resposta {self.chamadas}"
+
+
+@pytest.fixture(autouse=True)
+def sem_espera(monkeypatch):
+    monkeypatch.setattr(resiliencia, 'espera_backoff', lambda tentativa, base, maximo: 0)
+
+
+@pytest.fixture
+def disjuntor(monkeypatch):
+    novo = Disjuntor(limiar_falhas=3, tempo_aberto=30)
+    monkeypatch.setattr(gemini, 'disjuntor', novo)
+    monkeypatch.setenv('CACHE_IA_BACKEND', 'desativado')
+    gemini.cache_memoria.limpar()
+    yield novo
+    gemini.cache_memoria.limpar()
+
+
+def chamar(modelo, monkeypatch, chaves=None):
+    monkeypatch.setattr(gemini, 'obter_backend', lambda: modelo)
+    return gemini.gerar_resposta(chaves or PoolChaves(['chave']), f'prompt {time.perf_counter()}', 'teste')
+
+
+def test_erro_transitorio_e_repetido_ate_o_modelo_responder(disjuntor, monkeypatch):
+    modelo = ModeloComFalhas(503, 429)
+    assert chamar(modelo, monkeypatch)[0] == 'resposta 3'
+    assert modelo.chamadas == 3
+    assert disjuntor.estado == Disjuntor.FECHADO and disjuntor._falhas == 0
+
+
+def test_falhas_seguidas_abrem_o_circuito(disjuntor, monkeypatch):
+    modelo = ModeloComFalhas(500, 500, 500)
+    # A terceira falha abre o circuito e a nova tentativa já é recusada
+    with pytest.raises(GeminiIndisponivelError):
+        chamar(modelo, monkeypatch)
+    assert disjuntor.estado == Disjuntor.ABERTO
+
+    # Circuito aberto: falha na hora, sem chamar o modelo
+    with pytest.raises(GeminiIndisponivelError):
+        chamar(modelo, monkeypatch)
+    assert modelo.chamadas == 3
+
+
+def test_erro_da_requisicao_nao_zera_as_falhas(disjuntor, monkeypatch):
+    with pytest.raises(ErroStub):
+        chamar(ModeloComFalhas(500, 500, 400), monkeypatch)
+    assert disjuntor._falhas == 2
+
+    # A próxima falha transitória completa o limiar: o 400 não contou como sucesso
+    with pytest.raises(GeminiIndisponivelError):
+        chamar(ModeloComFalhas(500, 400), monkeypatch)
+    assert disjuntor.estado == Disjuntor.ABERTO
+
+
+def test_pool_sem_chave_nao_fecha_o_circuito(disjuntor, monkeypatch):
+    for _ in range(2):
+        disjuntor.registrar_falha()
+    with pytest.raises(GeminiIndisponivelError):
+        chamar(ModeloComFalhas(), monkeypatch, chaves=PoolChaves([]))
+    assert disjuntor._falhas == 2
+
+
+def test_meio_aberto_devolve_a_vaga_de_teste_apos_erro_da_requisicao(disjuntor, monkeypatch):
+    for _ in range(3):
+        disjuntor.registrar_falha()
+    disjuntor._aberto_em -= disjuntor.tempo_aberto  # tempo aberto já passou
+
+    with pytest.raises(ErroStub):
+        chamar(ModeloComFalhas(400), monkeypatch)
+    assert disjuntor.estado == Disjuntor.MEIO_ABERTO
+
+    # A vaga de teste voltou: a próxima chamada passa e, respondendo, fecha o circuito
+    assert chamar(ModeloComFalhas(), monkeypatch)[0] == 'resposta 1'
+    assert disjuntor.estado == Disjuntor.FECHADO
+
+
+def test_prazo_interrompe_as_novas_tentativas(monkeypatch):
+    monkeypatch.setattr(resiliencia, 'espera_backoff', lambda tentativa, base, maximo: 5)
+    modelo = ModeloComFalhas(503, 503, 503)
+    with pytest.raises(ErroStub):
+        executar_com_retentativas(lambda: modelo.gerar(None, None, None, 1), gemini.erro_transitorio,
+                                  prazo=time.monotonic() + 1)
+    assert modelo.chamadas == 1
+
+
+def test_limitador_sem_vaga_no_prazo_falha_sem_esperar():
+    balde = BaldeTokens(taxa=0.1, capacidade=1)
+    assert executar_com_retentativas(lambda: 'ok', gemini.erro_transitorio, limitador=balde) == 'ok'
+    inicio = time.monotonic()
+    with pytest.raises(GeminiIndisponivelError) as erro:
+        executar_com_retentativas(lambda: 'ok', gemini.erro_transitorio, limitador=balde,
+                                  prazo=time.monotonic() + 1)
+    assert time.monotonic() - inicio < 0.5
+    assert erro.value.retry_after > 1
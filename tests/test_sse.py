@@ -0,0 +1,135 @@
+import io
+import time
+
+import pytest
+
+from api.utils import gemini
+from api.utils.chaves_gemini import PoolChaves
+from api.utils.llm import BackendStub
+from api.utils.resiliencia import GeminiIndisponivelError
+from api.utils.sse import enviar_evento, iniciar_sse, transmitir_trechos
+
+
+class SaidaQueCai(io.BytesIO):
+    """wfile cujo cliente desconecta depois de `escritas` escritas"""
+
+    def __init__(self, escritas):
+        super().__init__()
+        self.escritas = escritas
+
+    def write(self, dados):
+        if self.escritas <= 0:
+            raise BrokenPipeError(32, 'Broken pipe')
+        self.escritas -= 1
+        return super().write(dados)
+
+
+class HandlerFalso:
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.status = None
+
+    def send_response(self, status):
+        self.status = status
+
+    def send_header(self, nome, valor):
+        pass
+
+    def end_headers(self):
+        pass
+
+
+def test_desconexao_no_meio_do_stream_continua_lendo_o_modelo():
+    lidos = []
+
+    def trechos():
+        for i in range(10):
+            lidos.append(i)
+            yield f"t{i} "
+
+    handler = HandlerFalso(SaidaQueCai(escritas=3))
+    assert transmitir_trechos(handler, trechos()) == "".join(f"t{i} " for i in range(10))
+    assert lidos == list(range(10))
+    assert handler.wfile.getvalue().count(b'data: ') == 3
+
+    # Eventos seguintes (fim/erro) são descartados sem lançar
+    assert enviar_evento(handler, {"success": True}, evento='fim') is False
+
+
+def test_eventos_enviados_enquanto_o_cliente_esta_conectado():
+    handler = HandlerFalso(io.BytesIO())
+    iniciar_sse(handler)
+    assert enviar_evento(handler, {"texto": "a"}) is True
+    assert enviar_evento(handler, {"ok": 1}, evento='fim') is True
+    assert handler.status == 200
+    assert handler.wfile.getvalue() == b'data: {"texto": "a"}\n\nevent: fim\ndata: {"ok": 1}\n\n'
+
+
+@pytest.fixture
+def modelo(monkeypatch):
+    stub = BackendStub(latencia_ms=0, desvio_latencia_ms=0, tokens_por_segundo=1e9, tokens_saida=50)
+    monkeypatch.setattr(gemini, 'obter_backend', lambda: stub)
+    monkeypatch.setenv('CACHE_IA_BACKEND', 'desativado')
+    gemini.cache_memoria.limpar()
+    yield stub
+    gemini.cache_memoria.limpar()
+
+
+def test_erro_do_modelo_aparece_antes_dos_cabecalhos(modelo):
+    # Sem chave disponível: o erro sai da chamada, antes de o handler iniciar o SSE
+    with pytest.raises(GeminiIndisponivelError):
+        gemini.gerar_resposta_stream(PoolChaves([]), 'prompt', 'teste')
+
+
+def test_primeiro_trecho_e_buscado_antes_do_retorno(modelo, monkeypatch):
+    chamadas = []
+    gerar_stream = modelo.gerar_stream
+
+    def gerar_stream_registrando(*args, **kwargs):
+        chamadas.append('inicio')
+        return gerar_stream(*args, **kwargs)
+
+    monkeypatch.setattr(modelo, 'gerar_stream', gerar_stream_registrando)
+    trechos, do_cache = gemini.gerar_resposta_stream(PoolChaves(['chave']), 'prompt', 'teste')
+    assert chamadas == ['inicio'] and not do_cache
+    assert len("".join(trechos).split()) == 50
+
+
+class SaidaCronometrada(io.BytesIO):
+    """wfile que anota quando o primeiro trecho de texto chega ao cliente"""
+
+    def __init__(self, inicio):
+        super().__init__()
+        self.inicio = inicio
+        self.primeiro_byte = None
+
+    def write(self, dados):
+        if self.primeiro_byte is None:
+            self.primeiro_byte = time.perf_counter() - self.inicio
+        return super().write(dados)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('tokens_saida', [200, 800])
+def test_benchmark_tempo_ate_o_primeiro_byte(modelo_stub, pool_stub, tokens_saida):
+    """Resposta inteira (gerar_resposta) vs. SSE (gerar_resposta_stream + transmitir_trechos)"""
+    modelo_stub(latencia_ms=500, desvio_latencia_ms=0, tokens_por_segundo=200, tokens_saida=tokens_saida)
+    chaves = pool_stub()
+
+    inicio = time.perf_counter()
+    handler = HandlerFalso(SaidaCronometrada(inicio))
+    texto, _ = gemini.gerar_resposta(chaves, 'Resuma o documento.', 'bench', ignorar_cache=True)
+    enviar_evento(handler, {"resultado": texto})
+    buffer = handler.wfile.primeiro_byte
+
+    inicio = time.perf_counter()
+    handler = HandlerFalso(SaidaCronometrada(inicio))
+    trechos, _ = gemini.gerar_resposta_stream(chaves, 'Resuma o documento.', 'bench', ignorar_cache=True)
+    transmitido = transmitir_trechos(handler, trechos)
+    stream, total = handler.wfile.primeiro_byte, time.perf_counter() - inicio
+
+    print(f"\n{tokens_saida} tokens: primeiro byte {buffer * 1000:.0f} ms com buffer, "
+          f"{stream * 1000:.0f} ms em stream (resposta completa em {total * 1000:.0f} ms)")
+    assert transmitido == texto
+    # Em stream o primeiro trecho (~20 tokens) chega sem esperar o restante da geração
+    assert stream < buffer / 2
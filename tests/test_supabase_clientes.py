@@ -0,0 +1,136 @@
+import http.server
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('postgrest')
+
+httpx = pytest.importorskip('httpx')
+
+from api.utils import supabase_clientes  # noqa: E402
+
+
+@pytest.fixture
+def requisicoes(monkeypatch):
+    """Troca o pool do processo por um transporte em memória que registra as requisições"""
+    registradas = []
+
+    def responder(requisicao):
+        registradas.append(requisicao)
+        return httpx.Response(200, json=[])
+
+    transporte = httpx.MockTransport(responder)
+    monkeypatch.setattr(supabase_clientes, 'transporte_http', lambda: transporte)
+    monkeypatch.setattr(supabase_clientes, 'supabase_url', 'https://projeto.supabase.co')
+    monkeypatch.setattr(supabase_clientes, 'supabase_key', 'chave-anonima')
+    return registradas
+
+
+def test_cada_cliente_http_tem_headers_proprios_sobre_o_mesmo_pool(requisicoes):
+    um, outro = supabase_clientes.cliente_http(), supabase_clientes.cliente_http()
+    um.headers['Authorization'] = 'Bearer um'
+
+    assert um is not outro and 'Authorization' not in outro.headers
+    assert um._transport is outro._transport
+
+
+def test_tokens_de_usuarios_nao_se_misturam(requisicoes):
+    ana = supabase_clientes.cliente_usuario('token-ana')
+    bia = supabase_clientes.cliente_usuario('token-bia')
+
+    ana.from_('base_dados_conteudo').select('id').execute()
+    bia.from_('base_dados_conteudo').select('id').execute()
+    ana.from_('base_dados_conteudo').select('id').execute()
+
+    tokens = [r.headers['Authorization'] for r in requisicoes]
+    assert tokens == ['Bearer token-ana', 'Bearer token-bia', 'Bearer token-ana']
+    assert all(str(r.url).startswith('https://projeto.supabase.co/rest/v1/') for r in requisicoes)
+
+
+def test_fechar_um_cliente_nao_fecha_o_pool(monkeypatch):
+    transporte = supabase_clientes.TransporteCompartilhado()
+    fechamentos = []
+    monkeypatch.setattr(transporte._pool, 'close', lambda: fechamentos.append(True))
+
+    with httpx.Client(transport=transporte):
+        pass
+    httpx.Client(transport=transporte).close()
+    assert fechamentos == []
+
+
+class PostgrestLocal(http.server.ThreadingHTTPServer):
+    """Servidor HTTP/1.1 keep-alive que responde [] a tudo e conta as conexões TCP abertas"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        self.conexoes = 0
+        servidor = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                servidor.conexoes += 1
+
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                self.wfile.write(b'[]')
+
+            def log_message(self, *args):
+                pass
+
+        super().__init__(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+@pytest.mark.benchmark
+def test_benchmark_conexoes_por_mil_requisicoes(monkeypatch):
+    """
+    Conexões abertas em 1000 requisições (metade com a chave de serviço, metade com
+    o token de um usuário): pool do processo vs. um httpx.Client novo por requisição
+    """
+    pytest.importorskip('supabase')
+    from postgrest import SyncPostgrestClient
+
+    servidor = PostgrestLocal()
+    url = f'http://127.0.0.1:{servidor.server_address[1]}'
+    monkeypatch.setattr(supabase_clientes, 'supabase_url', url)
+    monkeypatch.setattr(supabase_clientes, 'supabase_key', 'anonima.jwt.teste')
+    monkeypatch.setattr(supabase_clientes, 'supabase_service_key', 'servico.jwt.teste')
+    monkeypatch.setattr(supabase_clientes, '_transporte', None)
+    monkeypatch.setattr(supabase_clientes, '_clientes', {})
+
+    def pool_do_processo(i):
+        if i % 2:
+            supabase_clientes.cliente_usuario(f'token-{i % 10}').from_('prompts').select('id').execute()
+        else:
+            supabase_clientes.cliente_servico().table('prompts').select('id').execute()
+
+    def cliente_por_requisicao(i):
+        with SyncPostgrestClient(f'{url}/rest/v1', headers={'apikey': 'servico.jwt.teste'}) as cliente:
+            cliente.from_('prompts').select('id').execute()
+
+    try:
+        for nome, requisitar in (('cliente por requisição', cliente_por_requisicao),
+                                 ('pool do processo', pool_do_processo)):
+            servidor.conexoes = 0
+            inicio = time.perf_counter()
+            for i in range(1000):
+                requisitar(i)
+            duracao = time.perf_counter() - inicio
+            print(f"\n{nome}: {servidor.conexoes} conexões em 1000 requisições ({duracao:.2f}s)")
+            if nome == 'pool do processo':
+                # Requisições em sequência reaproveitam uma única conexão keep-alive
+                assert servidor.conexoes == 1
+            else:
+                assert servidor.conexoes == 1000
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
@@ -0,0 +1,81 @@
+import random
+import re
+import time
+
+import pytest
+
+from api.utils.texto import limpar_texto_para_postgres
+
+
+def limpar_texto_original(texto):
+    """Normalizador anterior (cadeia de re.sub), referência para a equivalência"""
+    if not texto:
+        return ""
+    texto_limpo = texto.replace('\u0000', '')
+    texto_limpo = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]', '', texto_limpo)
+    texto_limpo = re.sub(r'\r\n|\r', '\n', texto_limpo)
+    texto_limpo = re.sub(r'\n{3,}', '\n\n', texto_limpo)
+    texto_limpo = re.sub(r' {2,}', ' ', texto_limpo)
+    return texto_limpo.strip()
+
+
+# Caracteres que exercitam cada etapa: controles, quebras, espaços e texto comum
+ALFABETO = (
+    [chr(c) for c in range(0x00, 0x20)] + ['\x7f', ' ', ' ', ' ', '\n', '\n', '\r', '\t']
+    + list('aé ção1.-') + [' ', ' ', '\x85', '﻿', '😀']
+)
+
+
+def texto_aleatorio(rng, tamanho):
+    return ''.join(rng.choice(ALFABETO) for _ in range(tamanho))
+
+
+@pytest.mark.parametrize('semente', range(200))
+def test_equivalente_ao_original_corpus_aleatorio(semente):
+    rng = random.Random(semente)
+    texto = texto_aleatorio(rng, rng.randint(0, 400))
+    assert limpar_texto_para_postgres(texto) == limpar_texto_original(texto)
+
+
+@pytest.mark.parametrize('texto', [
+    None, '', ' ', '\x00', '\r\n\r\n\r\n', '\r\r\r', '\n \n \n', 'a\r\n\n\rb',
+    '  a  \t  b  ', '\x00\n\x00\n\x00\n', 'a\x0b\x0cb', '\r\x00\n',
+])
+def test_equivalente_ao_original_casos_limite(texto):
+    assert limpar_texto_para_postgres(texto) == limpar_texto_original(texto)
+
+
+def test_equivalente_ao_original_propriedade():
+    hypothesis = pytest.importorskip('hypothesis')
+    from hypothesis import strategies as st
+
+    @hypothesis.settings(max_examples=2000, deadline=None)
+    @hypothesis.given(st.one_of(
+        st.text(alphabet=st.sampled_from(ALFABETO)),
+        st.text(),
+    ))
+    def propriedade(texto):
+        assert limpar_texto_para_postgres(texto) == limpar_texto_original(texto)
+
+    propriedade()
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('tamanho', [100 * 1024, 10 * 1024 * 1024])
+def test_benchmark_normalizador(tamanho):
+    # Texto típico de PDF extraído: parágrafos, quebras \r\n, espaços duplos e um ou outro NUL
+    trecho = 'Relatório  de  atividades\r\nLinha com texto\x00 comum.\r\n\r\n\r\n\r\nOutro parágrafo.  '
+    texto = (trecho * (tamanho // len(trecho) + 1))[:tamanho]
+    repeticoes = 20 if tamanho <= 100 * 1024 else 2
+
+    resultados = {}
+    for nome, funcao in (('original', limpar_texto_original), ('atual', limpar_texto_para_postgres)):
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            saida = funcao(texto)
+        resultados[nome] = (time.perf_counter() - inicio) / repeticoes * 1000
+        resultados[nome + '_saida'] = saida
+
+    print(f"\n{tamanho // 1024} KB: original {resultados['original']:.2f} ms, "
+          f"atual {resultados['atual']:.2f} ms ({resultados['original'] / resultados['atual']:.1f}x)")
+    assert resultados['atual_saida'] == resultados['original_saida']
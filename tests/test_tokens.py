@@ -0,0 +1,57 @@
+from api.utils.tokens import (
+    MARCA_TRUNCADO, compactar, dividir_fontes, estimar_tokens, preparar_entrada
+)
+
+
+def fonte(n, linhas=200):
+    rodape = "Secretaria Municipal de Saúde - página"
+    corpo = "\n".join(f"linha {i} do documento {n} com dados\t\t  " for i in range(linhas))
+    return f"### Texto Documento ID {n} (doc{n}.pdf) ###\n{rodape}\n{corpo}\n{rodape}\n{rodape}\n"
+
+
+def test_texto_dentro_do_orcamento_segue_sem_alteracao():
+    texto = fonte(1, linhas=5)
+    entrada = preparar_entrada("Resuma.", texto, orcamento=10_000)
+    assert entrada["texto"] == texto and not entrada["excede"]
+    assert entrada["tokens"]["compactado"] is False
+
+
+def test_compactacao_remove_espacos_e_rodape_repetido():
+    compacto = compactar(fonte(1, linhas=5))
+    assert compacto.count("Secretaria Municipal de Saúde") == 1
+    assert "\t" not in compacto and "  \n" not in compacto
+
+
+def test_truncamento_proporcional_mantem_todas_as_fontes():
+    texto = fonte(1) + fonte(2, linhas=600)
+    orcamento = estimar_tokens(texto) // 3
+    entrada = preparar_entrada("Resuma.", texto, orcamento=orcamento)
+
+    assert not entrada["excede"]
+    assert entrada["tokens"]["truncado"] and entrada["tokens"]["final"] <= orcamento
+    fontes = dividir_fontes(entrada["texto"])
+    assert len(fontes) == 2 and all(MARCA_TRUNCADO in f for f in fontes)
+    # Cortes proporcionais: a fonte maior continua maior
+    assert len(fontes[1]) > 2 * len(fontes[0])
+
+
+def test_sem_truncar_indica_que_excede():
+    texto = fonte(1, linhas=2000)
+    entrada = preparar_entrada("Resuma.", texto, orcamento=100, truncar=False)
+    assert entrada["excede"] and not entrada["tokens"]["truncado"]
+
+
+def test_contagem_exata_so_perto_do_orcamento():
+    chamadas = []
+
+    def contador(texto):
+        chamadas.append(len(texto))
+        return estimar_tokens(texto) * 2
+
+    preparar_entrada("Resuma.", "curto", contador_exato=contador, orcamento=10_000)
+    assert chamadas == []
+
+    texto = fonte(1, linhas=400)
+    entrada = preparar_entrada("Resuma.", texto, contador_exato=contador, orcamento=estimar_tokens(texto))
+    assert chamadas and entrada["tokens"]["metodo"] == "exato"
+    assert entrada["tokens"]["final"] <= entrada["tokens"]["orcamento"]